@@ -50,6 +50,15 @@ def create_app(config_name=None):
     # 註冊錯誤處理器
     _register_error_handlers(app)
 
+    # 啟動收盤後背景更新排程
+    _start_refresh_scheduler(app)
+
+    # 啟動熱門股票預熱（完成前 /api/ready 回應尚未就緒）
+    _start_cache_warmer(app)
+
+    # 啟動快取背景巡檢
+    _start_cache_scrubber(app)
+
     # 註冊上下文處理器
     @app.context_processor
     def inject_version():
@@ -66,7 +75,9 @@ def _ensure_directories(app):
         app.config.get('DATA_DIR'),
         app.config.get('CACHE_DIR'),
         app.config.get('LOG_DIR'),
-        app.config.get('METADATA_DIR')
+        app.config.get('METADATA_DIR'),
+        app.config.get('MONTH_STORE_DIR'),
+        app.config.get('LOCK_DIR')
     ]
 
     for directory in directories:
@@ -75,6 +86,47 @@ def _ensure_directories(app):
             app.logger.info(f'創建目錄: {directory}')
 
 
+def _start_refresh_scheduler(app):
+    """啟動收盤後背景更新排程（每個 worker 都啟動，以檔案鎖確保同時只有一個執行）"""
+    if app.testing or not app.config.get('REFRESH_SCHEDULER_ENABLED'):
+        return
+
+    from routes.api_routes import stock_service
+    from services import RefreshScheduler
+    from utils import PanelStore
+
+    panel_store = PanelStore() if app.config.get('PANEL_ENABLED') else None
+    app.extensions['refresh_scheduler'] = scheduler = RefreshScheduler(stock_service, panel_store=panel_store)
+    scheduler.start()
+    app.logger.info('收盤後背景更新排程已啟動')
+
+
+def _start_cache_warmer(app):
+    """在背景預熱熱門股票的快取與技術指標（每個 worker 各自預熱本進程的快取）"""
+    if app.testing or not app.config.get('WARMUP_ENABLED'):
+        return
+
+    from routes.api_routes import stock_service
+    from services import CacheWarmer
+
+    app.extensions['cache_warmer'] = warmer = CacheWarmer(stock_service)
+    warmer.start()
+    app.logger.info('啟動預熱已開始')
+
+
+def _start_cache_scrubber(app):
+    """啟動快取背景巡檢（只有檔案後端有校驗檔；每個 worker 都啟動，以檔案鎖確保同時只有一個執行）"""
+    if app.testing or not app.config.get('CACHE_SCRUB_ENABLED') or app.config.get('CACHE_BACKEND') != 'file':
+        return
+
+    from routes.api_routes import stock_service
+    from services import CacheScrubber
+
+    app.extensions['cache_scrubber'] = scrubber = CacheScrubber(stock_service.cache_manager)
+    scrubber.start()
+    app.logger.info('快取背景巡檢已啟動')
+
+
 def _setup_logging(app):
     """設定日誌系統"""
     if not app.debug and not app.testing:
@@ -0,0 +1,101 @@
+"""
+快取格式基準測試：舊版 JSON 列格式 vs 定長記錄 .bars vs 壓縮區塊（CACHE_COMPRESSION=zlib）
+比較 1、5、20 年歷史數據每筆的位元組數與載入時間：
+載入到可分析的 DataFrame 為止（已解碼快取停用），以及只以 memmap 映射記錄（零複製）
+
+執行: python -m benchmarks.bench_cache_format
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from utils import CacheManager
+from utils.frame_cache import FrameCache
+
+YEARS = [1, 5, 20]
+REPEAT = 20
+
+
+def make_history(years: int) -> pd.DataFrame:
+    """產生指定年數的合成日線數據"""
+    dates = pd.bdate_range('2000-01-03', periods=years * 250)
+    rng = np.random.default_rng(years)
+    close = np.round(500 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates)))), 2)
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'open': close, 'high': np.round(close * 1.01, 2), 'low': np.round(close * 0.99, 2),
+        'close': close,
+        'volume': rng.integers(1_000_000, 50_000_000, len(dates)),
+        'capacity': rng.integers(1_000_000_000, 50_000_000_000, len(dates)),
+    })
+
+
+def load_legacy(path: str) -> pd.DataFrame:
+    """舊版流程：json.load → DataFrame(list of dict) → pd.to_datetime"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    df = pd.DataFrame(data['data'])
+    return df.assign(date=pd.to_datetime(df['date']))
+
+
+def drop_page_cache(path: str):
+    """將檔案移出頁面快取（模擬冷讀取，檔案已 fsync）"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def timed(fn, *args, cold_path: str = None) -> float:
+    """重複執行取中位數（毫秒），指定 cold_path 時每次執行前將檔案移出頁面快取"""
+    samples = []
+    for _ in range(REPEAT):
+        if cold_path:
+            drop_page_cache(cold_path)
+        started = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return float(np.median(samples))
+
+
+def main():
+    print(f"{'年數':>4} {'筆數':>6} {'JSON B/筆':>10} {'BARS B/筆':>10} {'壓縮 B/筆':>10} "
+          f"{'JSON ms':>9} {'BARS ms':>9} {'壓縮 ms':>9} {'mmap ms':>9} {'BARS 冷':>9} {'壓縮 冷':>9}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # 停用已解碼快取，每次都從檔案解碼
+        manager = CacheManager(os.path.join(cache_dir, 'bars'), frame_cache=FrameCache(0))
+        compressed = CacheManager(os.path.join(cache_dir, 'zlib'), frame_cache=FrameCache(0),
+                                  compression='zlib')
+        for years in YEARS:
+            df = make_history(years)
+            ticker = f"Y{years}"
+
+            legacy_path = os.path.join(cache_dir, f"{ticker}-legacy.json")
+            with open(legacy_path, 'w', encoding='utf-8') as f:
+                json.dump({'metadata': {}, 'date_range': {}, 'data': df.to_dict('records')},
+                          f, ensure_ascii=False, indent=2)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.create_cache(ticker, ticker, df)
+                compressed.create_cache(ticker, ticker, df)
+
+            sizes = [os.path.getsize(path) / len(df) for path in (
+                legacy_path, manager._get_cache_path(ticker), compressed._get_cache_path(ticker))]
+            json_ms = timed(load_legacy, legacy_path)
+            bars_ms = timed(manager.load_frame, ticker)
+            zlib_ms = timed(compressed.load_frame, ticker)
+            mmap_ms = timed(manager.load_bars, ticker)
+            bars_cold = timed(manager.load_frame, ticker, cold_path=manager._get_cache_path(ticker))
+            zlib_cold = timed(compressed.load_frame, ticker, cold_path=compressed._get_cache_path(ticker))
+            print(f"{years:>4} {len(df):>6} {sizes[0]:>10.1f} {sizes[1]:>10.1f} {sizes[2]:>10.1f} "
+                  f"{json_ms:>9.2f} {bars_ms:>9.2f} {zlib_ms:>9.2f} {mmap_ms:>9.3f} "
+                  f"{bars_cold:>9.2f} {zlib_cold:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
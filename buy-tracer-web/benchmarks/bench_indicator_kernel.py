@@ -0,0 +1,98 @@
+"""
+技術指標計算基準測試：逐步複製 DataFrame 的舊流程 vs 單次計算（IndicatorService.calculate_all）
+比較 1 萬與 10 萬筆日線的計算時間、大型配置次數與尖峰記憶體：
+
+- 大型配置次數：以 sys.setprofile 在每個函數呼叫與返回時讀取 tracemalloc 的目前用量，
+  比上一次增加達半個欄位（筆數 × 4 bytes）以上計為一次（同一個函數內連續的配置合併計算，為下限）
+- 尖峰記憶體：tracemalloc 的尖峰用量減去開始時的用量（numpy 陣列的數據區也會被追蹤），以欄位數（筆數 × 8 bytes）表示
+
+執行: python -m benchmarks.bench_indicator_kernel
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from services import IndicatorService
+
+SIZES = [10_000, 100_000]
+REPEAT = 20
+
+
+def make_history(bars: int) -> pd.DataFrame:
+    """產生指定筆數的合成日線數據（與快取載入後的格式相同）"""
+    rng = np.random.default_rng(bars)
+    close = np.round(500 * np.exp(np.cumsum(rng.normal(0, 0.01, bars))), 2)
+    return pd.DataFrame({
+        'open': close, 'high': np.round(close * 1.01, 2), 'low': np.round(close * 0.99, 2),
+        'close': close,
+        'volume': rng.integers(1_000_000, 50_000_000, bars),
+        'capacity': rng.integers(1_000_000_000, 50_000_000_000, bars),
+    }, index=pd.date_range('1980-01-01', periods=bars, name='date'))
+
+
+def legacy_calculate_all(df: pd.DataFrame) -> pd.DataFrame:
+    """舊流程：copy → calculate_ma → calculate_macd → calculate_volume_ma → dropna（每一步都複製整個 DataFrame）"""
+    df = df.copy()
+    df = IndicatorService.calculate_ma(df)
+    df = IndicatorService.calculate_macd(df)
+    df = IndicatorService.calculate_volume_ma(df)
+    return df.dropna()
+
+
+def timed(fn, df: pd.DataFrame) -> float:
+    """重複執行取中位數（毫秒）"""
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn(df)
+        samples.append((time.perf_counter() - started) * 1000)
+    return float(np.median(samples))
+
+
+def measure_memory(fn, df: pd.DataFrame):
+    """
+    Returns:
+        Tuple[int, float]: (大型配置次數, 尖峰記憶體的欄位數)
+    """
+    threshold = len(df) * 4
+    allocations = 0
+    last = 0
+
+    def profile(frame, event, arg):
+        nonlocal allocations, last
+        current = tracemalloc.get_traced_memory()[0]
+        if current - last >= threshold:
+            allocations += 1
+        last = current
+
+    tracemalloc.start()
+    try:
+        last = base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        sys.setprofile(profile)
+        result = fn(df)
+        sys.setprofile(None)
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        sys.setprofile(None)
+        tracemalloc.stop()
+    del result
+    return allocations, peak / (len(df) * 8)
+
+
+def main():
+    print(f"{'筆數':>8} {'流程':<8} {'ms':>9} {'大型配置':>8} {'尖峰(欄)':>9}")
+    for bars in SIZES:
+        df = make_history(bars)
+        expected = legacy_calculate_all(df)
+        pd.testing.assert_frame_equal(IndicatorService.calculate_all(df), expected, check_exact=False, rtol=1e-9)
+
+        for name, fn in [('舊流程', legacy_calculate_all), ('單次計算', IndicatorService.calculate_all)]:
+            allocations, peak = measure_memory(fn, df)
+            print(f"{bars:>8} {name:<8} {timed(fn, df):>9.2f} {allocations:>8} {peak:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
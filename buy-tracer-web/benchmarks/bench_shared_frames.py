@@ -0,0 +1,109 @@
+"""
+跨 worker 共享數據段基準測試：每個 worker 的私有記憶體
+模擬 WORKERS 個 gunicorn worker 以不同順序查詢同一批熱門股票（每檔 5 年）兩輪，
+比較停用與啟用共享數據段時，各 worker 的記憶體增加量（/proc/self/smaps_rollup）：
+- Pss_Anon：進程私有的 heap（已解碼快取、DataFrame 物件等）
+- Pss_Shmem：共享數據段按映射進程數分攤的部分
+
+執行: python -m benchmarks.bench_shared_frames
+"""
+import contextlib
+import ctypes
+import gc
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+
+import pandas as pd
+import twstock
+from services import StockDataService
+from utils import AccessTracker, CacheManager, DateUtils, SingleFlight
+from utils.shared_frame_store import SharedFrameStore
+from .bench_cache_format import make_history
+
+WORKERS = 4
+TICKER_COUNTS = [50, 200, 400]
+YEARS = 5
+
+
+def memory_kb() -> dict:
+    """smaps_rollup 各項（先歸還 malloc 的閒置頁面，只計算仍在使用的部分）"""
+    gc.collect()
+    ctypes.CDLL('libc.so.6').malloc_trim(0)
+    values = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3:
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def run_worker(root: str, shm_dir: str, tickers, shared: bool, seed: int, barrier, results):
+    """一個 worker：依自己的順序查詢所有股票兩輪，回報 (Pss_Anon 增加量 KB, Pss_Shmem 增加量 KB)"""
+    service = StockDataService(
+        cache_manager=CacheManager(os.path.join(root, 'cache')),
+        single_flight=SingleFlight(os.path.join(root, 'locks')),
+        access_tracker=AccessTracker(os.path.join(root, 'access_stats.json'), flush_interval=3600),
+        shared_store=SharedFrameStore(shm_dir, max_bytes=512 * 1024 * 1024) if shared else None
+    )
+    if not shared:
+        # 未指定時依 SHARED_FRAME_CACHE_MB 建立，停用時直接移除
+        service.shared_store = None
+    order = list(tickers)
+    random.Random(seed).shuffle(order)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        service.get_indicator_data(order[0], '2000-01-01')
+        barrier.wait()
+        before = memory_kb()
+        for _ in range(2):
+            for ticker in order:
+                service.get_indicator_data(ticker, '2000-01-01')
+    # 所有 worker 都查詢完才量測（共享頁面的分攤取決於同時映射的進程數）
+    barrier.wait()
+    after = memory_kb()
+    results.put((after['Pss_Anon'] - before['Pss_Anon'], after['Pss_Shmem'] - before['Pss_Shmem']))
+
+
+def measure(root: str, shm_dir: str, tickers, shared: bool) -> list:
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(WORKERS)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=run_worker, args=(root, shm_dir, tickers, shared, i, barrier, results))
+               for i in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    deltas = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return deltas
+
+
+def main():
+    tickers = [code for code in twstock.twse if len(code) == 4 and code.isdigit()][:max(TICKER_COUNTS)]
+    latest = DateUtils.get_latest_available_date()
+    history = make_history(YEARS)
+    history['date'] = pd.bdate_range(
+        end=latest.strftime('%Y-%m-%d'), periods=len(history)).strftime('%Y-%m-%d')
+
+    print(f"{WORKERS} 個 worker，每檔 {len(history)} 筆；各 worker 記憶體增加量（MB，最大值）")
+    print(f"{'股票數':>6} {'停用 私有':>10} {'啟用 私有':>10} {'啟用 共享分攤':>14}")
+    for count in TICKER_COUNTS:
+        row = []
+        for shared in (False, True):
+            with tempfile.TemporaryDirectory() as root, \
+                    tempfile.TemporaryDirectory(dir='/dev/shm') as shm_dir:
+                manager = CacheManager(os.path.join(root, 'cache'))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for ticker in tickers[:count]:
+                        manager.create_cache(ticker, ticker, history)
+                deltas = measure(root, shm_dir, tickers[:count], shared)
+                row.append((max(d[0] for d in deltas) / 1024, max(d[1] for d in deltas) / 1024))
+        print(f"{count:>6} {row[0][0]:>10.1f} {row[1][0]:>10.1f} {row[1][1]:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+儲存後端基準測試：舊版 JSON 檔 vs .bars 記錄檔 vs SQLite
+以 TICKERS 檔、每檔 YEARS 年的合成數據比較：
+- 單檔完整載入
+- 範圍讀取（DEFAULT_PLOT_DAYS 加最長均線的暖機天數）
+- 單檔附加一個交易日
+- 「某日所有股票」查詢
+
+各後端都停用進程內快取（FrameCache），只比較儲存本身
+
+執行: python -m benchmarks.bench_storage_backend
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+import pandas as pd
+from config import Config
+from utils import CacheManager, SQLiteCacheManager
+from utils.frame_cache import FrameCache
+from .bench_cache_format import load_legacy, make_history, timed
+
+TICKERS = 200
+YEARS = 5
+RANGE_DAYS = Config.DEFAULT_PLOT_DAYS + max(Config.MA_PERIODS)
+
+
+def legacy_path(cache_dir: str, ticker: str) -> str:
+    return os.path.join(cache_dir, f"{ticker}.json")
+
+
+def write_legacy(path: str, df: pd.DataFrame):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': {}, 'date_range': {}, 'data': df.to_dict('records')},
+                  f, ensure_ascii=False, indent=2)
+
+
+def legacy_range(path: str, days: int) -> pd.DataFrame:
+    """舊版流程沒有範圍讀取：載入整個檔案再取最後 N 天"""
+    return load_legacy(path).tail(days)
+
+
+def legacy_append(path: str, row: dict):
+    """舊版合併流程：讀取整個檔案、加入新的一天、整檔重寫"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['data'].append(row)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def legacy_date(cache_dir: str, date_str: str) -> pd.DataFrame:
+    """舊版流程：逐檔載入並篩選該日"""
+    rows = []
+    for filename in sorted(os.listdir(cache_dir)):
+        if filename.endswith('.json'):
+            with open(os.path.join(cache_dir, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rows += [dict(row, ticker=filename[:-5]) for row in data['data'] if row['date'] == date_str]
+    return pd.DataFrame(rows)
+
+
+def main():
+    history = make_history(YEARS)
+    query_date = history['date'].iloc[len(history) // 2]
+    # 附加用的交易日：每次計時附加不同的一天
+    future = pd.bdate_range(pd.Timestamp(history['date'].iloc[-1]) + pd.Timedelta(days=1), periods=1000)
+    appended = iter(range(len(future)))
+
+    def next_row():
+        return dict(history.iloc[-1].to_dict(), date=future[next(appended)].strftime('%Y-%m-%d'))
+
+    with tempfile.TemporaryDirectory() as root:
+        json_dir = os.path.join(root, 'json')
+        os.makedirs(json_dir)
+        files = CacheManager(os.path.join(root, 'bars'), frame_cache=FrameCache(max_bytes=0))
+        sqlite = SQLiteCacheManager(os.path.join(root, 'cache.sqlite3'), frame_cache=FrameCache(max_bytes=0))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(TICKERS):
+                ticker = f"{1000 + i}"
+                write_legacy(legacy_path(json_dir, ticker), history)
+                files.create_cache(ticker, ticker, history)
+                sqlite.create_cache(ticker, ticker, history)
+
+        ticker = '1000'
+        results = {
+            '完整載入': (
+                timed(load_legacy, legacy_path(json_dir, ticker)),
+                timed(files.load_frame, ticker),
+                timed(sqlite.load_frame, ticker),
+            ),
+            f'範圍 {RANGE_DAYS} 天': (
+                timed(legacy_range, legacy_path(json_dir, ticker), RANGE_DAYS),
+                timed(lambda: files.load_frame(ticker, limit=RANGE_DAYS)),
+                timed(lambda: sqlite.load_frame(ticker, limit=RANGE_DAYS)),
+            ),
+            '附加一天': (
+                timed(lambda: legacy_append(legacy_path(json_dir, '1001'), next_row())),
+                timed(lambda: files.merge_data('1002', pd.DataFrame([next_row()]))),
+                timed(lambda: sqlite.merge_data('1003', pd.DataFrame([next_row()]))),
+            ),
+            f'{TICKERS} 檔某日': (
+                timed(legacy_date, json_dir, query_date),
+                timed(files.load_date, query_date),
+                timed(sqlite.load_date, query_date),
+            ),
+        }
+
+        print(f"{TICKERS} 檔 × {len(history)} 筆（{YEARS} 年），中位數毫秒")
+        print(f"{'操作':<12} {'JSON':>10} {'BARS':>10} {'SQLite':>10}")
+        for name, (json_ms, bars_ms, sqlite_ms) in results.items():
+            print(f"{name:<12} {json_ms:>10.2f} {bars_ms:>10.2f} {sqlite_ms:>10.2f}")
+        print(f"SQLite 檔案大小: {os.path.getsize(sqlite.db_path) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,8 @@ class Config:
     CACHE_DIR = os.path.join(BASE_DIR, os.getenv('CACHE_DIR', 'data/cache'))
     LOG_DIR = os.path.join(BASE_DIR, os.getenv('LOG_DIR', 'data/logs'))
     METADATA_DIR = os.path.join(BASE_DIR, os.getenv('METADATA_DIR', 'data/metadata'))
+    MONTH_STORE_DIR = os.path.join(BASE_DIR, os.getenv('MONTH_STORE_DIR', 'data/months'))
+    LOCK_DIR = os.path.join(BASE_DIR, os.getenv('LOCK_DIR', 'data/locks'))
 
     # 股票數據配置
     DEFAULT_START_DATE = os.getenv('DEFAULT_START_DATE', '2024-01-01')
@@ -37,9 +39,78 @@ class Config:
     MACD_SIGNAL = int(os.getenv('MACD_SIGNAL', 9))
 
     # 快取配置
+    # 快取儲存後端：file（每檔一個 .bars 記錄檔）、sqlite（所有股票存於同一個資料庫）
+    # 或 redis（多台主機共用同一個 Redis 相容伺服器）
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+    CACHE_SQLITE_PATH = os.path.join(BASE_DIR, os.getenv('CACHE_SQLITE_PATH', 'data/cache.sqlite3'))
+    # 記錄檔壓縮：none（定長記錄，以 memmap 零複製讀取）、zlib 或 zstd（需安裝 zstandard）
+    CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'none')
+    # 啟用壓縮時，檔尾未壓縮的記錄累積到此筆數即併入壓縮區塊
+    CACHE_COMPACT_RECORDS = int(os.getenv('CACHE_COMPACT_RECORDS', 20))
+    # 檔案後端的背景巡檢：每隔 CACHE_SCRUB_INTERVAL_HOURS 小時依校驗檔驗證整個快取目錄，讀取速度上限 MB/秒
+    CACHE_SCRUB_ENABLED = os.getenv('CACHE_SCRUB_ENABLED', 'true').lower() == 'true'
+    CACHE_SCRUB_INTERVAL_HOURS = float(os.getenv('CACHE_SCRUB_INTERVAL_HOURS', 24))
+    CACHE_SCRUB_MB_PER_SECOND = float(os.getenv('CACHE_SCRUB_MB_PER_SECOND', 2))
+    CACHE_SCRUB_CHECKPOINT_EVERY = int(os.getenv('CACHE_SCRUB_CHECKPOINT_EVERY', 50))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # 同一個 Redis 上多套部署時以前綴區分
+    REDIS_KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'buy-tracer')
+    # Redis 鎖的存活時間（秒）：持有鎖的主機異常結束時在此之後自動釋放，需大於最長的上游更新時間
+    REDIS_LOCK_TTL_SECONDS = int(os.getenv('REDIS_LOCK_TTL_SECONDS', 300))
     CACHE_EXPIRY_DAYS = int(os.getenv('CACHE_EXPIRY_DAYS', 7))
+    # 快取總大小與股票數上限：超過時依最後查詢時間淘汰最久未查詢的股票（0 為不限制）
+    # 股票數上限默認不啟用：全市場回填與匯入的股票從未被查詢，限制股票數會讓面板與全市場掃描幾乎沒有數據
     MAX_CACHE_SIZE_MB = int(os.getenv('MAX_CACHE_SIZE_MB', 100))
-    MAX_CACHED_STOCKS = int(os.getenv('MAX_CACHED_STOCKS', 50))
+    MAX_CACHED_STOCKS = int(os.getenv('MAX_CACHED_STOCKS', 0))
+    # 不會被淘汰的股票（逗號分隔）
+    CACHE_WATCHLIST = [x.strip() for x in os.getenv('CACHE_WATCHLIST', '').split(',') if x.strip()]
+    # 每個 worker 進程內已解碼快取的大小上限（0 為停用）
+    FRAME_CACHE_SIZE_MB = int(os.getenv('FRAME_CACHE_SIZE_MB', 100))
+    # 跨 worker 共享的熱門股票技術指標數據（位於共享記憶體，0 為停用）
+    SHARED_FRAME_DIR = os.path.join(BASE_DIR, os.getenv(
+        'SHARED_FRAME_DIR', '/dev/shm/buy-tracer' if os.path.isdir('/dev/shm') else 'data/shm'))
+    SHARED_FRAME_CACHE_MB = int(os.getenv('SHARED_FRAME_CACHE_MB', 32))
+    # 增量技術指標：保存各股票自 DEFAULT_START_DATE 起的指標序列與遞推狀態，每日只計算新的交易日
+    INDICATOR_ENGINE_ENABLED = os.getenv('INDICATOR_ENGINE_ENABLED', 'true').lower() == 'true'
+    INDICATOR_DIR = os.path.join(BASE_DIR, os.getenv('INDICATOR_DIR', 'data/indicators'))
+    # 日期 × 股票面板：所有已快取股票的價量對齊成矩陣，供全市場掃描（收盤後更新時同步）
+    PANEL_ENABLED = os.getenv('PANEL_ENABLED', 'true').lower() == 'true'
+    PANEL_DIR = os.path.join(BASE_DIR, os.getenv('PANEL_DIR', 'data/panel'))
+
+    # 上游抓取配置
+    FETCH_MAX_WORKERS = int(os.getenv('FETCH_MAX_WORKERS', 6))
+    UPSTREAM_REQUESTS_PER_SECOND = float(os.getenv('UPSTREAM_REQUESTS_PER_SECOND', 2))
+    UPSTREAM_BURST = int(os.getenv('UPSTREAM_BURST', 5))
+    UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 3))
+    UPSTREAM_BACKOFF_SECONDS = float(os.getenv('UPSTREAM_BACKOFF_SECONDS', 0.5))
+    CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS = float(os.getenv('CIRCUIT_BREAKER_COOLDOWN_SECONDS', 60))
+    # 離線替身伺服器網址（空白表示使用真實的證交所／櫃買中心）
+    EXCHANGE_BASE_URL = os.getenv('EXCHANGE_BASE_URL', '')
+
+    # 過期快取處理（stale-while-revalidate）
+    STALE_WHILE_REVALIDATE = os.getenv('STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
+    REFRESH_WORKERS = int(os.getenv('REFRESH_WORKERS', 2))
+
+    # 全市場歷史回填（python -m services.backfill_service）
+    BACKFILL_PROCESSES = int(os.getenv('BACKFILL_PROCESSES', 4))
+    BACKFILL_CHUNK_MONTHS = int(os.getenv('BACKFILL_CHUNK_MONTHS', 12))
+    BACKFILL_REPORT_EVERY = int(os.getenv('BACKFILL_REPORT_EVERY', 20))
+
+    # 收盤後背景更新排程
+    REFRESH_SCHEDULER_ENABLED = os.getenv('REFRESH_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    REFRESH_SCHEDULER_POLL_SECONDS = float(os.getenv('REFRESH_SCHEDULER_POLL_SECONDS', 300))
+    REFRESH_SCHEDULER_INTERVAL_SECONDS = float(os.getenv('REFRESH_SCHEDULER_INTERVAL_SECONDS', 2))
+    REFRESH_SCHEDULER_MAX_ATTEMPTS = int(os.getenv('REFRESH_SCHEDULER_MAX_ATTEMPTS', 3))
+    ACCESS_HALF_LIFE_DAYS = float(os.getenv('ACCESS_HALF_LIFE_DAYS', 7))
+    ACCESS_FLUSH_SECONDS = float(os.getenv('ACCESS_FLUSH_SECONDS', 60))
+
+    # 啟動預熱：各 worker 在背景載入熱門股票的快取與技術指標，完成或超過時間預算前 /api/ready 回應 503
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+    # 必定預熱的股票（逗號分隔，排在查詢頻率之前）
+    WARMUP_TICKERS = [x.strip() for x in os.getenv('WARMUP_TICKERS', '').split(',') if x.strip()]
+    WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', 20))
+    WARMUP_TIME_BUDGET_SECONDS = float(os.getenv('WARMUP_TIME_BUDGET_SECONDS', 60))
 
     # 速率限制
     RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', 10))
@@ -21,12 +21,19 @@ echo "🔄 重新啟動 Docker 容器..."
 sudo docker compose down
 sudo docker compose up -d --build
 
-# 等待服務啟動
-echo "⏳ 等待服務啟動..."
-sleep 5
-
-# 檢查健康狀態
-if curl -s http://localhost:5000/api/health > /dev/null 2>&1; then
+# 等待服務就緒（熱門股票預熱完成前 /api/ready 回應 503，最多等待 120 秒）
+echo "⏳ 等待服務就緒..."
+READY=false
+for i in $(seq 1 60); do
+    if curl -sf http://localhost:5000/api/ready > /dev/null 2>&1; then
+        READY=true
+        break
+    fi
+    sleep 2
+done
+
+# 檢查就緒狀態
+if [ "$READY" = true ]; then
     echo ""
     echo "✅ 更新完成！服務已就緒"
     echo ""
@@ -2,7 +2,7 @@
 API 路由
 負責處理 RESTful API 請求
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from datetime import datetime
 import traceback
 
@@ -10,9 +10,11 @@ from services import (
     StockDataService,
     IndicatorService,
     SignalService,
-    ChartService
+    ChartService,
+    MarketScanService
 )
 from config import Config
+from utils.circuit_breaker import CircuitOpenError
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -21,6 +23,7 @@ stock_service = StockDataService()
 indicator_service = IndicatorService()
 signal_service = SignalService()
 chart_service = ChartService()
+market_scan_service = MarketScanService()
 
 
 def create_response(success=True, data=None, error=None):
@@ -92,10 +95,11 @@ def analyze_stock():
                 }
             )), 400
 
-        # 獲取股票數據
-        df = stock_service.get_stock_data(ticker, start_date)
+        # 獲取股票數據並計算技術指標（快取過期時先回應快取數據，背景更新；
+        # 熱門股票的指標結果由各 worker 共享，不重新載入與計算；其餘由增量引擎只計算新的交易日）
+        df_with_indicators, cache_status = stock_service.get_indicator_data(ticker, start_date)
 
-        if df.empty:
+        if df_with_indicators.empty:
             return jsonify(create_response(
                 success=False,
                 error={
@@ -104,9 +108,6 @@ def analyze_stock():
                 }
             )), 404
 
-        # 計算技術指標
-        df_with_indicators = indicator_service.calculate_all(df)
-
         if len(df_with_indicators) < 60:
             return jsonify(create_response(
                 success=False,
@@ -186,7 +187,9 @@ def analyze_stock():
             'cache_info': {
                 'is_cached': cache_info is not None,
                 'last_update': cache_info['last_update'] if cache_info else None,
-                'data_source': 'cache' if cache_info else 'fresh'
+                'data_source': 'cache' if cache_info else 'fresh',
+                'is_stale': cache_status['is_stale'],
+                'refresh_pending': cache_status['refresh_pending']
             }
         }
 
@@ -201,6 +204,16 @@ def analyze_stock():
             }
         )), 404
 
+    except CircuitOpenError as e:
+        return jsonify(create_response(
+            success=False,
+            error={
+                'code': 'EXTERNAL_API_ERROR',
+                'message': '股票數據源暫時無法連接，請稍後再試',
+                'details': str(e)
+            }
+        )), 503
+
     except Exception as e:
         print(f"API Error: {e}")
         print(traceback.format_exc())
@@ -375,6 +388,69 @@ def get_stocks_list():
         )), 500
 
 
+@api_bp.route('/market/breadth', methods=['GET'])
+def get_market_breadth():
+    """全市場收盤價站上 N 日均線的比例（以日期 × 股票面板計算）"""
+    if not Config.PANEL_ENABLED:
+        return _panel_disabled()
+    if market_scan_service.get_panel() is None:
+        return _panel_not_ready()
+    try:
+        window = int(request.args.get('window', 20))
+        result = market_scan_service.above_ma(window=window, date=request.args.get('date'))
+        return jsonify(create_response(success=True, data=result))
+
+    except Exception as e:
+        return jsonify(create_response(
+            success=False,
+            error={
+                'code': 'INTERNAL_SERVER_ERROR',
+                'message': str(e)
+            }
+        )), 500
+
+
+@api_bp.route('/market/signals', methods=['GET'])
+def get_market_signals():
+    """全市場當日出現買點的股票（以日期 × 股票面板計算）"""
+    if not Config.PANEL_ENABLED:
+        return _panel_disabled()
+    if market_scan_service.get_panel() is None:
+        return _panel_not_ready()
+    try:
+        result = market_scan_service.buy_signals(date=request.args.get('date'))
+        return jsonify(create_response(success=True, data=result))
+
+    except Exception as e:
+        return jsonify(create_response(
+            success=False,
+            error={
+                'code': 'INTERNAL_SERVER_ERROR',
+                'message': str(e)
+            }
+        )), 500
+
+
+def _panel_disabled():
+    return jsonify(create_response(
+        success=False,
+        error={
+            'code': 'PANEL_DISABLED',
+            'message': '日期 × 股票面板未啟用（PANEL_ENABLED=false）'
+        }
+    )), 503
+
+
+def _panel_not_ready():
+    return jsonify(create_response(
+        success=False,
+        error={
+            'code': 'PANEL_NOT_READY',
+            'message': '日期 × 股票面板尚未建立（由收盤後更新排程建立，或執行 python -m utils.panel_store sync）'
+        }
+    )), 503
+
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """健康檢查"""
@@ -384,5 +460,29 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'cache_count': len(stock_service.cache_manager.get_all_cached_stocks()),
-        'cache_dir_exists': os.path.exists(Config.CACHE_DIR)
+        'cache_dir_exists': os.path.exists(Config.CACHE_DIR),
+        'frame_cache': stock_service.cache_manager.frame_cache.stats(),
+        'shared_frames': stock_service.shared_store.stats() if stock_service.shared_store else None,
+        'warmup': _warmup_status()
     })
+
+
+@api_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    就緒檢查：本 worker 的啟動預熱結束（完成或超過時間預算）前回應 503，
+    部署腳本與容器健康檢查以此等待熱門股票載入完成
+    """
+    warmup = _warmup_status()
+    ready = warmup is None or warmup['state'] not in ('pending', 'running')
+    return jsonify({
+        'status': 'ready' if ready else 'warming_up',
+        'timestamp': datetime.now().isoformat(),
+        'warmup': warmup
+    }), 200 if ready else 503
+
+
+def _warmup_status():
+    """本 worker 的預熱進度，未啟用預熱時為 None"""
+    warmer = current_app.extensions.get('cache_warmer')
+    return warmer.status() if warmer else None
@@ -3,12 +3,26 @@
 """
 from .stock_data_service import StockDataService
 from .indicator_service import IndicatorService
+from .indicator_engine import IndicatorEngine
 from .signal_service import SignalService
 from .chart_service import ChartService
+from .market_ingest_service import MarketIngestService
+from .refresh_scheduler import RefreshScheduler
+from .backfill_service import BackfillService
+from .cache_warmer import CacheWarmer
+from .cache_scrubber import CacheScrubber
+from .market_scan_service import MarketScanService
 
 __all__ = [
     'StockDataService',
     'IndicatorService',
+    'IndicatorEngine',
     'SignalService',
-    'ChartService'
+    'ChartService',
+    'MarketIngestService',
+    'RefreshScheduler',
+    'BackfillService',
+    'CacheWarmer',
+    'CacheScrubber',
+    'MarketScanService'
 ]
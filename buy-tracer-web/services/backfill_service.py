@@ -0,0 +1,290 @@
+"""
+全市場歷史數據回填
+以多進程為整個上市（櫃）市場建立快取，所有進程共用一個上游請求速率預算；
+每檔股票分段抓取、解析並寫入，不在記憶體中保留全部月份；
+完成的股票記錄在檢查點檔，中斷後重新執行會從未完成的股票繼續
+"""
+import json
+import os
+import time
+import multiprocessing
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import twstock
+from config import Config
+from utils import DateUtils, FetchEngine, MonthStore, SingleFlight, create_cache_manager
+from utils.atomic_file import atomic_write
+from utils.fetch_engine import SharedRateLimiter, set_host_limiter
+from .stock_data_service import StockDataService
+
+# 子進程內的股票數據服務（由 _init_worker 建立）
+_worker_service: Optional[StockDataService] = None
+
+
+def get_universe(markets: List[str] = None, types: List[str] = None) -> Dict[str, str]:
+    """
+    從 twstock 代號表取得回填範圍
+
+    Args:
+        markets: 'TWSE'（上市）、'TPEX'（上櫃），默認只有上市
+        types: 證券類型，默認只有 '股票'
+
+    Returns:
+        Dict[str, str]: 股票代號 → 掛牌日期 (YYYY-MM-DD)
+    """
+    markets = markets or ['TWSE']
+    types = types or ['股票']
+    tables = {'TWSE': twstock.twse, 'TPEX': twstock.tpex}
+
+    universe = {}
+    for market in markets:
+        for code, info in tables[market].items():
+            if info.type in types:
+                universe[code] = info.start.replace('/', '-') if info.start else ''
+    return dict(sorted(universe.items()))
+
+
+def _init_worker(rate_per_second: float, next_slot, cache_dir: str, month_store_dir: str,
+                 lock_dir: str):
+    """子進程初始化：套用修補、安裝共用速率限制器、建立數據服務"""
+    global _worker_service
+    from utils import apply_twstock_patch
+    apply_twstock_patch()
+
+    limiter = SharedRateLimiter(rate_per_second, next_slot)
+    for url in (twstock.stock.TWSE_BASE_URL, twstock.stock.TPEX_BASE_URL,
+                twstock.stock.TWSEFetcher.REPORT_URL, twstock.stock.TPEXFetcher.REPORT_URL):
+        set_host_limiter(urllib.parse.urlparse(url).netloc, limiter)
+
+    cache_manager = create_cache_manager(cache_dir)
+    # redis 後端由多台主機共用，股票鎖改用後端的鎖才能與各主機的線上服務互斥
+    lock_factory = cache_manager.lock_for if Config.CACHE_BACKEND == 'redis' else None
+    _worker_service = StockDataService(
+        cache_manager=cache_manager,
+        fetch_engine=FetchEngine(month_store=MonthStore(month_store_dir)),
+        single_flight=SingleFlight(lock_dir, lock_factory=lock_factory)
+    )
+
+
+def backfill_ticker(service: StockDataService, ticker: str, start_date: str, end_date: str,
+                    chunk_months: int = None) -> Dict:
+    """
+    回填單一股票，每次抓取 chunk_months 個月並立即寫入快取
+
+    已有快取時只補快取區間之前與之後的月份；寫入在股票鎖內進行，可與線上服務同時執行
+
+    Args:
+        service: 股票數據服務
+        ticker: 股票代號
+        start_date: 開始日期 (YYYY-MM-DD)
+        end_date: 結束日期 (YYYY-MM-DD)
+        chunk_months: 每段月份數
+
+    Returns:
+        Dict: {'ticker', 'bars', 'months', 'seconds'}
+    """
+    chunk_months = chunk_months or Config.BACKFILL_CHUNK_MONTHS
+    started = time.monotonic()
+    cache_manager = service.cache_manager
+
+    # 已快取的區間不再抓取（只補之前與之後缺少的部分）
+    cached_start, cached_end = '9999-99-99', ''
+    info = cache_manager.get_cache_info(ticker)
+    if info and info['date_range'].get('end_date'):
+        cached_start = info['date_range']['start_date']
+        cached_end = info['date_range']['end_date']
+
+    months = [
+        (year, month) for year, month in DateUtils.get_date_range_months(
+            datetime.strptime(start_date, '%Y-%m-%d'), datetime.strptime(end_date, '%Y-%m-%d'))
+        if f"{year:04d}-{month:02d}" <= cached_start[:7] or f"{year:04d}-{month:02d}" >= cached_end[:7]
+    ]
+
+    bars = 0
+    for i in range(0, len(months), chunk_months):
+        df = service._fetch_months(ticker, months[i:i + chunk_months])
+        if df.empty:
+            continue
+        df = df[(df['date'] >= start_date) & (df['date'] <= end_date) &
+                ((df['date'] < cached_start) | (df['date'] > cached_end))]
+        if df.empty:
+            continue
+
+        with service.single_flight.lock_for(ticker):
+            if cache_manager.exists(ticker):
+                cache_manager.merge_data(ticker, df)
+            else:
+                cache_manager.create_cache(ticker, service._get_stock_name(ticker), df)
+        cached_start = min(cached_start, df['date'].iloc[0])
+        cached_end = max(cached_end, df['date'].iloc[-1])
+        bars += len(df)
+
+    return {'ticker': ticker, 'bars': bars, 'months': len(months),
+            'seconds': round(time.monotonic() - started, 3)}
+
+
+def _run_in_worker(ticker: str, start_date: str, end_date: str, chunk_months: int) -> Dict:
+    try:
+        return backfill_ticker(_worker_service, ticker, start_date, end_date, chunk_months)
+    except Exception as e:
+        return {'ticker': ticker, 'bars': 0, 'error': str(e)}
+
+
+class BackfillService:
+    """全市場歷史數據回填"""
+
+    def __init__(self, processes: int = None, rate_per_second: float = None,
+                 chunk_months: int = None, checkpoint_file: str = None, cache_dir: str = None,
+                 month_store_dir: str = None, lock_dir: str = None):
+        """
+        初始化回填服務
+
+        Args:
+            processes: 進程數
+            rate_per_second: 所有進程合計的上游每秒請求數
+            chunk_months: 每次抓取並寫入的月份數
+            checkpoint_file: 檢查點檔路徑
+            cache_dir: 快取目錄
+            month_store_dir: 月份原始快取目錄
+            lock_dir: 股票鎖目錄
+        """
+        self.processes = processes or Config.BACKFILL_PROCESSES
+        self.rate_per_second = rate_per_second or Config.UPSTREAM_REQUESTS_PER_SECOND
+        self.chunk_months = chunk_months or Config.BACKFILL_CHUNK_MONTHS
+        self.checkpoint_file = checkpoint_file or os.path.join(Config.METADATA_DIR, 'backfill_checkpoint.json')
+        self.cache_dir = cache_dir or Config.CACHE_DIR
+        self.month_store_dir = month_store_dir or Config.MONTH_STORE_DIR
+        self.lock_dir = lock_dir or Config.LOCK_DIR
+
+    def run(self, universe: Dict[str, str], start_date: str, end_date: str = None,
+            restart: bool = False) -> Dict:
+        """
+        回填所有股票
+
+        Args:
+            universe: 股票代號 → 掛牌日期（早於掛牌日的月份不抓取）
+            start_date: 開始日期 (YYYY-MM-DD)
+            end_date: 結束日期，默認為最新可用日期
+            restart: 忽略既有檢查點重新開始
+
+        Returns:
+            Dict: 執行報告（含 tickers_per_minute、bars_per_second）
+        """
+        end_date = end_date or DateUtils.get_latest_available_date().strftime('%Y-%m-%d')
+        checkpoint = {} if restart else self.load_checkpoint()
+        if (checkpoint.get('start_date'), checkpoint.get('end_date')) != (start_date, end_date):
+            checkpoint = {'start_date': start_date, 'end_date': end_date,
+                          'started_at': datetime.now().isoformat(), 'done': {}, 'failed': {}}
+            self.save_checkpoint(checkpoint)
+
+        pending = [t for t in universe if t not in checkpoint['done']]
+        print(f"回填 {start_date} ~ {end_date}: 共 {len(universe)} 檔，"
+              f"已完成 {len(universe) - len(pending)} 檔，待處理 {len(pending)} 檔")
+
+        started = time.monotonic()
+        bars = 0
+        completed = 0
+
+        context = multiprocessing.get_context()
+        next_slot = context.Value('d', 0.0)
+        with ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.rate_per_second, next_slot, self.cache_dir, self.month_store_dir, self.lock_dir)
+        ) as executor:
+            futures = [
+                executor.submit(_run_in_worker, ticker, max(start_date, universe[ticker] or start_date),
+                                end_date, self.chunk_months)
+                for ticker in pending
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                ticker = result['ticker']
+                if 'error' in result:
+                    checkpoint['failed'][ticker] = result['error']
+                    print(f"  !!! 回填失敗: {ticker} - {result['error']}")
+                else:
+                    checkpoint['done'][ticker] = result['bars']
+                    checkpoint['failed'].pop(ticker, None)
+                    bars += result['bars']
+                completed += 1
+                self.save_checkpoint(checkpoint)
+
+                if completed % Config.BACKFILL_REPORT_EVERY == 0:
+                    print(f"  > {completed}/{len(pending)} 檔，"
+                          f"{self._throughput(completed, bars, started)}")
+
+        report = self._report(len(pending), completed, bars, started, checkpoint)
+        print(f"  > 回填結束: {report['tickers']} 檔，{report['bars']} 筆，"
+              f"{report['tickers_per_minute']} 檔/分鐘，{report['bars_per_second']} 筆/秒，"
+              f"失敗 {len(report['failed'])} 檔")
+        return report
+
+    @staticmethod
+    def _throughput(completed: int, bars: int, started: float) -> str:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        return f"{completed / elapsed * 60:.1f} 檔/分鐘，{bars / elapsed:.0f} 筆/秒"
+
+    @staticmethod
+    def _report(pending: int, completed: int, bars: int, started: float, checkpoint: Dict) -> Dict:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        return {
+            'pending': pending,
+            'tickers': completed,
+            'bars': bars,
+            'seconds': round(elapsed, 3),
+            'tickers_per_minute': round(completed / elapsed * 60, 2),
+            'bars_per_second': round(bars / elapsed, 2),
+            'done_total': len(checkpoint['done']),
+            'failed': sorted(checkpoint['failed'])
+        }
+
+    def load_checkpoint(self) -> Dict:
+        """讀取檢查點"""
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"回填檢查點讀取失敗: {e}")
+            return {}
+
+    def save_checkpoint(self, checkpoint: Dict):
+        """寫入檢查點（原子替換）"""
+        checkpoint['updated_at'] = datetime.now().isoformat()
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+            atomic_write(self.checkpoint_file, json.dumps(checkpoint, ensure_ascii=False, indent=2).encode('utf-8'))
+        except (IOError, OSError) as e:
+            print(f"回填檢查點保存失敗: {e}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='全市場歷史數據回填')
+    parser.add_argument('--start', default=Config.DEFAULT_START_DATE, help='開始日期 (YYYY-MM-DD)')
+    parser.add_argument('--end', help='結束日期（默認為最新可用日期）')
+    parser.add_argument('--markets', default='TWSE', help='市場，逗號分隔（TWSE,TPEX）')
+    parser.add_argument('--tickers', help='只回填指定股票，逗號分隔')
+    parser.add_argument('--limit', type=int, help='只回填前 N 檔')
+    parser.add_argument('--processes', type=int, help='進程數')
+    parser.add_argument('--rate', type=float, help='所有進程合計的上游每秒請求數')
+    parser.add_argument('--chunk-months', type=int, help='每次抓取並寫入的月份數')
+    parser.add_argument('--restart', action='store_true', help='忽略檢查點重新開始')
+    args = parser.parse_args()
+
+    universe = get_universe(args.markets.split(','))
+    if args.tickers:
+        universe = {t: universe.get(t, '') for t in args.tickers.split(',')}
+    if args.limit:
+        universe = dict(list(universe.items())[:args.limit])
+
+    BackfillService(
+        processes=args.processes, rate_per_second=args.rate, chunk_months=args.chunk_months
+    ).run(universe, args.start, args.end, restart=args.restart)
@@ -0,0 +1,161 @@
+"""
+快取背景巡檢
+定期依校驗檔驗證整個快取目錄（包含很少被查詢、平常不會被讀取驗證的股票），
+損壞時截斷到最後一個有效區塊，沒有校驗檔的舊快取補建校驗檔。
+讀取量受 CACHE_SCRUB_MB_PER_SECOND 限制，不與查詢搶磁碟；
+多個 worker 進程以檔案鎖選出一個執行；依股票代號順序驗證，每 CACHE_SCRUB_CHECKPOINT_EVERY 檔
+把最後驗證的代號寫入進度檔，重啟後從該代號之後繼續
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import Config
+from utils import CacheManagerBase, FileLock, create_cache_manager
+from utils.atomic_file import atomic_write
+
+# 檢查是否需要開始新一輪的間隔（秒）
+POLL_SECONDS = 3600
+
+
+class CacheScrubber:
+    """快取背景巡檢"""
+
+    def __init__(self, cache_manager: CacheManagerBase = None, bytes_per_second: float = None,
+                 progress_file: str = None, lock_file: str = None):
+        """
+        初始化巡檢
+
+        Args:
+            cache_manager: 快取管理器
+            bytes_per_second: 讀取預算（位元組/秒），默認為 CACHE_SCRUB_MB_PER_SECOND
+            progress_file: 進度檔路徑
+            lock_file: 巡檢鎖路徑（同一時間只有一個進程執行）
+        """
+        self.cache_manager = cache_manager or create_cache_manager()
+        self.bytes_per_second = bytes_per_second or Config.CACHE_SCRUB_MB_PER_SECOND * 1024 * 1024
+        self.progress_file = progress_file or os.path.join(Config.METADATA_DIR, 'scrub_progress.json')
+        self.lock_file = lock_file or os.path.join(Config.LOCK_DIR, 'cache_scrubber.lock')
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """啟動背景巡檢執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='cache-scrubber', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景巡檢（目前股票驗證完成後結束）"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"  !!! 快取巡檢錯誤: {e}")
+            self._stop_event.wait(POLL_SECONDS)
+
+    def tick(self, now: datetime = None) -> Optional[Dict]:
+        """
+        距離上一輪完成超過 CACHE_SCRUB_INTERVAL_HOURS 時取得巡檢鎖並執行（或繼續）一輪
+
+        Returns:
+            Dict: 本輪進度，未執行時為 None
+        """
+        now = now or datetime.now()
+        progress = self.load_progress()
+        completed_at = progress.get('completed_at')
+        if completed_at and now - datetime.fromisoformat(completed_at) < timedelta(
+                hours=Config.CACHE_SCRUB_INTERVAL_HOURS):
+            return None
+
+        lock = FileLock(self.lock_file)
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            return self.run()
+        finally:
+            lock.release()
+
+    def run(self) -> Dict:
+        """
+        執行一輪巡檢，依股票代號順序從上次的位置繼續；每檔驗證後依讀取量暫停，平均讀取速度不超過預算
+
+        Returns:
+            Dict: 本輪進度（cursor 為最後驗證的股票代號，checked 為已驗證檔數，counts 為各結果的股票數）
+        """
+        progress = self.load_progress()
+        if not progress.get('started_at') or progress.get('completed_at') or 'cursor' not in progress:
+            progress = {'started_at': datetime.now().isoformat(), 'cursor': '', 'checked': 0,
+                        'counts': {}, 'bytes': 0}
+            self.save_progress(progress)
+
+        pending = sorted(t for t in self.cache_manager.get_all_cached_stocks() if t > progress['cursor'])
+        print(f"快取巡檢: 待驗證 {len(pending)} 檔")
+
+        unsaved = 0
+        for ticker in pending:
+            if self._stop_event.is_set():
+                break
+            try:
+                result = self.cache_manager.verify(ticker)
+            except Exception as e:
+                print(f"  !!! 快取巡檢失敗: {ticker} - {e}")
+                result = {'status': 'error', 'bytes': 0}
+            if result is None:
+                print("快取後端不支援校驗，停止巡檢")
+                break
+
+            progress['cursor'] = ticker
+            progress['checked'] += 1
+            progress['counts'][result['status']] = progress['counts'].get(result['status'], 0) + 1
+            progress['bytes'] += result['bytes']
+            unsaved += 1
+            if unsaved >= Config.CACHE_SCRUB_CHECKPOINT_EVERY:
+                self.save_progress(progress)
+                unsaved = 0
+            if self._stop_event.wait(result['bytes'] / self.bytes_per_second):
+                break
+
+        if self._stop_event.is_set():
+            if unsaved:
+                self.save_progress(progress)
+            return progress
+
+        progress['completed_at'] = datetime.now().isoformat()
+        self.save_progress(progress)
+        print(f"  > 快取巡檢完成: {progress['checked']} 檔 {progress['counts']}")
+        return progress
+
+    def load_progress(self) -> Dict:
+        """讀取進度檔"""
+        if not os.path.exists(self.progress_file):
+            return {}
+        try:
+            with open(self.progress_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"巡檢進度讀取失敗: {e}")
+            return {}
+
+    def save_progress(self, progress: Dict):
+        """寫入進度檔（原子替換，中斷時不會留下損壞的檔案）"""
+        progress['updated_at'] = datetime.now().isoformat()
+        try:
+            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
+            atomic_write(self.progress_file, json.dumps(progress, ensure_ascii=False, indent=2).encode('utf-8'))
+        except (IOError, OSError) as e:
+            print(f"巡檢進度保存失敗: {e}")
+
+
+if __name__ == '__main__':
+    # 獨立執行：立即巡檢一輪（不受間隔限制）
+    CacheScrubber().run()
@@ -0,0 +1,138 @@
+"""
+啟動預熱
+部署重啟後，各 worker 在背景依設定清單與近期查詢頻率載入熱門股票的快取與技術指標，
+讓部署後的第一批查詢不必從冷磁碟讀取與重新計算。
+只使用已有的快取（不請求上游）；預熱完成或超過時間預算前，就緒檢查回應尚未就緒
+"""
+import threading
+import time
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from config import Config
+from utils import AccessTracker
+from .stock_data_service import StockDataService
+
+
+class CacheWarmer:
+    """啟動預熱（每個 worker 一個）"""
+
+    def __init__(self, stock_service: StockDataService = None, access_tracker: AccessTracker = None,
+                 compute: Callable[[pd.DataFrame], pd.DataFrame] = None, tickers: List[str] = None,
+                 top_n: int = None, time_budget: float = None):
+        """
+        初始化預熱
+
+        Args:
+            stock_service: 股票數據服務（與 API 共用，預熱結果留在同一個進程）
+            access_tracker: 查詢頻率統計
+            compute: 技術指標計算函數，默認由股票數據服務決定（增量引擎或 IndicatorService.calculate_all）
+            tickers: 必定預熱的股票，默認為 WARMUP_TICKERS
+            top_n: 預熱的股票數上限，默認為 WARMUP_TOP_N
+            time_budget: 時間預算（秒），默認為 WARMUP_TIME_BUDGET_SECONDS
+        """
+        self.stock_service = stock_service or StockDataService()
+        self.access_tracker = access_tracker or self.stock_service.access_tracker
+        self.compute = compute
+        self.tickers = Config.WARMUP_TICKERS if tickers is None else tickers
+        self.top_n = Config.WARMUP_TOP_N if top_n is None else top_n
+        self.time_budget = Config.WARMUP_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._status = {'state': 'pending', 'total': 0, 'warmed': 0, 'skipped': 0,
+                        'failed': 0, 'elapsed_seconds': 0.0}
+
+    def start(self):
+        """啟動背景預熱執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止預熱（目前股票完成後結束）"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def is_ready(self) -> bool:
+        """預熱已結束（完成、超過時間預算或中止）"""
+        with self._lock:
+            return self._status['state'] not in ('pending', 'running')
+
+    def status(self) -> Dict:
+        """
+        預熱進度
+
+        Returns:
+            Dict: {'state', 'total', 'warmed', 'skipped', 'failed', 'elapsed_seconds', 'time_budget'}；
+                state 為 pending / running / done / timeout / stopped
+        """
+        with self._lock:
+            return dict(self._status, time_budget=self.time_budget)
+
+    def _update(self, **changes):
+        with self._lock:
+            self._status.update(changes)
+
+    def get_tickers(self) -> List[str]:
+        """
+        獲取要預熱的股票：設定清單在前，其餘依近期查詢頻率由高到低，只取已快取的股票
+
+        Returns:
+            List[str]: 股票代號列表（最多 top_n 檔）
+        """
+        cached = set(self.stock_service.cache_manager.get_all_cached_stocks())
+        scores = self.access_tracker.get_scores()
+        ranked = sorted((t for t in cached if scores.get(t, 0.0) > 0), key=lambda t: (-scores[t], t))
+
+        tickers = []
+        for ticker in list(self.tickers) + ranked:
+            if ticker in cached and ticker not in tickers:
+                tickers.append(ticker)
+        return tickers[:self.top_n]
+
+    def run(self) -> Dict:
+        """
+        執行預熱，超過時間預算時停止
+
+        Returns:
+            Dict: 預熱結果
+        """
+        started = time.monotonic()
+        self._update(state='running')
+        try:
+            tickers = self.get_tickers()
+        except Exception as e:
+            print(f"  !!! 預熱清單讀取失敗: {e}")
+            tickers = []
+        self._update(total=len(tickers))
+        print(f"啟動預熱: {len(tickers)} 檔（時間預算 {self.time_budget:g} 秒）")
+
+        state = 'done'
+        for ticker in tickers:
+            if self._stop_event.is_set():
+                state = 'stopped'
+                break
+            if time.monotonic() - started >= self.time_budget:
+                state = 'timeout'
+                break
+
+            try:
+                warmed = self.stock_service.warm(ticker, Config.DEFAULT_START_DATE, self.compute)
+                field = 'warmed' if warmed else 'skipped'
+            except Exception as e:
+                print(f"  !!! 預熱失敗: {ticker} - {e}")
+                field = 'failed'
+            with self._lock:
+                self._status[field] += 1
+                self._status['elapsed_seconds'] = round(time.monotonic() - started, 3)
+
+        self._update(state=state, elapsed_seconds=round(time.monotonic() - started, 3))
+        status = self.status()
+        print(f"  > 預熱結束 ({state}): {status['warmed']}/{status['total']} 檔，"
+              f"{status['elapsed_seconds']:.1f} 秒")
+        return status
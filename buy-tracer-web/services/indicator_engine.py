@@ -0,0 +1,242 @@
+"""
+增量技術指標引擎
+IndicatorService.calculate_all 每次查詢都對整段歷史重新計算移動平均與 EMA，但每天只多一根 K 線。
+引擎把每檔股票的指標序列與遞推狀態（各均線的滾動和與視窗、EMA12/EMA26/DEM、均量）
+保存在 INDICATOR_DIR，新的交易日以固定時間逐筆更新後附加，查詢時只讀取已保存的序列
+
+- {ticker}.ind：每個交易日一筆 float64 記錄（date、close、volume 與指標欄位，依日期排序），只附加
+- {ticker}.state.json：遞推狀態與已提交的筆數（原子替換，提交點）
+- {ticker}.lock：該股票的寫入鎖（附加與重建只與同一檔股票互斥，與 SingleFlight 相同）
+
+指標依起始日遞推（EMA 由第一筆收盤價開始），只有從 start_date（默認 DEFAULT_START_DATE）起算的查詢使用引擎。
+每次查詢比對已保存序列與股票數據在同一筆的日期、收盤價與成交量，不一致（補入較早日期、修復截斷、
+最後一日的數據更正）或參數變更時，以 IndicatorService 重建。
+
+與 pandas 的差異：EMA 依 ewm(adjust=False) 相同的公式逐筆遞推；滾動和以補償求和增減，
+與 rolling().mean() 的相對誤差在 TOLERANCE 以內
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from utils.atomic_file import atomic_write
+from utils.single_flight import FileLock
+from .indicator_service import VOLUME_MA_PERIOD, IndicatorService
+
+STATE_VERSION = 1
+# 增量結果與 pandas rolling().mean() / ewm(adjust=False) 的相對誤差上限
+TOLERANCE = 1e-9
+# 記錄中指標欄位之前的欄位
+BAR_COLUMNS = ('date', 'close', 'volume')
+
+
+def _kahan_add(acc: List[float], value: float) -> List[float]:
+    """補償求和（Neumaier）：acc 為 [和, 補償量]"""
+    total, compensation = acc
+    result = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - result) + value
+    else:
+        compensation += (value - result) + total
+    return [result, compensation]
+
+
+class IndicatorEngine:
+    """增量技術指標引擎"""
+
+    def __init__(self, directory: str = None, start_date: str = None):
+        """
+        初始化引擎
+
+        Args:
+            directory: 狀態目錄，默認為 INDICATOR_DIR
+            start_date: 指標的起始日期，默認為 DEFAULT_START_DATE
+        """
+        self.directory = directory or Config.INDICATOR_DIR
+        self.start_date = start_date or Config.DEFAULT_START_DATE
+        self.params = {
+            'ma': list(Config.MA_PERIODS),
+            'macd': [Config.MACD_FAST, Config.MACD_SLOW, Config.MACD_SIGNAL],
+            'volume': VOLUME_MA_PERIOD
+        }
+        self.columns = IndicatorService.indicator_columns(self.params['ma'])
+        self.row_size = 8 * (len(BAR_COLUMNS) + len(self.columns))
+
+    def _paths(self, ticker: str):
+        return (os.path.join(self.directory, f"{ticker}.ind"),
+                os.path.join(self.directory, f"{ticker}.state.json"))
+
+    def _lock_path(self, ticker: str) -> str:
+        return os.path.join(self.directory, f"{ticker}.lock")
+
+    def _read_state(self, ticker: str) -> Optional[Dict]:
+        try:
+            with open(self._paths(ticker)[1], 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _read_rows(self, ticker: str, start: int, count: int) -> Optional[np.ndarray]:
+        """讀取第 start 筆起的 count 筆記錄，檔案不足時返回 None"""
+        try:
+            with open(self._paths(ticker)[0], 'rb') as f:
+                f.seek(start * self.row_size)
+                data = f.read(count * self.row_size)
+        except IOError:
+            return None
+        if len(data) != count * self.row_size:
+            return None
+        return np.frombuffer(data, dtype='<f8').reshape(count, -1)
+
+    @staticmethod
+    def _bars(df: pd.DataFrame, start: int = 0, stop: int = None) -> np.ndarray:
+        """股票數據第 start 至 stop 筆轉為記錄的 date、close、volume 欄位"""
+        dates = df.index.values[start:stop].astype('datetime64[D]').astype(np.float64)
+        return np.column_stack([dates, df['close'].to_numpy(np.float64)[start:stop],
+                                df['volume'].to_numpy(np.float64)[start:stop]])
+
+    def _status(self, ticker: str, state: Optional[Dict], df: pd.DataFrame) -> str:
+        """
+        比對已保存的序列與股票數據
+
+        Returns:
+            str: 'current'（已包含所有交易日）、'append'（只需附加新的交易日）或 'rebuild'
+        """
+        if (not state or state.get('version') != STATE_VERSION or state.get('params') != self.params
+                or state.get('start_date') != self.start_date):
+            return 'rebuild'
+        last = min(state['count'], len(df)) - 1
+        row = self._read_rows(ticker, last, 1) if last >= 0 else None
+        if row is None or not np.array_equal(row[0, :len(BAR_COLUMNS)], self._bars(df, last, last + 1)[0]):
+            return 'rebuild'
+        return 'append' if state['count'] < len(df) else 'current'
+
+    def calculate(self, ticker: str, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        計算技術指標（結果與 IndicatorService.calculate_all 相同）
+
+        Args:
+            ticker: 股票代號
+            df: 自 start_date 起、以日期為索引的股票數據
+
+        Returns:
+            pd.DataFrame: 包含技術指標的 DataFrame
+        """
+        if df.empty:
+            return IndicatorService.calculate_all(df)
+
+        state = self._read_state(ticker)
+        if self._status(ticker, state, df) != 'current':
+            with FileLock(self._lock_path(ticker)):
+                state = self._read_state(ticker)
+                status = self._status(ticker, state, df)
+                if status == 'append':
+                    state = self._append(ticker, state, df)
+                elif status == 'rebuild':
+                    state = self._rebuild(ticker, df)
+
+        records = self._read_rows(ticker, 0, len(df))
+        # 讀取期間被其他進程重建成不同的數據時改為直接計算
+        if records is None or not np.array_equal(records[-1, :len(BAR_COLUMNS)], self._bars(df, -1)[0]):
+            return IndicatorService.calculate_all(df)
+        return IndicatorService.frame_with_indicators(df, records[:, len(BAR_COLUMNS):].T, self.columns)
+
+    def _rebuild(self, ticker: str, df: pd.DataFrame) -> Dict:
+        """以 IndicatorService 計算整段序列並保存遞推狀態"""
+        print(f"重建技術指標序列: {ticker} ({len(df)} 筆)")
+        block = IndicatorService.compute_block(df['close'].to_numpy(), df['volume'].to_numpy(), self.params['ma'])
+        ema_fast, ema_slow, _, dem = block[len(self.params['ma']):len(self.params['ma']) + 4, -1]
+
+        closes = df['close'].to_numpy(np.float64)[-max(self.params['ma']):]
+        volumes = df['volume'].to_numpy(np.float64)[-VOLUME_MA_PERIOD:]
+        state = {
+            'version': STATE_VERSION,
+            'params': self.params,
+            'start_date': self.start_date,
+            'count': len(df),
+            'closes': closes.tolist(),
+            'volumes': volumes.tolist(),
+            'sums': {str(period): [float(closes[-period:].sum()), 0.0] for period in self.params['ma']},
+            'volume_sum': [float(volumes.sum()), 0.0],
+            'ema_fast': float(ema_fast),
+            'ema_slow': float(ema_slow),
+            'dem': float(dem)
+        }
+
+        records = np.column_stack([self._bars(df), block.T])
+        ind_path, state_path = self._paths(ticker)
+        os.makedirs(self.directory, exist_ok=True)
+        # 先移除舊狀態：中斷時不會以舊狀態搭配新的記錄檔
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        atomic_write(ind_path, records.astype('<f8').tobytes())
+        atomic_write(state_path, json.dumps(state).encode('utf-8'))
+        return state
+
+    def _append(self, ticker: str, state: Dict, df: pd.DataFrame) -> Dict:
+        """逐筆遞推新的交易日，附加記錄後提交狀態"""
+        count = state['count']
+        closes, volumes = state['closes'], state['volumes']
+        sums = {int(period): acc for period, acc in state['sums'].items()}
+        volume_sum = state['volume_sum']
+        ema_fast, ema_slow, dem = state['ema_fast'], state['ema_slow'], state['dem']
+        # 與 pandas ewm(span, adjust=False) 相同的權重
+        alphas = [1.0 / (1.0 + (span - 1) / 2.0) for span in self.params['macd']]
+        longest = max(self.params['ma'])
+
+        bars = self._bars(df, count)
+        rows = np.empty((len(bars), len(BAR_COLUMNS) + len(self.columns)))
+        rows[:, :len(BAR_COLUMNS)] = bars
+        for i, (_, close, volume) in enumerate(bars):
+            count += 1
+            closes.append(close)
+            values = []
+            for period in self.params['ma']:
+                sums[period] = _kahan_add(sums[period], close)
+                if len(closes) > period:
+                    sums[period] = _kahan_add(sums[period], -closes[-period - 1])
+                values.append(sum(sums[period]) / period if count >= period else np.nan)
+            del closes[:-longest]
+
+            volumes.append(volume)
+            volume_sum = _kahan_add(volume_sum, volume)
+            if len(volumes) > VOLUME_MA_PERIOD:
+                volume_sum = _kahan_add(volume_sum, -volumes.pop(0))
+
+            ema_fast = ((1.0 - alphas[0]) * ema_fast + alphas[0] * close) / ((1.0 - alphas[0]) + alphas[0])
+            ema_slow = ((1.0 - alphas[1]) * ema_slow + alphas[1] * close) / ((1.0 - alphas[1]) + alphas[1])
+            dif = ema_fast - ema_slow
+            dem = ((1.0 - alphas[2]) * dem + alphas[2] * dif) / ((1.0 - alphas[2]) + alphas[2])
+            avg_volume = sum(volume_sum) / VOLUME_MA_PERIOD if count >= VOLUME_MA_PERIOD else np.nan
+            rows[i, len(BAR_COLUMNS):] = values + [ema_fast, ema_slow, dif, dem, dif - dem, avg_volume]
+
+        ind_path, state_path = self._paths(ticker)
+        with open(ind_path, 'r+b') as f:
+            # 截斷上次中斷時未提交的記錄
+            f.truncate(state['count'] * self.row_size)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.astype('<f8').tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        state = dict(state, count=count, closes=closes, volumes=volumes, volume_sum=volume_sum,
+                     sums={str(period): acc for period, acc in sums.items()},
+                     ema_fast=ema_fast, ema_slow=ema_slow, dem=dem)
+        atomic_write(state_path, json.dumps(state).encode('utf-8'))
+        return state
+
+    def delete(self, ticker: str):
+        """刪除股票的指標序列、狀態與寫入鎖檔（在該股票的寫入鎖內刪除，不與附加或重建交錯）"""
+        lock_path = self._lock_path(ticker)
+        if not os.path.exists(lock_path) and not any(os.path.exists(path) for path in self._paths(ticker)):
+            return
+        with FileLock(lock_path):
+            for path in self._paths(ticker):
+                if os.path.exists(path):
+                    os.remove(path)
+            if os.path.exists(lock_path):
+                os.remove(lock_path)
@@ -2,39 +2,105 @@
 技術指標服務
 負責計算移動平均線、MACD 等技術指標
 """
+from typing import List
+
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from config import Config
 
+# 成交量均線天數
+VOLUME_MA_PERIOD = 5
+
+
+def _rolling_mean(values: np.ndarray, period: int, out: np.ndarray):
+    """滑動視窗平均寫入 out（與 rolling(window=period).mean() 相同，前 period - 1 筆為 NaN）"""
+    out[:period - 1] = np.nan
+    if len(values) >= period:
+        np.mean(sliding_window_view(values, period), axis=1, dtype=np.float64, out=out[period - 1:])
+
+
+def _ema(values: np.ndarray, span: int, out: np.ndarray):
+    """指數移動平均寫入 out（ewm(span=span, adjust=False)）"""
+    out[:] = pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+
 
 class IndicatorService:
     """技術指標計算服務"""
 
     @staticmethod
-    def calculate_all(df: pd.DataFrame) -> pd.DataFrame:
+    def indicator_columns(periods: list = None) -> List[str]:
+        """calculate_all 新增的指標欄位（依序）"""
+        if periods is None:
+            periods = Config.MA_PERIODS
+        return [f'ma{period}' for period in periods] + ['ema12', 'ema26', 'dif', 'dem', 'osc', 'avg_volume5']
+
+    @staticmethod
+    def compute_block(close: np.ndarray, volume: np.ndarray, periods: list = None) -> np.ndarray:
         """
-        計算所有技術指標
+        由收盤價與成交量陣列一次計算所有指標，寫入同一個預先配置的區塊
 
         Args:
-            df: 原始股票數據 DataFrame
+            close: 收盤價陣列
+            volume: 成交量陣列
+            periods: MA 週期列表
 
         Returns:
-            pd.DataFrame: 包含技術指標的 DataFrame
+            np.ndarray: (指標數, 筆數) 的 float64 區塊，列依 indicator_columns 排列（每個指標各自連續），
+                數值與 calculate_ma、calculate_macd、calculate_volume_ma 相同（未移除 NaN）
         """
-        df = df.copy()
+        if periods is None:
+            periods = Config.MA_PERIODS
+        close = np.asarray(close, dtype=np.float64)
+        block = np.empty((len(periods) + 6, len(close)))
 
-        # 計算移動平均線
-        df = IndicatorService.calculate_ma(df)
+        for row, period in enumerate(periods):
+            _rolling_mean(close, period, block[row])
 
-        # 計算 MACD
-        df = IndicatorService.calculate_macd(df)
+        ema_fast, ema_slow, dif, dem, osc, avg_volume = block[len(periods):]
+        _ema(close, Config.MACD_FAST, ema_fast)
+        _ema(close, Config.MACD_SLOW, ema_slow)
+        np.subtract(ema_fast, ema_slow, out=dif)
+        _ema(dif, Config.MACD_SIGNAL, dem)
+        np.subtract(dif, dem, out=osc)
+        _rolling_mean(np.asarray(volume), VOLUME_MA_PERIOD, avg_volume)
+        return block
 
-        # 計算成交量均線
-        df = IndicatorService.calculate_volume_ma(df)
+    @staticmethod
+    def frame_with_indicators(df: pd.DataFrame, block: np.ndarray, columns: List[str]) -> pd.DataFrame:
+        """
+        股票數據與指標區塊包裝成一個 DataFrame，移除任一欄位為 NaN 的交易日（同 dropna()）
 
-        # 移除 NaN 值
-        df = df.dropna()
+        指標前段為 NaN 時以切片移除，欄位為原陣列的視圖，不複製數據
+        """
+        keep = ~np.isnan(block).any(axis=0)
+        for name in df.columns:
+            if df[name].dtype.kind == 'f':
+                keep &= ~np.isnan(df[name].to_numpy())
 
-        return df
+        first = int(keep.argmax()) if keep.any() else len(keep)
+        rows = slice(first, None) if keep[first:].all() else keep
+
+        data = {name: df[name].to_numpy()[rows] for name in df.columns}
+        data.update(zip(columns, block[:, rows]))
+        return pd.DataFrame(data, index=df.index[rows], copy=False)
+
+    @staticmethod
+    def calculate_all(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        計算所有技術指標
+
+        所有指標由 close、volume 陣列一次寫入同一個區塊，最後包裝成 DataFrame，
+        不逐步複製整個 DataFrame；結果與依序呼叫 calculate_ma、calculate_macd、calculate_volume_ma 後 dropna() 相同
+
+        Args:
+            df: 原始股票數據 DataFrame
+
+        Returns:
+            pd.DataFrame: 包含技術指標的 DataFrame（股票數據欄位與輸入共用記憶體）
+        """
+        block = IndicatorService.compute_block(df['close'].to_numpy(), df['volume'].to_numpy())
+        return IndicatorService.frame_with_indicators(df, block, IndicatorService.indicator_columns())
 
     @staticmethod
     def calculate_ma(df: pd.DataFrame, periods: list = None) -> pd.DataFrame:
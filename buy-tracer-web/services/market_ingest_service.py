@@ -0,0 +1,123 @@
+"""
+全市場收盤行情匯入服務
+收盤後一次抓取證交所全部證券當日行情，分送到所有已快取的股票，
+取代逐檔各自請求上游的每日更新
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+from utils import CacheManagerBase, DateUtils, FetchEngine, PanelStore, SingleFlight, create_cache_manager
+from utils.twse_parser import FRAME_COLUMNS, parse_daily_all
+
+
+class MarketIngestService:
+    """全市場收盤行情批次匯入"""
+
+    def __init__(self, cache_manager: CacheManagerBase = None, fetch_engine: FetchEngine = None,
+                 single_flight: SingleFlight = None, panel_store: PanelStore = None):
+        """
+        初始化匯入服務
+
+        Args:
+            cache_manager: 快取管理器
+            fetch_engine: 上游抓取引擎
+            single_flight: 股票鎖（與一般更新共用，避免同時寫入）
+            panel_store: 日期 × 股票面板，提供時匯入後同步更新的股票
+        """
+        self.cache_manager = cache_manager or create_cache_manager()
+        self.fetch_engine = fetch_engine or FetchEngine()
+        self.single_flight = single_flight or SingleFlight(lock_factory=self.cache_manager.lock_for)
+        self.panel_store = panel_store
+
+    def ingest(self, payload: Dict = None) -> Dict:
+        """
+        匯入全市場當日行情到已快取的股票
+
+        只有快取已更新到前一個交易日的股票會被附加當日數據；
+        中間有缺口的股票略過，交由一般的逐檔更新補齊
+
+        Args:
+            payload: STOCK_DAY_ALL 原始回應，未提供時從上游抓取
+
+        Returns:
+            Dict: 匯入摘要
+        """
+        if payload is None:
+            payload = self.fetch_engine.fetch_daily_all()
+            if payload is None:
+                print("  !!! 全市場行情抓取失敗")
+                return {'success': False, 'message': '全市場行情抓取失敗'}
+
+        table = parse_daily_all(payload)
+        if table.empty:
+            return {'success': False, 'message': '全市場行情無資料'}
+
+        trade_date = table['date'].iloc[0]
+        cached = set(self.cache_manager.get_all_cached_stocks())
+        table = table[table['ticker'].isin(cached)]
+
+        frames = {}
+        skipped_gap = []
+        for ticker, row in zip(table['ticker'], table[FRAME_COLUMNS].to_dict('records')):
+            status = self._check_append(ticker, trade_date)
+            if status == 'append':
+                frames[ticker] = pd.DataFrame([row], columns=FRAME_COLUMNS)
+            elif status == 'gap':
+                skipped_gap.append(ticker)
+
+        results = self._write(frames)
+        updated = sorted(ticker for ticker, ok in results.items() if ok)
+        self._sync_panel(updated)
+
+        print(f"  > 全市場行情 {trade_date}: 更新 {len(updated)} 檔，"
+              f"缺口略過 {len(skipped_gap)} 檔（共 {len(cached)} 檔快取）")
+
+        return {
+            'success': True,
+            'trade_date': trade_date,
+            'cached_count': len(cached),
+            'updated_count': len(updated),
+            'updated': updated,
+            'skipped_gap': sorted(skipped_gap)
+        }
+
+    def _check_append(self, ticker: str, trade_date: str) -> Optional[str]:
+        """
+        判斷當日數據能否直接附加到快取
+
+        Returns:
+            str: 'append'（可附加）、'gap'（中間有缺口）或 None（已包含當日數據）
+        """
+        cache_data = self.cache_manager.load_meta(ticker)
+        if not cache_data:
+            return 'gap'
+
+        end_date = cache_data.get('date_range', {}).get('end_date')
+        if end_date and end_date >= trade_date:
+            return None
+
+        previous = DateUtils.get_previous_trading_day(datetime.strptime(trade_date, '%Y-%m-%d'))
+        if end_date != previous.strftime('%Y-%m-%d'):
+            return 'gap'
+        return 'append'
+
+    def _write(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, bool]:
+        """批次寫入，每檔股票在其股票鎖內寫入（與一般更新互斥）"""
+        return self.cache_manager.merge_many(frames, lock_for=self.single_flight.lock_for)
+
+    def _sync_panel(self, tickers):
+        """當日數據附加到面板（失敗不影響匯入結果，下次同步時補上）"""
+        if self.panel_store is None or not tickers:
+            return
+        try:
+            self.panel_store.sync(self.cache_manager, tickers)
+        except Exception as e:
+            print(f"  !!! 面板同步失敗: {e}")
+
+
+if __name__ == '__main__':
+    from config import Config
+    from utils import apply_twstock_patch
+    apply_twstock_patch()
+    print(MarketIngestService(panel_store=PanelStore() if Config.PANEL_ENABLED else None).ingest())
@@ -0,0 +1,142 @@
+"""
+全市場掃描服務
+以日期 × 股票面板一次計算所有已快取股票的橫斷面結果（站上均線比例、當日買點），
+不逐檔載入記錄檔。均線依每檔股票自己的交易日計算（停牌日不計入），與逐檔的 IndicatorService 結果一致。
+只讀取已提交的面板，不在查詢時同步：面板由全市場行情匯入與收盤後更新排程（或 python -m utils.panel_store）寫入
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from utils.panel_store import Panel, PanelStore
+
+# 買點需要的最少交易日：MA60 有值後還要前一日的數值才能判斷交叉與 OSC 翻揚
+MIN_SIGNAL_DAYS = 61
+
+
+def last_valid(values: np.ndarray, valid: np.ndarray, count: int) -> np.ndarray:
+    """
+    每行最後 count 個有效值（依日期排序，不足時上方補 NaN）
+
+    Args:
+        values: rows × n 矩陣
+        valid: rows × n 有效遮罩
+        count: 筆數
+
+    Returns:
+        np.ndarray: count × n 矩陣，最後一列為每行最後一個有效值
+    """
+    rank = np.cumsum(valid[::-1], axis=0)[::-1]
+    rows, cols = np.nonzero(valid & (rank <= count))
+    result = np.full((count, values.shape[1]), np.nan)
+    result[count - rank[rows, cols], cols] = values[rows, cols]
+    return result
+
+
+class MarketScanService:
+    """全市場橫斷面掃描"""
+
+    def __init__(self, panel_store: PanelStore = None):
+        """
+        初始化掃描服務
+
+        Args:
+            panel_store: 日期 × 股票面板
+        """
+        self.panel_store = panel_store or PanelStore()
+
+    def get_panel(self) -> Optional[Panel]:
+        """附加目前提交的面板（唯讀），尚未建立時返回 None"""
+        return self.panel_store.open()
+
+    @staticmethod
+    def _slice(panel: Panel, date: str = None, start_date: str = None):
+        """截取 start_date 至 date 的列，返回 (截取的列, 掃描日的有效遮罩)；掃描日不存在時返回 None"""
+        end = panel.row(date)
+        if end < 0:
+            return None
+        start = int(np.searchsorted(panel.dates, np.datetime64(start_date, 'D'))) if start_date else 0
+        rows = slice(start, end + 1)
+        return rows, panel.valid[end]
+
+    def above_ma(self, window: int = 20, date: str = None) -> Dict:
+        """
+        收盤價站上 N 日均線的股票比例
+
+        Args:
+            window: 均線天數
+            date: 掃描日期 (YYYY-MM-DD)，默認為面板的最後一個交易日
+
+        Returns:
+            Dict: {'date', 'window', 'total', 'above', 'ratio', 'tickers'}（total 只計入當日有交易且滿 N 日的股票）
+        """
+        panel = self.get_panel()
+        sliced = self._slice(panel, date) if panel is not None else None
+        if sliced is None:
+            return {'date': date, 'window': window, 'total': 0, 'above': 0, 'ratio': None, 'tickers': []}
+        rows, today = sliced
+
+        closes = last_valid(panel['close'][rows], panel.valid[rows], window)
+        eligible = today & ~np.isnan(closes[0])
+        above = eligible & (closes[-1] > closes.mean(axis=0))
+
+        total = int(eligible.sum())
+        return {
+            'date': str(panel.dates[rows.stop - 1]),
+            'window': window,
+            'total': total,
+            'above': int(above.sum()),
+            'ratio': round(float(above.sum()) / total, 4) if total else None,
+            'tickers': [panel.tickers[i] for i in np.flatnonzero(above)]
+        }
+
+    def buy_signals(self, date: str = None, start_date: str = None) -> Dict:
+        """
+        當日出現買點的股票（條件與 SignalService.generate_signals 相同）
+
+        Args:
+            date: 掃描日期 (YYYY-MM-DD)，默認為面板的最後一個交易日
+            start_date: 計算指標的起始日期，默認為 DEFAULT_START_DATE（與個股查詢相同）
+
+        Returns:
+            Dict: {'date', 'scanned', 'type1', 'type2'}（買點的股票代號列表）
+        """
+        panel = self.get_panel()
+        start_date = start_date or Config.DEFAULT_START_DATE
+        sliced = self._slice(panel, date, start_date) if panel is not None else None
+        if sliced is None:
+            return {'date': date, 'scanned': 0, 'type1': [], 'type2': []}
+        rows, today = sliced
+        valid = panel.valid[rows]
+        close = panel['close'][rows]
+
+        # 策略一：MA5 上穿 MA20、多頭排列、量增
+        closes = last_valid(close, valid, MIN_SIGNAL_DAYS)
+        volumes = last_valid(panel['volume'][rows], valid, 5)
+        eligible = today & ~np.isnan(closes[0])
+        ma5, ma5_prev = closes[-5:].mean(axis=0), closes[-6:-1].mean(axis=0)
+        ma20, ma20_prev = closes[-20:].mean(axis=0), closes[-21:-1].mean(axis=0)
+        ma60 = closes[-60:].mean(axis=0)
+        type1 = (eligible & (ma5_prev < ma20_prev) & (ma5 > ma20) & (ma20 > ma60)
+                 & (volumes[-1] > volumes.mean(axis=0)))
+
+        # 策略二：DIF 在 DEM 之上、OSC 翻揚、收盤站上 MA20
+        # 停牌日為 NaN，ignore_na 讓 EMA 只依每檔股票自己的交易日遞推
+        prices = pd.DataFrame(close)
+        ema_fast = prices.ewm(span=Config.MACD_FAST, adjust=False, ignore_na=True).mean()
+        ema_slow = prices.ewm(span=Config.MACD_SLOW, adjust=False, ignore_na=True).mean()
+        dif = (ema_fast - ema_slow).where(valid)
+        dem = dif.ewm(span=Config.MACD_SIGNAL, adjust=False, ignore_na=True).mean()
+        osc = last_valid((dif - dem).to_numpy(), valid, 2)
+        last = rows.stop - rows.start - 1
+        type2 = (eligible & (dif.to_numpy()[last] > dem.to_numpy()[last]) & (osc[-1] > osc[0])
+                 & (closes[-1] > ma20))
+
+        return {
+            'date': str(panel.dates[rows.stop - 1]),
+            'scanned': int(eligible.sum()),
+            'type1': [panel.tickers[i] for i in np.flatnonzero(type1)],
+            'type2': [panel.tickers[i] for i in np.flatnonzero(type2)]
+        }
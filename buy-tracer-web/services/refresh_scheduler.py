@@ -0,0 +1,239 @@
+"""
+收盤後背景更新排程
+每個交易日 13:30 收盤後，先以全市場行情批次附加當日數據，
+再依近期查詢頻率逐檔更新仍未到最新的快取，讓晚上的查詢都直接命中快取。
+更新後仍未到最新的股票（停牌、下市或上游沒有更新）每輪最多嘗試 REFRESH_SCHEDULER_MAX_ATTEMPTS 次，
+之後記在 failed 中、本輪照常完成，不會每次輪詢都再請求上游。
+多個 worker 進程以檔案鎖選出一個執行；進度寫入檔案，重啟後從中斷處繼續
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import Config
+from utils import AccessTracker, DateUtils, FileLock, PanelStore
+from utils.atomic_file import atomic_write
+from .market_ingest_service import MarketIngestService
+from .stock_data_service import StockDataService
+
+
+class RefreshScheduler:
+    """收盤後快取更新排程器"""
+
+    def __init__(self, stock_service: StockDataService = None, access_tracker: AccessTracker = None,
+                 ingest_service: MarketIngestService = None, progress_file: str = None,
+                 lock_file: str = None, panel_store: PanelStore = None):
+        """
+        初始化排程器
+
+        Args:
+            stock_service: 股票數據服務（與 API 共用，背景更新與查詢互斥）
+            access_tracker: 查詢頻率統計
+            ingest_service: 全市場行情匯入服務
+            progress_file: 進度檔路徑
+            lock_file: 排程鎖路徑（同一時間只有一個進程執行）
+            panel_store: 日期 × 股票面板，提供時每輪結束後依快取同步
+        """
+        self.stock_service = stock_service or StockDataService()
+        self.access_tracker = access_tracker or self.stock_service.access_tracker
+        self.panel_store = panel_store
+        self.ingest_service = ingest_service or MarketIngestService(
+            cache_manager=self.stock_service.cache_manager,
+            fetch_engine=self.stock_service.fetch_engine,
+            single_flight=self.stock_service.single_flight,
+            panel_store=panel_store
+        )
+        self.progress_file = progress_file or os.path.join(Config.METADATA_DIR, 'refresh_progress.json')
+        self.lock_file = lock_file or os.path.join(Config.LOCK_DIR, 'refresh_scheduler.lock')
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """啟動背景排程執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='refresh-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景排程（目前股票更新完成後結束）"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"  !!! 收盤後更新排程錯誤: {e}")
+            self._stop_event.wait(Config.REFRESH_SCHEDULER_POLL_SECONDS)
+
+    def tick(self, now: datetime = None) -> Optional[Dict]:
+        """
+        檢查是否需要執行，需要時取得排程鎖並執行一輪更新
+
+        Args:
+            now: 目前時間（測試用）
+
+        Returns:
+            Dict: 本輪進度，未執行時為 None
+        """
+        target_date = self.get_target_date(now)
+        if target_date is None:
+            return None
+
+        progress = self.load_progress()
+        if progress.get('target_date') == target_date and progress.get('completed_at'):
+            return None
+
+        lock = FileLock(self.lock_file)
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            return self.run(target_date)
+        finally:
+            lock.release()
+
+    @staticmethod
+    def get_target_date(now: datetime = None) -> Optional[str]:
+        """
+        獲取本次應更新到的日期
+
+        只有交易日收盤後（DateUtils.get_latest_available_date 已是當天）才需要執行
+
+        Returns:
+            str: 目標日期 (YYYY-MM-DD)，不需執行時為 None
+        """
+        now = now or datetime.now()
+        latest = DateUtils.get_latest_available_date(now)
+        if latest.date() != now.date():
+            return None
+        return latest.strftime('%Y-%m-%d')
+
+    def run(self, target_date: str) -> Dict:
+        """
+        執行一輪更新，已完成的股票不重複更新
+
+        Args:
+            target_date: 目標日期 (YYYY-MM-DD)
+
+        Returns:
+            Dict: 本輪進度
+        """
+        progress = self.load_progress()
+        if progress.get('target_date') != target_date:
+            progress = {
+                'target_date': target_date,
+                'started_at': datetime.now().isoformat(),
+                'ingested': False,
+                'done': [],
+                'failed': {},
+                'attempts': {}
+            }
+            self.save_progress(progress)
+        attempts = progress.setdefault('attempts', {})
+
+        # 先以一次全市場請求附加當日數據，多數連續更新的快取可直接完成
+        if not progress['ingested']:
+            summary = self.ingest_service.ingest()
+            progress['ingested'] = bool(summary.get('success'))
+            self.save_progress(progress)
+
+        # 先淘汰超過容量上限的快取，不更新即將淘汰的股票
+        self.stock_service.enforce_cache_budget()
+
+        cache_manager = self.stock_service.cache_manager
+        pending = self.get_pending_tickers(progress)
+        print(f"收盤後更新 {target_date}: 待處理 {len(pending)} 檔")
+
+        for i, ticker in enumerate(pending):
+            if self._stop_event.is_set():
+                break
+            if i > 0 and self._stop_event.wait(Config.REFRESH_SCHEDULER_INTERVAL_SECONDS):
+                break
+
+            if not cache_manager.is_up_to_date(ticker):
+                try:
+                    self.stock_service.force_update(ticker)
+                except Exception as e:
+                    print(f"  !!! 收盤後更新失敗: {ticker} - {e}")
+
+            if cache_manager.is_up_to_date(ticker) or not cache_manager.exists(ticker):
+                progress['done'].append(ticker)
+                progress['failed'].pop(ticker, None)
+            else:
+                progress['failed'][ticker] = datetime.now().isoformat()
+                attempts[ticker] = attempts.get(ticker, 0) + 1
+            self.save_progress(progress)
+
+        # 逐檔更新（含補缺口與重寫）後依快取同步面板，未變動的股票不寫入
+        if self.panel_store is not None:
+            try:
+                print(f"  > 面板同步: {self.panel_store.sync(cache_manager)}")
+            except Exception as e:
+                print(f"  !!! 面板同步失敗: {e}")
+
+        # 失敗的股票用完嘗試次數後不再阻擋本輪完成
+        if not self.get_pending_tickers(progress):
+            progress['completed_at'] = datetime.now().isoformat()
+            self.save_progress(progress)
+            print(f"  > 收盤後更新完成: {len(progress['done'])} 檔，失敗 {len(progress['failed'])} 檔")
+
+        return progress
+
+    def get_pending_tickers(self, progress: Dict, include_failed: bool = True) -> List[str]:
+        """
+        獲取尚未完成的股票，依近期查詢頻率由高到低排序（已用完嘗試次數的股票不列入）
+
+        Args:
+            progress: 本輪進度
+            include_failed: 是否包含先前失敗、仍可重試的股票（排在最後重試）
+
+        Returns:
+            List[str]: 股票代號列表
+        """
+        done = set(progress.get('done', []))
+        failed = progress.get('failed', {})
+        attempts = progress.get('attempts', {})
+        tickers = [t for t in self.stock_service.cache_manager.get_all_cached_stocks()
+                   if t not in done and attempts.get(t, 0) < Config.REFRESH_SCHEDULER_MAX_ATTEMPTS]
+
+        scores = self.access_tracker.get_scores()
+        tickers.sort(key=lambda t: (t in failed, -scores.get(t, 0.0), t))
+
+        if not include_failed:
+            tickers = [t for t in tickers if t not in failed]
+        return tickers
+
+    def load_progress(self) -> Dict:
+        """讀取進度檔"""
+        if not os.path.exists(self.progress_file):
+            return {}
+        try:
+            with open(self.progress_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"更新進度讀取失敗: {e}")
+            return {}
+
+    def save_progress(self, progress: Dict):
+        """寫入進度檔（原子替換，中斷時不會留下損壞的檔案）"""
+        progress['updated_at'] = datetime.now().isoformat()
+        try:
+            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
+            atomic_write(self.progress_file, json.dumps(progress, ensure_ascii=False, indent=2).encode('utf-8'))
+        except (IOError, OSError) as e:
+            print(f"更新進度保存失敗: {e}")
+
+
+if __name__ == '__main__':
+    # 獨立執行（sidecar）：不經由 web 進程，直接跑一輪
+    from utils import apply_twstock_patch
+    apply_twstock_patch()
+    scheduler = RefreshScheduler()
+    date = scheduler.get_target_date() or DateUtils.get_latest_available_date().strftime('%Y-%m-%d')
+    scheduler.run(date)
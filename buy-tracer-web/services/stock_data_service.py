@@ -2,19 +2,45 @@
 股票數據服務
 負責股票數據的獲取、快取管理與更新
 """
+import threading
 import pandas as pd
 import twstock
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Tuple
-from utils import CacheManager, DateUtils
+from typing import Callable, Optional, Dict, List, Tuple
+from utils import AccessTracker, CacheManagerBase, DateUtils, FetchEngine, SingleFlight, create_cache_manager
+from utils.shared_frame_store import SharedFrameStore
+from utils.twse_parser import columns_to_frame, concat_columns
 from config import Config
+from .indicator_engine import IndicatorEngine
+from .indicator_service import IndicatorService
 
 
 class StockDataService:
     """股票數據服務類"""
 
-    def __init__(self):
-        self.cache_manager = CacheManager()
+    def __init__(self, cache_manager: CacheManagerBase = None, fetch_engine: FetchEngine = None,
+                 single_flight: SingleFlight = None, access_tracker: AccessTracker = None,
+                 shared_store: SharedFrameStore = None, indicator_engine: IndicatorEngine = None):
+        self.cache_manager = cache_manager or create_cache_manager()
+        self.fetch_engine = fetch_engine or FetchEngine()
+        self.single_flight = single_flight or SingleFlight(lock_factory=self.cache_manager.lock_for)
+        self.access_tracker = access_tracker or AccessTracker()
+        # 跨 worker 共享的技術指標數據（SHARED_FRAME_CACHE_MB 為 0 時停用）
+        if shared_store is None and Config.SHARED_FRAME_CACHE_MB > 0:
+            shared_store = SharedFrameStore()
+        self.shared_store = shared_store
+        # 增量技術指標（INDICATOR_ENGINE_ENABLED 關閉時每次以 IndicatorService 重新計算）
+        if indicator_engine is None and Config.INDICATOR_ENGINE_ENABLED:
+            indicator_engine = IndicatorEngine()
+        self.indicator_engine = indicator_engine
+        # 背景更新（stale-while-revalidate）
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=Config.REFRESH_WORKERS,
+            thread_name_prefix='cache-refresh'
+        )
+        self._pending_refreshes = set()
+        self._pending_lock = threading.Lock()
 
     def validate_stock_ticker(self, ticker: str) -> Tuple[bool, str, str]:
         """
@@ -53,6 +79,23 @@ class StockDataService:
         Returns:
             pd.DataFrame: 股票數據
         """
+        df, _ = self.get_stock_data_with_status(ticker, start_date)
+        return df
+
+    def get_stock_data_with_status(self, ticker: str, start_date: str = None) -> Tuple[pd.DataFrame, Dict]:
+        """
+        獲取股票數據與快取狀態
+
+        快取過期時（STALE_WHILE_REVALIDATE 開啟）立即回應快取數據並排程背景更新，
+        只有沒有快取的首次查詢需要等待上游
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期
+
+        Returns:
+            Tuple[pd.DataFrame, Dict]: (股票數據, {'is_stale': 是否為過期數據, 'refresh_pending': 是否有背景更新})
+        """
         # 驗證股票代號
         is_valid, market_type, message = self.validate_stock_ticker(ticker)
         print(f"股票代號驗證: {message}")
@@ -79,47 +122,263 @@ class StockDataService:
         if start_date is None:
             start_date = Config.DEFAULT_START_DATE
 
+        # 記錄查詢頻率（收盤後背景更新依此排序）
+        self.access_tracker.record(ticker)
+
         # 檢查快取
-        if self.cache_manager.exists(ticker):
-            # 載入快取
-            cache_data = self.cache_manager.load(ticker)
-            df = pd.DataFrame(cache_data['data'])
+        df = None
+        status = {'is_stale': False, 'refresh_pending': False}
+
+        stale = self._cache_state(ticker)
+        if stale is not None:
+            # 只讀取請求範圍內的交易日（回補過的長歷史不整段載入）
+            df = self.cache_manager.load_frame(ticker, start_date=start_date)
+            if df is not None and stale:
+                self._serve_stale(ticker, start_date, status)
+
+        if df is None:
+            # 快取不存在或需要更新：同一股票同時只允許一個上游更新，
+            # 其他請求（含其他 worker 進程）等待並共用結果
+            df = self.single_flight.do(ticker, self._refresh_cache, ticker, start_date)
+            # 可能新增了快取：在股票鎖外檢查容量上限（本次查詢的股票不淘汰）
+            self.enforce_cache_budget(protect=[ticker])
+
+        # 同一股票的並行請求共用一次更新的結果，依本次的 start_date 截取
+        return self._index_by_date(df).loc[start_date:], status
+
+    @staticmethod
+    def _index_by_date(df: pd.DataFrame) -> pd.DataFrame:
+        """轉換日期索引（快取已是 datetime64，新下載的數據為字串）"""
+        df = df.assign(date=pd.to_datetime(df['date'])).set_index('date').sort_index()
+        return df[['open', 'high', 'low', 'close', 'volume', 'capacity']]
 
+    def get_indicator_data(self, ticker: str, start_date: str = None,
+                           compute: Callable[[pd.DataFrame], pd.DataFrame] = None) -> Tuple[pd.DataFrame, Dict]:
+        """
+        獲取含技術指標的數據與快取狀態
+
+        快取可直接回應時先查詢跨 worker 共享數據段（依快取數據版本驗證），
+        命中時不載入快取也不重新計算；未命中時計算後發布，供其他 worker 附加
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期
+            compute: 由股票數據計算技術指標的函數，默認使用增量技術指標引擎（見 _compute）
+
+        Returns:
+            Tuple[pd.DataFrame, Dict]: (含技術指標的數據，共享時欄位唯讀, 快取狀態)；
+            沒有數據時返回空的股票數據
+        """
+        if start_date is None:
+            start_date = Config.DEFAULT_START_DATE
+        key = (ticker, start_date)
+
+        version = self._data_version(ticker) if self.shared_store is not None else None
+        if version is not None:
+            stale = self._cache_state(ticker)
+            df = self.shared_store.get(key, version) if stale is not None else None
+            if df is not None:
+                self.access_tracker.record(ticker)
+                status = {'is_stale': False, 'refresh_pending': False}
+                if stale:
+                    self._serve_stale(ticker, start_date, status)
+                return df, status
+
+        df, status = self.get_stock_data_with_status(ticker, start_date)
+        if df.empty:
+            return df, status
+
+        df = self._compute(ticker, start_date, df, compute)
+        # 只發布與讀取前版本相同的結果（其間有更新或首次下載時由下一次請求發布）
+        if version is not None and self._data_version(ticker) == version:
+            if self.shared_store.put(key, version, df):
+                # 之後的請求由共享數據段回應，不在本進程保留已解碼的快取
+                self.cache_manager.frame_cache.invalidate((ticker, 'frame'))
+        return df, status
+
+    def warm(self, ticker: str, start_date: str = None,
+             compute: Callable[[pd.DataFrame], pd.DataFrame] = None) -> bool:
+        """
+        預熱快取：只使用已有的快取（過期也不請求上游、不排程更新、不計入查詢頻率），
+        載入數據並計算技術指標後發布至共享數據段，供之後的查詢直接附加
+
+        共享數據段已有目前版本時只附加；多個 worker 同時預熱時以股票鎖排隊，
+        只有第一個計算，其餘附加其發布的結果
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期（與查詢使用的開始日期相同才會命中）
+            compute: 由股票數據計算技術指標的函數，默認使用增量技術指標引擎（見 _compute）
+
+        Returns:
+            bool: 是否有快取可預熱
+        """
+        if start_date is None:
+            start_date = Config.DEFAULT_START_DATE
+        key = (ticker, start_date)
+
+        version = self._data_version(ticker)
+        if version is None:
+            return False
+        if self.shared_store is not None and self.shared_store.get(key, version) is not None:
+            return True
+
+        with self.single_flight.lock_for(ticker):
+            version = self._data_version(ticker)
+            if version is None:
+                return False
+            if self.shared_store is not None and self.shared_store.get(key, version) is not None:
+                return True
+
+            # 未共享時已解碼的快取留在本進程的 FrameCache
+            df = self.cache_manager.load_frame(ticker, start_date=start_date)
+            if df is None or df.empty:
+                return False
+            df = self._compute(ticker, start_date, self._index_by_date(df), compute)
+            if self.shared_store is not None and self.shared_store.put(key, version, df):
+                self.cache_manager.frame_cache.invalidate((ticker, 'frame'))
+        return True
+
+    def _compute(self, ticker: str, start_date: str, df: pd.DataFrame,
+                 compute: Callable[[pd.DataFrame], pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        計算技術指標：未指定 compute 且開始日期與引擎相同時由增量引擎計算（只遞推新的交易日），
+        其餘以 compute（默認為 IndicatorService.calculate_all）重新計算
+        """
+        if compute is None and self.indicator_engine is not None and start_date == self.indicator_engine.start_date:
+            return self.indicator_engine.calculate(ticker, df)
+        return (compute or IndicatorService.calculate_all)(df)
+
+    def _cache_state(self, ticker: str) -> Optional[bool]:
+        """
+        檢查快取是否可直接回應
+
+        Returns:
+            Optional[bool]: 可回應時返回是否過期（過期數據只在 STALE_WHILE_REVALIDATE 開啟時可回應），
+            需要等待更新時返回 None
+        """
+        if not self.cache_manager.exists(ticker):
+            return None
+        if self.cache_manager.is_up_to_date(ticker):
+            return False
+        return True if Config.STALE_WHILE_REVALIDATE else None
+
+    def _serve_stale(self, ticker: str, start_date: str, status: Dict):
+        """回應過期快取並排程背景更新"""
+        print(f"快取過期，先回應快取數據並排程背景更新: {ticker}")
+        status['is_stale'] = True
+        self.schedule_refresh(ticker, start_date)
+        status['refresh_pending'] = True
+
+    def _data_version(self, ticker: str) -> Optional[tuple]:
+        """
+        快取數據版本（data_version 搭配最後更新時間與筆數，快取目錄重建後版本號重新計數也不會誤判）
+        """
+        meta = self.cache_manager.load_meta(ticker)
+        if meta is None:
+            return None
+        return (meta['metadata'].get('data_version'), meta['metadata'].get('last_update'),
+                meta['date_range'].get('end_date'), meta['date_range'].get('total_trading_days'))
+
+    def enforce_cache_budget(self, protect=None) -> List[str]:
+        """
+        快取超過 MAX_CACHE_SIZE_MB / MAX_CACHED_STOCKS 時，依最後查詢時間淘汰
+
+        Args:
+            protect: 除 CACHE_WATCHLIST 外本次不淘汰的股票代號
+
+        Returns:
+            List[str]: 已淘汰的股票代號
+        """
+        try:
+            return self.cache_manager.cleanup_old_caches(
+                last_access=self.access_tracker.get_last_access(),
+                pinned=set(Config.CACHE_WATCHLIST) | set(protect or ()),
+                lock_for=self.single_flight.lock_for,
+                on_evict=self._discard_derived
+            )
+        except Exception as e:
+            print(f"  !!! 快取淘汰失敗: {e}")
+            return []
+
+    def schedule_refresh(self, ticker: str, start_date: str = None):
+        """
+        排程背景更新（同一股票已在排程中時不重複排程）
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期
+        """
+        with self._pending_lock:
+            if ticker in self._pending_refreshes:
+                return
+            self._pending_refreshes.add(ticker)
+
+        self._refresh_executor.submit(
+            self._background_refresh, ticker, start_date or Config.DEFAULT_START_DATE
+        )
+
+    def is_refresh_pending(self, ticker: str) -> bool:
+        """檢查股票是否有排程中的背景更新"""
+        with self._pending_lock:
+            return ticker in self._pending_refreshes
+
+    def _background_refresh(self, ticker: str, start_date: str):
+        """背景執行更新，失敗時只記錄錯誤（下次請求會再排程）"""
+        try:
+            self.single_flight.do(ticker, self._refresh_cache, ticker, start_date)
+        except Exception as e:
+            print(f"  !!! 背景更新失敗: {ticker} - {e}")
+        finally:
+            with self._pending_lock:
+                self._pending_refreshes.discard(ticker)
+
+    def _refresh_cache(self, ticker: str, start_date: str) -> pd.DataFrame:
+        """
+        更新或建立快取（由 single-flight 在股票鎖內呼叫）
+
+        取得鎖後會重新檢查快取，若其他進程已完成更新則直接沿用，不再請求上游
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期
+
+        Returns:
+            pd.DataFrame: 股票數據（快取為 datetime64 日期，新下載的數據為 'YYYY-MM-DD' 字串）
+        """
+        if self.cache_manager.exists(ticker):
             # 檢查是否需要更新
             if not self.cache_manager.is_up_to_date(ticker):
                 print(f"快取需要更新: {ticker}")
-                self._update_cache(ticker, cache_data)
-                # 重新載入更新後的數據
-                cache_data = self.cache_manager.load(ticker)
-                df = pd.DataFrame(cache_data['data'])
-        else:
-            # 下載完整數據
-            print(f"首次下載數據: {ticker}")
-            df = self._download_full_data(ticker, start_date)
+                self._update_cache(ticker)
+            # 與快取命中時相同，只返回請求範圍內的交易日
+            df = self.cache_manager.load_frame(ticker, start_date=start_date)
+            if df is not None:
+                return df
 
-            if df.empty:
-                raise ValueError(
-                    f"無法獲取股票 {ticker} 的數據。\n"
-                    f"可能原因: 股票代號不存在、已下市，或 twstock 資料庫中沒有此股票數據。\n"
-                    f"請確認股票代號是否正確。"
-                )
+        # 下載完整數據
+        print(f"首次下載數據: {ticker}")
+        df = self._download_full_data(ticker, start_date)
 
-            print(f"  > 下載成功，共 {len(df)} 筆數據")
+        if df.empty:
+            raise ValueError(
+                f"無法獲取股票 {ticker} 的數據。\n"
+                f"可能原因: 股票代號不存在、已下市，或 twstock 資料庫中沒有此股票數據。\n"
+                f"請確認股票代號是否正確。"
+            )
 
-            # 創建快取
-            stock_name = self._get_stock_name(ticker)
-            cache_created = self.cache_manager.create_cache(ticker, stock_name, df)
+        print(f"  > 下載成功，共 {len(df)} 筆數據")
 
-            if cache_created:
-                print(f"  > 快取創建成功: {ticker}")
-            else:
-                print(f"  > 警告: 快取創建失敗: {ticker}")
+        # 創建快取
+        stock_name = self._get_stock_name(ticker)
+        cache_created = self.cache_manager.create_cache(ticker, stock_name, df)
 
-        # 轉換日期索引
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.set_index('date').sort_index()
+        if cache_created:
+            print(f"  > 快取創建成功: {ticker}")
+        else:
+            print(f"  > 警告: 快取創建失敗: {ticker}")
 
-        return df[['open', 'high', 'low', 'close', 'volume', 'capacity']]
+        return df
 
     def _download_full_data(self, ticker: str, start_date_str: str) -> pd.DataFrame:
         """
@@ -135,28 +394,16 @@ class StockDataService:
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
         # 獲取最新可用的數據日期（13:30後可獲取當天）
         latest_date = DateUtils.get_latest_available_date()
-        all_data = []
 
         print(f"  > 數據獲取範圍: {start_date_str} ~ {latest_date.strftime('%Y-%m-%d')}")
 
         # 獲取年月組合（到最新可用日期所在月份）
         months = DateUtils.get_date_range_months(start_date, latest_date)
+        print(f"  > 並行獲取 {len(months)} 個月份數據...")
 
-        for year, month in months:
-            try:
-                stock = twstock.Stock(ticker)
-                print(f"  > 獲取 {year} 年 {month} 月數據...")
-
-                data = stock.fetch(year, month)
-
-                if data:
-                    all_data.extend(data)
+        df = self._fetch_months(ticker, months)
 
-            except Exception as e:
-                print(f"  !!! 獲取 {year} 年 {month} 月數據失敗: {e}")
-                continue
-
-        if not all_data:
+        if df.empty:
             print(f"  !!! 警告: 沒有獲取到任何數據")
             print(f"  !!! 可能原因:")
             print(f"      1. 股票代號 {ticker} 不存在或已下市")
@@ -165,37 +412,7 @@ class StockDataService:
             print(f"  !!! 建議: 請確認股票代號是否正確，或嘗試其他股票")
             return pd.DataFrame()
 
-        print(f"  > 獲取到 {len(all_data)} 筆原始數據")
-
-        # 轉換為 DataFrame
-        # twstock 返回的是 Data 對象，需要轉換為字典
-        data_list = []
-        for i, item in enumerate(all_data):
-            try:
-                data_list.append({
-                    'date': item.date,
-                    'open': float(item.open),
-                    'high': float(item.high),
-                    'low': float(item.low),
-                    'close': float(item.close),
-                    'volume': int(item.capacity),  # capacity 是成交股數
-                    'capacity': int(item.turnover) if hasattr(item, 'turnover') else 0  # turnover 是成交金額
-                })
-            except Exception as e:
-                print(f"  !!! 警告: 處理第 {i} 筆數據時出錯: {e}")
-                continue
-
-        if not data_list:
-            print(f"  !!! 警告: 數據轉換後為空")
-            return pd.DataFrame()
-
-        print(f"  > 成功轉換 {len(data_list)} 筆數據")
-
-        df = pd.DataFrame(data_list)
-
-        # 轉換日期
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-
+        print(f"  > 獲取到 {len(df)} 筆數據")
         print(f"  > 日期範圍: {df['date'].min()} ~ {df['date'].max()}")
         print(f"  > 篩選起始日期: {start_date_str}")
 
@@ -212,13 +429,12 @@ class StockDataService:
 
         return df[['date', 'open', 'high', 'low', 'close', 'volume', 'capacity']]
 
-    def _update_cache(self, ticker: str, cache_data: Dict):
+    def _update_cache(self, ticker: str):
         """
         增量更新快取
 
         Args:
             ticker: 股票代號
-            cache_data: 現有快取數據
         """
         # 計算缺失日期
         missing_dates = self.cache_manager.get_missing_dates(ticker)
@@ -234,44 +450,31 @@ class StockDataService:
         end_date = datetime.strptime(missing_dates[-1], '%Y-%m-%d')
         months = DateUtils.get_date_range_months(start_date, end_date)
 
-        new_data = []
-        for year, month in months:
-            try:
-                stock = twstock.Stock(ticker)
-                data = stock.fetch(year, month)
-
-                if data:
-                    new_data.extend(data)
-
-            except Exception as e:
-                print(f"  !!! 更新失敗 ({year}-{month}): {e}")
-                continue
-
-        if new_data:
-            # 轉換為 DataFrame
-            # twstock 返回的是 Data 對象，需要轉換為字典
-            data_list = []
-            for item in new_data:
-                data_list.append({
-                    'date': item.date,
-                    'open': float(item.open),
-                    'high': float(item.high),
-                    'low': float(item.low),
-                    'close': float(item.close),
-                    'volume': int(item.capacity),  # capacity 是成交股數
-                    'capacity': int(item.turnover) if hasattr(item, 'turnover') else 0  # turnover 是成交金額
-                })
-
-            new_df = pd.DataFrame(data_list)
-            new_df['date'] = pd.to_datetime(new_df['date']).dt.strftime('%Y-%m-%d')
-
-            # 只保留缺失日期的數據
-            new_df = new_df[new_df['date'].isin(missing_dates)]
-
-            # 合併到快取
-            if not new_df.empty:
-                self.cache_manager.merge_data(ticker, new_df)
-                print(f"  > 成功更新 {len(new_df)} 筆數據")
+        new_df = self._fetch_months(ticker, months)
+
+        # 只保留缺失日期的數據
+        new_df = new_df[new_df['date'].isin(missing_dates)]
+
+        # 合併到快取
+        if not new_df.empty:
+            self.cache_manager.merge_data(ticker, new_df)
+            print(f"  > 成功更新 {len(new_df)} 筆數據")
+
+    def _fetch_months(self, ticker: str, months: list) -> pd.DataFrame:
+        """
+        並行抓取多個月份的數據，並依月份順序合併為 DataFrame
+
+        Args:
+            ticker: 股票代號
+            months: (year, month) 元組列表
+
+        Returns:
+            pd.DataFrame: 股票數據（日期為 'YYYY-MM-DD' 字串）
+        """
+        results = self.fetch_engine.fetch_months(ticker, months)
+        parts = [results[key] for key in months if key in results]
+
+        return columns_to_frame(concat_columns(parts))
 
     def _get_stock_name(self, ticker: str) -> str:
         """
@@ -302,16 +505,15 @@ class StockDataService:
         Returns:
             list: 股票資訊列表
         """
-        stocks = self.cache_manager.get_all_cached_stocks()
         stocks_info = []
 
-        for ticker in stocks:
-            info = self.cache_manager.get_cache_info(ticker)
-            if info:
-                # 如果 stock_name 等於 ticker（舊快取），則動態獲取股票名稱
-                if info.get('stock_name') == ticker:
-                    info['stock_name'] = self._get_stock_name(ticker)
-                stocks_info.append(info)
+        # 一次查詢快取目錄，不讀取各股票的記錄檔
+        for info in self.cache_manager.get_all_cache_info():
+            ticker = info['ticker']
+            # 如果 stock_name 等於 ticker（舊快取），則動態獲取股票名稱
+            if info.get('stock_name') == ticker:
+                info['stock_name'] = self._get_stock_name(ticker)
+            stocks_info.append(info)
 
         # 按最後更新時間排序
         stocks_info.sort(key=lambda x: x.get('last_update', ''), reverse=True)
@@ -328,7 +530,17 @@ class StockDataService:
         Returns:
             bool: 是否成功
         """
-        return self.cache_manager.delete(ticker)
+        with self.single_flight.lock_for(ticker):
+            deleted = self.cache_manager.delete(ticker)
+            self._discard_derived(ticker)
+        return deleted
+
+    def _discard_derived(self, ticker: str):
+        """刪除快取後一併移除衍生數據：增量指標序列與共享數據段（呼叫端持有股票鎖）"""
+        if self.indicator_engine is not None:
+            self.indicator_engine.delete(ticker)
+        if self.shared_store is not None:
+            self.shared_store.invalidate_prefix(ticker)
 
     def force_update(self, ticker: str) -> Dict:
         """
@@ -346,14 +558,14 @@ class StockDataService:
                 'message': '快取不存在'
             }
 
-        cache_data = self.cache_manager.load(ticker)
+        cache_data = self.cache_manager.load_meta(ticker)
         previous_end_date = cache_data.get('date_range', {}).get('end_date')
 
-        # 執行更新
-        self._update_cache(ticker, cache_data)
+        # 執行更新（與同時進行的自動更新合併）
+        self.single_flight.do(ticker, self._refresh_cache, ticker, Config.DEFAULT_START_DATE)
 
         # 獲取新的結束日期
-        updated_cache = self.cache_manager.load(ticker)
+        updated_cache = self.cache_manager.load_meta(ticker)
         new_end_date = updated_cache.get('date_range', {}).get('end_date')
 
         # 計算新增記錄數
@@ -0,0 +1,41 @@
+"""
+測試共用的模擬上游與 fixture
+"""
+import calendar
+import time
+from datetime import date
+
+import pytest
+from utils.circuit_breaker import reset_circuit_breakers
+from utils.fetch_engine import set_host_limit
+
+
+class SyntheticFetcher:
+    """依月份產生平日數據的模擬抓取器"""
+
+    REPORT_URL = 'http://synthetic-exchange.local/exchangeReport/STOCK_DAY'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def fetch_raw(self, year, month, sid, retry=5):
+        self.calls += 1
+        time.sleep(self.delay)
+        rows = []
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            current = date(year, month, day)
+            if current.weekday() >= 5 or current > date.today():
+                continue
+            close = 500 + day
+            rows.append([f'{year - 1911}/{month:02d}/{day:02d}', '1,000', '500,000',
+                         f'{close:.2f}', f'{close + 1:.2f}', f'{close - 1:.2f}', f'{close:.2f}',
+                         '+1.00', '10', ''])
+        return {'stat': 'OK', 'data': rows}
+
+
+@pytest.fixture
+def fetcher():
+    set_host_limit('synthetic-exchange.local', 1000, 100)
+    reset_circuit_breakers()
+    return SyntheticFetcher(delay=0.2)
@@ -0,0 +1,85 @@
+"""
+全市場歷史回填測試（以離線替身伺服器取代證交所）
+"""
+import urllib.parse
+
+import pytest
+from services.backfill_service import BackfillService, backfill_ticker
+from services import IndicatorEngine, StockDataService
+from utils import AccessTracker, CacheManager, FetchEngine, MonthStore, SingleFlight, apply_twstock_patch
+from utils.circuit_breaker import reset_circuit_breakers
+from utils.exchange_standin import ExchangeStandIn
+from utils.fetch_engine import set_host_limit
+from utils.shared_frame_store import SharedFrameStore
+from utils.twstock_patch import set_exchange_base_url
+
+# 2024-01-01 ~ 2024-03-15 的平日數
+EXPECTED_BARS = 23 + 21 + 11
+
+
+@pytest.fixture
+def standin():
+    apply_twstock_patch()
+    reset_circuit_breakers()
+    server = ExchangeStandIn(tickers=['2330', '2317'], start_date='2024-01-01',
+                             end_date='2024-03-15').start()
+    set_exchange_base_url(server.base_url)
+    set_host_limit(urllib.parse.urlparse(server.base_url).netloc, 1000, 100)
+    yield server
+    set_exchange_base_url(None)
+    server.stop()
+
+
+@pytest.fixture
+def backfill(tmp_path):
+    return BackfillService(
+        processes=2, rate_per_second=200, chunk_months=2,
+        checkpoint_file=str(tmp_path / 'metadata' / 'backfill_checkpoint.json'),
+        cache_dir=str(tmp_path / 'cache'), month_store_dir=str(tmp_path / 'months'),
+        lock_dir=str(tmp_path / 'locks')
+    )
+
+
+class TestBackfillService:
+    """測試多進程回填與檢查點"""
+
+    def test_backfill_and_resume(self, tmp_path, standin, backfill):
+        """測試回填所有股票，重新執行時略過已完成的股票"""
+        universe = {'2330': '1994-09-05', '2317': ''}
+
+        report = backfill.run(universe, '2024-01-01', '2024-03-15')
+
+        assert report['tickers'] == 2
+        assert report['bars'] == 2 * EXPECTED_BARS
+        assert report['bars_per_second'] > 0
+        cache_manager = CacheManager(str(tmp_path / 'cache'))
+        assert cache_manager.load('2330')['date_range']['total_trading_days'] == EXPECTED_BARS
+
+        checkpoint = backfill.load_checkpoint()
+        del checkpoint['done']['2317']
+        backfill.save_checkpoint(checkpoint)
+
+        report = backfill.run(universe, '2024-01-01', '2024-03-15')
+        assert report['pending'] == 1
+        assert report['bars'] == 0
+        assert backfill.load_checkpoint()['done'] == {'2330': EXPECTED_BARS, '2317': 0}
+
+    def test_fills_before_and_after_existing_cache(self, tmp_path, standin):
+        """測試已有快取時只補之前與之後缺少的區間"""
+        service = StockDataService(
+            cache_manager=CacheManager(str(tmp_path / 'cache')),
+            fetch_engine=FetchEngine(month_store=MonthStore(str(tmp_path / 'months'))),
+            single_flight=SingleFlight(str(tmp_path / 'locks')),
+            access_tracker=AccessTracker(str(tmp_path / 'access_stats.json'), flush_interval=3600),
+            shared_store=SharedFrameStore(str(tmp_path / 'shm')),
+            indicator_engine=IndicatorEngine(str(tmp_path / 'indicators'))
+        )
+        backfill_ticker(service, '2330', '2024-02-01', '2024-02-29')
+
+        result = backfill_ticker(service, '2330', '2024-01-01', '2024-03-15', chunk_months=1)
+
+        data = service.cache_manager.load('2330')
+        dates = [bar['date'] for bar in data['data']]
+        assert result['bars'] == 23 + 11
+        assert dates == sorted(set(dates))
+        assert len(dates) == EXPECTED_BARS
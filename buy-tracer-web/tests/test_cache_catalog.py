@@ -0,0 +1,74 @@
+"""
+快取目錄測試
+"""
+import pandas as pd
+import pytest
+from utils import CacheManager
+from utils import bar_store
+
+
+def _frame(dates, close=100.0):
+    return pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close,
+                         'close': close, 'volume': 1000, 'capacity': 100000})
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = CacheManager(str(tmp_path))
+    manager.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03']))
+    manager.create_cache('2317', '鴻海', _frame(['2024-01-02']))
+    return manager
+
+
+class TestCacheCatalog:
+    """測試狀態查詢只查目錄"""
+
+    def test_status_queries_do_not_read_records(self, manager, tmp_path, monkeypatch):
+        """測試狀態、是否最新與列表查詢不讀取記錄檔或 metadata 檔"""
+        def fail(*args, **kwargs):
+            raise AssertionError('不應讀取記錄檔')
+        monkeypatch.setattr(bar_store, 'open_bars', fail)
+        monkeypatch.setattr(bar_store, 'read_edges', fail)
+        monkeypatch.setattr(CacheManager, '_read_metadata', fail)
+        fresh = CacheManager(str(tmp_path))
+
+        info = fresh.get_cache_info('2330')
+        assert info['stock_name'] == '台積電'
+        assert info['date_range'] == {'start_date': '2024-01-02', 'end_date': '2024-01-03',
+                                      'total_trading_days': 2}
+        assert not fresh.is_up_to_date('2330')
+        assert fresh.get_missing_dates('2330', pd.Timestamp('2024-01-05')) == ['2024-01-04', '2024-01-05']
+        assert sorted(i['ticker'] for i in fresh.get_all_cache_info()) == ['2317', '2330']
+
+    def test_updated_on_every_write(self, manager):
+        """測試附加、重寫與刪除都更新目錄，數據版本遞增"""
+        version = manager.catalog.get('2330')['data_version']
+
+        manager.merge_data('2330', _frame(['2024-01-04']))
+        entry = manager.catalog.get('2330')
+        assert (entry['end_date'], entry['record_count']) == ('2024-01-04', 3)
+        assert entry['data_version'] == version + 1
+
+        manager.merge_data('2330', _frame(['2024-01-01']))
+        entry = manager.catalog.get('2330')
+        assert (entry['start_date'], entry['record_count']) == ('2024-01-01', 4)
+        assert entry['data_version'] == version + 2
+
+        manager.delete('2330')
+        assert manager.catalog.get('2330') is None
+
+    def test_stale_entry_rebuilt_from_file(self, manager, tmp_path):
+        """測試寫入記錄檔後、更新目錄前中斷時，查詢從檔案重建（讀取端重建不遞增數據版本）"""
+        version = manager.catalog.get('2330')['data_version']
+        records = bar_store.to_records(pd.DataFrame({
+            'date': pd.to_datetime(['2024-01-04']), 'open': [1.0], 'high': [1.0], 'low': [1.0],
+            'close': [1.0], 'volume': [1], 'capacity': [1]}))
+        bar_store.append_bars(manager._get_cache_path('2330'), records)
+
+        info = CacheManager(str(tmp_path)).get_cache_info('2330')
+
+        assert info['date_range']['end_date'] == '2024-01-04'
+        assert info['record_count'] == 3
+        assert manager.catalog.get('2330')['data_version'] == version
+        CacheManager(str(tmp_path)).get_all_cache_info()
+        assert manager.catalog.get('2330')['data_version'] == version
@@ -0,0 +1,421 @@
+"""
+快取管理器測試
+"""
+import json
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from config import Config
+from utils import CacheManager, bar_codec, bar_store
+from utils.bar_store import RECORD_SIZE
+from utils.cache_manager import FORMAT_VERSION
+
+
+def _frame(dates, close=100.0):
+    return pd.DataFrame([
+        {'date': d, 'open': close, 'high': close, 'low': close, 'close': close,
+         'volume': 1000, 'capacity': close * 1000}
+        for d in dates
+    ])
+
+
+def _hammer(cache_dir, worker, workers, dates):
+    """
+    壓力測試子進程：寫入執行緒以交錯順序合併本進程負責的日期（附加與重寫混合），
+    讀取執行緒同時反覆載入；返回讀到缺少快取或不一致數據的次數
+    """
+    manager = CacheManager(cache_dir)
+    done = threading.Event()
+    failures = []
+
+    def read_loop():
+        while not done.is_set():
+            try:
+                df = manager.load_frame('2330')
+                meta = manager.load_meta('2330')
+                if df is None or meta is None:
+                    failures.append('missing')
+                elif not df['date'].is_monotonic_increasing or df['date'].duplicated().any():
+                    failures.append('unordered')
+                elif (df['close'] != df['date'].dt.day).any():
+                    failures.append('corrupted')
+            except Exception as e:
+                failures.append(repr(e))
+
+    reader = threading.Thread(target=read_loop)
+    reader.start()
+    try:
+        for day in reversed(dates[worker::workers]):
+            if not manager.merge_data('2330', _frame([day], close=int(day[-2:]))):
+                failures.append(f'merge {day}')
+    finally:
+        done.set()
+        reader.join()
+    return failures
+
+
+@pytest.fixture
+def cache_manager(tmp_path):
+    manager = CacheManager(str(tmp_path))
+    manager.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03']))
+    return manager
+
+
+class TestAppend:
+    """測試檔尾附加"""
+
+    def test_append_is_single_write_at_end(self, cache_manager):
+        """測試每日更新只在記錄檔尾附加，既有記錄不重寫"""
+        path = cache_manager._get_cache_path('2330')
+        with open(path, 'rb') as f:
+            before = f.read()
+        inode = os.stat(path).st_ino
+
+        assert cache_manager.merge_data('2330', _frame(['2024-01-04']))
+        assert cache_manager.merge_data('2330', _frame(['2024-01-05', '2024-01-08'], close=101.0))
+
+        assert os.stat(path).st_ino == inode
+        assert os.path.getsize(path) == len(before) + 3 * RECORD_SIZE
+        with open(path, 'rb') as f:
+            assert f.read(len(before)) == before
+        data = cache_manager.load('2330')
+        assert [bar['date'] for bar in data['data']] == [
+            '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05', '2024-01-08']
+        assert data['date_range']['end_date'] == '2024-01-08'
+        assert data['date_range']['total_trading_days'] == 5
+        assert cache_manager.get_cache_info('2330')['record_count'] == 5
+
+    def test_duplicate_append_ignored(self, cache_manager):
+        """測試重複附加同一天不會產生重複數據"""
+        cache_manager.merge_data('2330', _frame(['2024-01-04']))
+        cache_manager.merge_data('2330', _frame(['2024-01-04']))
+
+        assert cache_manager.load('2330')['date_range']['total_trading_days'] == 3
+
+    def test_backfill_rewrites(self, cache_manager):
+        """測試補入最後日期之前的數據時改為完整合併"""
+        cache_manager.merge_data('2330', _frame(['2024-01-04']))
+        cache_manager.merge_data('2330', _frame(['2024-01-01']))
+
+        data = cache_manager.load('2330')
+        assert data['date_range']['end_date'] == '2024-01-04'
+        assert [bar['date'] for bar in data['data']] == [
+            '2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']
+        assert data['metadata']['stock_name'] == '台積電'
+
+    def test_partial_record_ignored_and_repaired(self, cache_manager):
+        """測試寫到一半的記錄被忽略，下次寫入前截斷"""
+        path = cache_manager._get_cache_path('2330')
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * (RECORD_SIZE // 2))
+
+        assert cache_manager.load('2330')['date_range']['end_date'] == '2024-01-03'
+
+        assert cache_manager.merge_data('2330', _frame(['2024-01-04']))
+        data = cache_manager.load('2330')
+        assert data['date_range']['end_date'] == '2024-01-04'
+        assert data['data'][-1]['close'] == 100.0
+        assert os.path.getsize(path) == 3 * RECORD_SIZE
+
+
+class TestRecordFormat:
+    """測試定長記錄格式"""
+
+    def test_frame_has_typed_columns(self, cache_manager):
+        """測試直接載入為有型別的欄位"""
+        cache_manager.merge_data('2330', _frame(['2024-01-04']))
+
+        df = cache_manager.load_frame('2330')
+
+        assert str(df['date'].dtype) == 'datetime64[ns]'
+        assert df['close'].dtype == 'float64'
+        assert df['volume'].dtype == 'int64'
+        assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-02', '2024-01-03', '2024-01-04']
+
+    def test_bars_are_readonly_memmap(self, cache_manager):
+        """測試記錄以唯讀 memmap 載入，重寫後已映射的視圖不受影響"""
+        bars = cache_manager.load_bars('2330')
+
+        assert isinstance(bars, np.memmap)
+        assert not bars.flags.writeable
+        assert bars['date'].dtype == np.int32
+
+        cache_manager.merge_data('2330', _frame(['2024-01-01'], close=90.0))
+
+        assert bars['close'].tolist() == [100.0, 100.0]
+        assert cache_manager.load_bars('2330')['close'].tolist() == [90.0, 100.0, 100.0]
+
+    def test_legacy_json_migrated_on_read(self, tmp_path):
+        """測試舊版 JSON 快取與增量記錄在讀取時轉換"""
+        manager = CacheManager(str(tmp_path))
+        legacy = {
+            'metadata': {'ticker': '2454', 'stock_name': '聯發科', 'version': '1.0',
+                         'last_update': '2024-01-03T15:00:00'},
+            'date_range': {'start_date': '2024-01-02', 'end_date': '2024-01-03', 'total_trading_days': 2},
+            'data': _frame(['2024-01-02', '2024-01-03'], close=940.0).to_dict('records')
+        }
+        with open(tmp_path / '2454.json', 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, ensure_ascii=False, indent=2)
+        with open(tmp_path / '2454.delta.jsonl', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'header': legacy['date_range']}) + '\n')
+            f.write(json.dumps({'bar': _frame(['2024-01-04'], close=950.0).to_dict('records')[0],
+                                'updated_at': '2024-01-04T15:00:00'}) + '\n')
+
+        assert manager.get_all_cached_stocks() == ['2454']
+        df = manager.load_frame('2454')
+
+        assert df['close'].tolist() == [940.0, 940.0, 950.0]
+        assert sorted(f for f in os.listdir(tmp_path) if not f.startswith('.')) == [
+            '2454.bars', '2454.bars.crc', '2454.meta.json']
+        meta = manager.load_meta('2454')
+        assert meta['metadata']['version'] == FORMAT_VERSION
+        assert meta['metadata']['stock_name'] == '聯發科'
+        assert manager.get_all_cached_stocks() == ['2454']
+        assert manager.merge_data('2454', _frame(['2024-01-05']))
+        assert manager.load('2454')['date_range']['total_trading_days'] == 4
+
+    def test_npz_migrated_on_read(self, tmp_path):
+        """測試 2.0 版 .npz 快取在讀取時轉換"""
+        manager = CacheManager(str(tmp_path))
+        meta = {'metadata': {'ticker': '2317', 'stock_name': '鴻海', 'version': '2.0'},
+                'date_range': {'start_date': '2024-01-02', 'end_date': '2024-01-03', 'total_trading_days': 2}}
+        np.savez(tmp_path / '2317.npz', meta=np.array(json.dumps(meta)),
+                 date=np.array(['2024-01-02', '2024-01-03'], dtype='datetime64[D]'),
+                 open=np.array([100.0, 101.0]), high=np.array([100.0, 101.0]),
+                 low=np.array([100.0, 101.0]), close=np.array([100.0, 101.0]),
+                 volume=np.array([1000, 2000]), capacity=np.array([100000, 202000]))
+
+        info = manager.get_cache_info('2317')
+
+        assert info['stock_name'] == '鴻海'
+        assert info['date_range'] == {'start_date': '2024-01-02', 'end_date': '2024-01-03',
+                                      'total_trading_days': 2}
+        assert not (tmp_path / '2317.npz').exists()
+        assert manager.load_frame('2317')['volume'].tolist() == [1000, 2000]
+
+
+class TestCompression:
+    """測試壓縮區塊 + 檔尾定長記錄"""
+
+    def test_round_trip_and_compaction(self, tmp_path, monkeypatch):
+        """測試壓縮後無損讀回，附加累積到門檻時併入壓縮區塊"""
+        monkeypatch.setattr(Config, 'CACHE_COMPACT_RECORDS', 3)
+        manager = CacheManager(str(tmp_path), compression='zlib')
+        dates = pd.bdate_range('2024-01-01', periods=250)
+        df = pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'), 'open': 580.5, 'high': 590.0, 'low': 575.25,
+            'close': 580.0 + np.arange(250) * 0.5, 'volume': 1000 + np.arange(250) * 7,
+            'capacity': 580000 + np.arange(250) * 3500
+        })
+        manager.create_cache('2330', '台積電', df)
+        path = manager._get_cache_path('2330')
+
+        assert os.path.getsize(path) < 250 * RECORD_SIZE / 4
+        loaded = manager.load_frame('2330')
+        assert loaded['close'].tolist() == df['close'].tolist()
+        assert loaded['capacity'].tolist() == df['capacity'].tolist()
+
+        extra = [d.strftime('%Y-%m-%d') for d in pd.bdate_range(dates[-1] + pd.Timedelta(days=1), periods=3)]
+        assert manager.merge_data('2330', _frame(extra[:2], close=600.1))
+        assert bar_store.tail_count(path) == 2
+        assert manager.load_meta('2330')['date_range']['end_date'] == extra[1]
+        assert manager.merge_data('2330', _frame(extra[2:], close=600.1))
+        assert bar_store.tail_count(path) == 0
+
+        # 未啟用壓縮的進程同樣可以讀取
+        plain = CacheManager(str(tmp_path), compression='none')
+        assert plain.load_frame('2330')['close'].tolist()[-4:] == [580.0 + 249 * 0.5, 600.1, 600.1, 600.1]
+        assert plain.get_cache_info('2330')['record_count'] == 253
+
+    def test_partial_tail_repaired_after_block(self, tmp_path):
+        """測試壓縮區塊之後寫到一半的記錄被忽略並截斷"""
+        manager = CacheManager(str(tmp_path), compression='zlib')
+        manager.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03', '2024-01-04']))
+        path = manager._get_cache_path('2330')
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * (RECORD_SIZE // 2))
+
+        assert manager.load('2330')['date_range']['end_date'] == '2024-01-04'
+        assert manager.merge_data('2330', _frame(['2024-01-05']))
+        assert os.path.getsize(path) == size + RECORD_SIZE
+        assert manager.load_frame('2330')['date'].dt.day.tolist() == [2, 3, 4, 5]
+
+    def test_prices_without_ticks_kept_exact(self):
+        """測試無法以整數檔位表示的價格改存原始 float64"""
+        records = bar_store.to_records(_frame(['2024-01-02', '2024-01-03'], close=100 / 3).assign(
+            date=lambda df: pd.to_datetime(df['date'])))
+        records['low'][1] = np.nan
+
+        block, codec_id, scale = bar_codec.encode(records)
+        decoded = bar_codec.decode(block, codec_id, scale, len(records), bar_store.BAR_DTYPE)
+
+        assert scale == bar_codec.RAW_FLOAT
+        assert decoded.tobytes() == records.tobytes()
+
+
+class TestIntegrity:
+    """測試校驗檔驗證、截斷修復與背景巡檢"""
+
+    def _corrupt(self, path, offset):
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            byte = f.read(1)
+            f.seek(offset)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+    def test_damaged_block_truncated_and_tail_refetched(self, tmp_path):
+        """測試損壞區塊之後的記錄被截斷，載入返回 None 讓呼叫端只補回缺少的交易日"""
+        manager = CacheManager(str(tmp_path))
+        dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=200)]
+        manager.create_cache('2330', '台積電', _frame(dates))
+        path = manager._get_cache_path('2330')
+        self._corrupt(path, 150 * RECORD_SIZE + 10)
+
+        assert manager.load_frame('2330') is None
+
+        valid = 2 * bar_store.CHECKSUM_RECORDS
+        assert os.path.getsize(path) == valid * RECORD_SIZE
+        assert manager.load_meta('2330')['date_range']['end_date'] == dates[valid - 1]
+        assert manager.get_missing_dates('2330', pd.Timestamp(dates[-1]).to_pydatetime())[0] == dates[valid]
+
+        assert manager.merge_data('2330', _frame(dates[valid:]))
+        assert bar_store.verify_bars(path)
+        assert len(manager.load_frame('2330')) == 200
+
+    def test_compressed_block_damaged_deletes(self, tmp_path):
+        """測試壓縮區塊損壞時沒有可保留的記錄，刪除快取"""
+        manager = CacheManager(str(tmp_path), compression='zlib')
+        manager.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03', '2024-01-04']))
+        self._corrupt(manager._get_cache_path('2330'), bar_store.HEADER_SIZE + 5)
+
+        assert manager.load_frame('2330') is None
+        assert not manager.exists('2330')
+        assert not os.path.exists(bar_store.checksum_path(manager._get_cache_path('2330')))
+
+    def test_scrubber_resumes_from_checkpoint(self, tmp_path, monkeypatch):
+        """測試巡檢每 N 檔寫入進度，中斷後從最後寫入的代號之後繼續"""
+        from config import Config
+        from services import CacheScrubber
+        monkeypatch.setattr(Config, 'CACHE_SCRUB_CHECKPOINT_EVERY', 2)
+        manager = CacheManager(str(tmp_path / 'cache'))
+        tickers = ['1101', '1216', '2317', '2330', '2454']
+        for ticker in tickers:
+            manager.create_cache(ticker, ticker, _frame(['2024-01-02', '2024-01-03']))
+        verified = []
+        verify = manager.verify
+
+        def interrupting_verify(ticker):
+            # 第 3 檔驗證時進程中斷（未呼叫 stop，不會寫入最後的進度）
+            if len(verified) == 2 and interrupt:
+                raise KeyboardInterrupt
+            verified.append(ticker)
+            return verify(ticker)
+        monkeypatch.setattr(manager, 'verify', interrupting_verify)
+
+        def make_scrubber():
+            return CacheScrubber(manager, bytes_per_second=1e9,
+                                 progress_file=str(tmp_path / 'scrub_progress.json'),
+                                 lock_file=str(tmp_path / 'scrubber.lock'))
+
+        interrupt = True
+        with pytest.raises(KeyboardInterrupt):
+            make_scrubber().run()
+        assert make_scrubber().load_progress()['cursor'] == '1216'
+
+        interrupt = False
+        verified.clear()
+        progress = make_scrubber().run()
+        assert verified == ['2317', '2330', '2454']
+        assert progress['checked'] == 5 and progress['completed_at']
+
+    def test_scrubber_seals_and_repairs(self, tmp_path):
+        """測試背景巡檢：補建缺少的校驗檔與未涵蓋的記錄，截斷損壞的記錄檔"""
+        from services import CacheScrubber
+        manager = CacheManager(str(tmp_path / 'cache'))
+        dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-01', periods=100)]
+        for ticker in ['1101', '2317', '2330', '2454']:
+            manager.create_cache(ticker, ticker, _frame(dates[:-1]))
+
+        # 1101 正常；2317 為沒有校驗檔的舊快取；2330 附加後更新校驗檔前中斷；2454 損壞
+        os.remove(bar_store.checksum_path(manager._get_cache_path('2317')))
+        sums_path = bar_store.checksum_path(manager._get_cache_path('2330'))
+        with open(sums_path, 'rb') as f:
+            sums = f.read()
+        manager.merge_data('2330', _frame(dates[-1:]))
+        with open(sums_path, 'wb') as f:
+            f.write(sums)
+        assert len(manager.load_frame('2330')) == 100
+        self._corrupt(manager._get_cache_path('2454'), 70 * RECORD_SIZE)
+
+        scrubber = CacheScrubber(manager, bytes_per_second=1e9,
+                                 progress_file=str(tmp_path / 'scrub_progress.json'),
+                                 lock_file=str(tmp_path / 'scrubber.lock'))
+        progress = scrubber.run()
+
+        assert progress['counts'] == {'ok': 1, 'sealed': 2, 'repaired': 1}
+        assert progress['cursor'] == '2454' and progress['checked'] == 4
+        assert manager.get_cache_info('2454')['record_count'] == bar_store.CHECKSUM_RECORDS
+        assert scrubber.tick() is None
+        assert [manager.verify(t)['status'] for t in ['1101', '2317', '2330', '2454']] == ['ok'] * 4
+
+
+class TestEviction:
+    """測試依最後查詢時間與容量上限淘汰"""
+
+    @pytest.fixture
+    def manager(self, tmp_path):
+        manager = CacheManager(str(tmp_path))
+        for ticker in ['1101', '2317', '2330', '2454']:
+            manager.create_cache(ticker, ticker, _frame(['2024-01-02', '2024-01-03']))
+        return manager
+
+    def test_evicts_least_recently_accessed(self, manager):
+        """測試超過股票數上限時淘汰最久未查詢的股票，觀察清單中的股票不淘汰"""
+        last_access = {'1101': 100.0, '2317': 300.0, '2330': 200.0, '2454': 400.0}
+
+        evicted = manager.cleanup_old_caches(last_access, pinned=['1101'], max_bytes=0, max_count=2)
+
+        assert evicted == ['2330', '2317']
+        assert sorted(manager.get_all_cached_stocks()) == ['1101', '2454']
+
+    def test_byte_budget(self, manager):
+        """測試依實際大小淘汰到總量不超過上限，從未查詢的股票優先淘汰"""
+        size = manager.get_cache_info('2330')['size_bytes']
+
+        evicted = manager.cleanup_old_caches({'2330': 100.0, '2454': 200.0}, pinned=[],
+                                             max_bytes=size * 2, max_count=0)
+
+        assert sorted(evicted) == ['1101', '2317']
+        assert sorted(manager.get_all_cached_stocks()) == ['2330', '2454']
+        assert manager.cleanup_old_caches({}, pinned=[], max_bytes=size * 2, max_count=0) == []
+
+
+class TestMultiProcess:
+    """測試多進程同時讀寫同一股票"""
+
+    def test_concurrent_writers_and_readers(self, tmp_path):
+        """測試多進程同時轉換、附加、重寫與讀取時沒有數據遺失，讀取端不會看到缺少或寫到一半的快取"""
+        workers = 6
+        base = ['2024-01-02', '2024-01-03']
+        dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2024-01-04', '2024-03-29')]
+        legacy = {
+            'metadata': {'ticker': '2330', 'stock_name': '台積電', 'version': '1.0'},
+            'date_range': {'start_date': base[0], 'end_date': base[-1], 'total_trading_days': 2},
+            'data': pd.concat([_frame([d], close=int(d[-2:])) for d in base]).to_dict('records')
+        }
+        with open(tmp_path / '2330.json', 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, ensure_ascii=False)
+
+        with multiprocessing.get_context().Pool(workers) as pool:
+            results = pool.starmap(_hammer, [(str(tmp_path), i, workers, dates) for i in range(workers)])
+
+        assert [failure for result in results for failure in result] == []
+        df = CacheManager(str(tmp_path)).load_frame('2330')
+        assert df['date'].dt.strftime('%Y-%m-%d').tolist() == base + dates
+        assert (df['close'] == df['date'].dt.day).all()
+        assert not (tmp_path / '2330.json').exists()
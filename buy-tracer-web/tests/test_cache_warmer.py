@@ -0,0 +1,81 @@
+"""
+啟動預熱測試
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from services import CacheWarmer, IndicatorEngine, StockDataService
+from utils import AccessTracker, CacheManager, SingleFlight
+from utils.shared_frame_store import SharedFrameStore
+
+
+def _bars(days=80, end='2024-06-28'):
+    dates = pd.bdate_range(end=end, periods=days)
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'), 'open': 100.0, 'high': 101.0, 'low': 99.0,
+        'close': 100.0 + np.arange(days), 'volume': 1000, 'capacity': 100000
+    })
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    # 快取刻意過期：預熱不應請求上游或排程更新
+    cache_manager = CacheManager(str(tmp_path / 'cache'))
+    for ticker in ['2330', '2317', '2454', '2881']:
+        cache_manager.create_cache(ticker, ticker, _bars())
+
+    def make_service():
+        # 每個服務代表一個 worker
+        return StockDataService(
+            cache_manager=CacheManager(str(tmp_path / 'cache')),
+            single_flight=SingleFlight(str(tmp_path / 'locks')),
+            access_tracker=AccessTracker(str(tmp_path / 'access_stats.json'), flush_interval=3600),
+            shared_store=SharedFrameStore(str(tmp_path / 'shm')),
+            indicator_engine=IndicatorEngine(str(tmp_path / 'indicators'))
+        )
+    return make_service
+
+
+class TestCacheWarmer:
+    """測試預熱清單與時間預算"""
+
+    def test_configured_first_then_most_accessed(self, make_service):
+        """測試設定清單在前，其餘依查詢頻率排序，未快取的股票不預熱"""
+        service = make_service()
+        for ticker in ['2454', '2454', '2317', '9999']:
+            service.access_tracker.record(ticker)
+
+        warmer = CacheWarmer(service, tickers=['2881', '1101'], top_n=3)
+
+        assert warmer.get_tickers() == ['2881', '2454', '2317']
+
+    def test_warmed_results_shared_without_upstream(self, make_service, monkeypatch):
+        """測試預熱只使用已有快取，其他 worker 的查詢直接附加預熱結果"""
+        service = make_service()
+        monkeypatch.setattr(service, 'schedule_refresh', lambda *args: pytest.fail('不應排程更新'))
+        warmer = CacheWarmer(service, compute=lambda df: df.assign(ma=df['close'].rolling(5).mean()),
+                             tickers=['2330'], top_n=1)
+
+        status = warmer.run()
+        assert status['state'] == 'done' and status['warmed'] == 1
+        assert warmer.is_ready()
+        assert service.access_tracker.get_scores() == {}
+
+        other = make_service()
+        monkeypatch.setattr(other.cache_manager, 'load_frame', lambda *args, **kwargs: pytest.fail('不應載入快取'))
+        version = other._data_version('2330')
+        df = other.shared_store.get(('2330', '2024-01-01'), version)
+
+        assert df is not None and df['ma'].iloc[-1] == pytest.approx(177.0)
+        assert other.warm('2330', '2024-01-01', compute=lambda df: pytest.fail('不應重新計算'))
+
+    def test_time_budget(self, make_service):
+        """測試超過時間預算時停止並回報就緒"""
+        warmer = CacheWarmer(make_service(), tickers=['2330', '2317'], time_budget=0)
+        assert not warmer.is_ready()
+
+        status = warmer.run()
+
+        assert status['state'] == 'timeout'
+        assert status['total'] == 2 and status['warmed'] == 0
+        assert warmer.is_ready()
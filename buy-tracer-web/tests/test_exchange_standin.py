@@ -0,0 +1,99 @@
+"""
+離線替身伺服器測試（經由 twstock 修補層與抓取引擎）
+"""
+import urllib.parse
+
+import pytest
+import requests
+from utils import FetchEngine, MonthStore, apply_twstock_patch
+from utils.circuit_breaker import CircuitOpenError, reset_circuit_breakers
+from utils.exchange_standin import ExchangeStandIn, generate_fixtures, synthetic_rows
+from utils.fetch_engine import set_host_limit
+from utils.twstock_patch import set_exchange_base_url
+
+
+@pytest.fixture
+def start_standin(tmp_path):
+    """啟動替身伺服器並將 twstock 指向它，結束時還原真實上游"""
+    apply_twstock_patch()
+    reset_circuit_breakers()
+    servers = []
+
+    def start(**kwargs):
+        kwargs.setdefault('tickers', ['2330'])
+        kwargs.setdefault('start_date', '2024-01-01')
+        kwargs.setdefault('end_date', '2024-03-15')
+        standin = ExchangeStandIn(**kwargs).start()
+        servers.append(standin)
+        set_exchange_base_url(standin.base_url)
+        set_host_limit(urllib.parse.urlparse(standin.base_url).netloc, 1000, 100)
+        return standin
+
+    yield start
+
+    set_exchange_base_url(None)
+    for standin in servers:
+        standin.stop()
+
+
+def _engine(tmp_path, **kwargs):
+    return FetchEngine(month_store=MonthStore(str(tmp_path / 'months')), **kwargs)
+
+
+class TestExchangeStandIn:
+    """測試替身伺服器回應"""
+
+    def test_fetch_months_through_patch(self, tmp_path, start_standin):
+        """測試抓取引擎經由修補層取得合成數據"""
+        standin = start_standin()
+        results = _engine(tmp_path).fetch_months('2330', [(2024, 1), (2024, 2), (2024, 3), (2024, 4)])
+
+        assert len(results[(2024, 1)]['close']) == 23
+        assert len(results[(2024, 3)]['close']) == 11
+        assert len(results[(2024, 4)]['close']) == 0
+        assert standin.stats['ok'] == 4
+
+    def test_recorded_fixture_served_verbatim(self, tmp_path, start_standin):
+        """測試錄製檔優先於合成數據"""
+        fixtures = str(tmp_path / 'fixtures')
+        generate_fixtures(fixtures, ['2454'], '2024-01-01', '2024-01-31')
+        standin = start_standin(fixture_dir=fixtures, tickers=[])
+
+        r = requests.get(standin.base_url + 'twse/exchangeReport/STOCK_DAY',
+                         params={'date': '20240101', 'stockNo': '2454'})
+
+        assert r.json()['data'] == synthetic_rows('2454', 2024, 1)
+
+    def test_errors_retried_until_circuit_opens(self, tmp_path, start_standin, monkeypatch):
+        """測試注入錯誤時重試，持續失敗後斷路器開啟"""
+        from config import Config
+        monkeypatch.setattr(Config, 'CIRCUIT_BREAKER_THRESHOLD', 2)
+        standin = start_standin(error_rate=1.0)
+        engine = _engine(tmp_path, max_retries=2, backoff_seconds=0.01)
+
+        assert engine.fetch_months('2330', [(2024, 1)]) == {}
+        assert standin.stats['errors'] == 2
+
+        with pytest.raises(CircuitOpenError):
+            engine.fetch_months('2330', [(2024, 2)])
+        assert standin.stats['requests'] == 2
+
+    def test_throttle_by_request_rate(self, start_standin):
+        """測試超過每秒請求數時回應限流頁"""
+        standin = start_standin(max_rps=2)
+        url = standin.base_url + 'twse/exchangeReport/STOCK_DAY'
+
+        statuses = [requests.get(url, params={'date': '20240101', 'stockNo': '2330'}).status_code
+                    for _ in range(4)]
+
+        assert statuses.count(429) >= 1
+        assert standin.stats['throttled'] == statuses.count(429)
+
+    def test_daily_all(self, start_standin):
+        """測試全市場行情回應最後一個交易日"""
+        standin = start_standin(tickers=['2330', '2317'])
+
+        payload = requests.get(standin.base_url + 'twse/exchangeReport/STOCK_DAY_ALL').json()
+
+        assert payload['date'] == '20240315'
+        assert [row[0] for row in payload['data']] == ['2317', '2330']
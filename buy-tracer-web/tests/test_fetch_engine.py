@@ -0,0 +1,232 @@
+"""
+上游抓取引擎測試
+"""
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, reset_circuit_breakers
+from utils.fetch_engine import FetchEngine, HostRateLimiter, set_host_limit
+from utils.month_store import MonthStore
+
+
+class FakeFetcher:
+    """模擬 twstock 抓取器，記錄並行數"""
+
+    REPORT_URL = 'http://fake-exchange.local/exchangeReport/STOCK_DAY'
+
+    def __init__(self, delay=0.05, fail_months=()):
+        self.delay = delay
+        self.fail_months = set(fail_months)
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def fetch_raw(self, year, month, sid, retry=5):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append((year, month))
+        try:
+            time.sleep(self.delay)
+            if (year, month) in self.fail_months:
+                raise ConnectionError('upstream error')
+            return {'stat': 'OK', 'data': [[
+                f'{year - 1911}/{month:02d}/02', '1,000', '590,000',
+                '590.00', '593.00', '589.00', '593.00', '+3.00', '10', ''
+            ]]}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def unlimited_fake_host():
+    set_host_limit('fake-exchange.local', 1000, 100)
+    reset_circuit_breakers()
+
+
+@pytest.fixture
+def month_store(tmp_path):
+    return MonthStore(str(tmp_path / 'months'))
+
+
+class TestFetchEngine:
+    """測試月份並行抓取"""
+
+    def test_fetch_months_parallel(self, month_store):
+        """測試多個月份以執行緒池並行抓取"""
+        fetcher = FakeFetcher(delay=0.1)
+        engine = FetchEngine(max_workers=6, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store)
+        months = [(2024, m) for m in range(1, 13)]
+
+        start = time.monotonic()
+        results = engine.fetch_months('2330', months)
+        elapsed = time.monotonic() - start
+
+        assert sorted(results) == months
+        assert str(results[(2024, 3)]['date'][0]) == '2024-03-02'
+        assert fetcher.max_active == 6
+        assert elapsed < 12 * 0.1 / 2
+
+    def test_fetcher_reused_per_ticker(self, month_store):
+        """測試每個股票代號只建立一次抓取器"""
+        created = []
+
+        def factory(ticker):
+            created.append(ticker)
+            return FakeFetcher(delay=0)
+
+        engine = FetchEngine(max_workers=4, fetcher_factory=factory, month_store=month_store)
+        engine.fetch_months('2330', [(2024, m) for m in range(1, 7)])
+        engine.fetch_months('2330', [(2024, 7)])
+
+        assert created == ['2330']
+
+    def test_failed_month_is_skipped(self, month_store):
+        """測試失敗月份不影響其他月份"""
+        fetcher = FakeFetcher(delay=0, fail_months=[(2024, 2)])
+        engine = FetchEngine(max_workers=2, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store, backoff_seconds=0)
+
+        results = engine.fetch_months('2330', [(2024, 1), (2024, 2), (2024, 3)])
+
+        assert sorted(results) == [(2024, 1), (2024, 3)]
+
+
+class TestUpstreamRetry:
+    """測試重試退避與斷路器"""
+
+    def test_retry_recovers_from_transient_error(self, month_store):
+        """測試暫時性錯誤經重試後成功"""
+        fetcher = FakeFetcher(delay=0)
+        original = fetcher.fetch_raw
+        attempts = []
+
+        def flaky(year, month, sid, retry=5):
+            # 第一次連線中斷、第二次回應無法解析、第三次成功
+            attempts.append((year, month))
+            if len(attempts) == 1:
+                raise ConnectionError('reset')
+            if len(attempts) == 2:
+                return None
+            return original(year, month, sid)
+
+        fetcher.fetch_raw = flaky
+        engine = FetchEngine(max_workers=1, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store, max_retries=3, backoff_seconds=0.01)
+
+        results = engine.fetch_months('2330', [(2024, 1)])
+
+        assert len(attempts) == 3
+        assert results[(2024, 1)]['close'][0] == 593.0
+
+    def test_circuit_opens_after_failures(self, month_store):
+        """測試連續失敗後斷路器開啟，不再送出請求"""
+        months = [(2024, m) for m in range(1, 13)]
+        fetcher = FakeFetcher(delay=0, fail_months=months)
+        engine = FetchEngine(max_workers=1, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store, max_retries=1, backoff_seconds=0)
+
+        with pytest.raises(CircuitOpenError):
+            engine.fetch_months('2330', months)
+
+        assert len(fetcher.calls) == 5
+
+
+class TestCircuitBreaker:
+    """測試斷路器狀態轉換"""
+
+    def test_half_open_trial(self):
+        """測試冷卻後只允許一個試探請求，成功即關閉"""
+        breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=0.05)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_failed_trial_reopens(self):
+        """測試試探請求失敗後重新開啟"""
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+
+class TestMonthStore:
+    """測試月份原始快取"""
+
+    def test_closed_months_not_refetched(self, month_store):
+        """測試已收盤月份只請求一次上游"""
+        fetcher = FakeFetcher(delay=0)
+        engine = FetchEngine(max_workers=2, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store)
+        months = [(2024, 1), (2024, 2)]
+
+        engine.fetch_months('2330', months)
+        results = engine.fetch_months('2330', months)
+
+        assert sorted(fetcher.calls) == months
+        assert results[(2024, 2)]['close'][0] == 593.0
+
+    def test_open_month_revalidated(self, month_store, monkeypatch):
+        """測試未收盤月份每次都重新請求"""
+        monkeypatch.setattr(MonthStore, 'is_month_closed', staticmethod(lambda year, month: False))
+        fetcher = FakeFetcher(delay=0)
+        engine = FetchEngine(max_workers=1, fetcher_factory=lambda ticker: fetcher,
+                             month_store=month_store)
+
+        engine.fetch_months('2330', [(2024, 10)])
+        engine.fetch_months('2330', [(2024, 10)])
+
+        assert fetcher.calls == [(2024, 10), (2024, 10)]
+        assert month_store.get('TWSE', '2330', 2024, 10)['closed'] is False
+
+    def test_invalid_payload_not_closed(self, month_store):
+        """測試錯誤或查無資料的回應不會被標記為已收盤"""
+        month_store.put('TWSE', '2330', 2020, 1, {'stat': '很抱歉，沒有符合條件的資料!'})
+        month_store.put('TPEX', '6488', 2020, 1, {'iTotalRecords': 0})
+        month_store.put('TWSE', '2317', 2020, 1, {'stat': 'OK', 'data': [['109/01/02']]})
+
+        assert month_store.get('TWSE', '2330', 2020, 1)['closed'] is False
+        assert month_store.get_closed('TPEX', '6488', 2020, 1) is None
+        assert month_store.get_closed('TWSE', '2317', 2020, 1) is not None
+        assert not list(Path(month_store.store_dir).rglob('*.tmp'))
+
+    def test_is_month_closed(self):
+        """測試月份收盤判斷"""
+        latest = datetime(2024, 11, 4)
+
+        assert MonthStore.is_month_closed(2024, 10, latest)
+        assert not MonthStore.is_month_closed(2024, 11, latest)
+
+
+class TestHostRateLimiter:
+    """測試每主機請求預算"""
+
+    def test_burst_then_throttle(self):
+        """測試超過瞬間額度後依速率排隊"""
+        limiter = HostRateLimiter(rate_per_second=20, burst=2)
+
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        elapsed = time.monotonic() - start
+
+        # 2 次瞬間放行，其餘 4 次需等待 4 / 20 秒
+        assert elapsed >= 0.18
@@ -0,0 +1,89 @@
+"""
+進程內已解碼快取測試
+"""
+import pandas as pd
+import pytest
+from utils import CacheManager
+from utils import bar_store
+from utils.frame_cache import FrameCache
+
+
+def _frame(dates, close=100.0):
+    return pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close,
+                         'close': close, 'volume': 1000, 'capacity': 100000})
+
+
+class TestFrameCache:
+    """測試 LRU 行為"""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """測試超過位元組上限時淘汰最久未使用的項目"""
+        cache = FrameCache(max_bytes=100)
+        cache.put('a', 1, 'A', 40)
+        cache.put('b', 1, 'B', 40)
+        assert cache.get('a', 1) == 'A'
+
+        cache.put('c', 1, 'C', 40)
+
+        assert cache.get('b', 1) is None
+        assert cache.get('a', 1) == 'A'
+        assert cache.get('c', 1) == 'C'
+        assert cache.stats() == {'entries': 2, 'bytes': 80, 'max_bytes': 100, 'hits': 3,
+                                 'misses': 1, 'evictions': 1, 'hit_rate': 0.75}
+
+    def test_version_mismatch_is_miss(self):
+        """測試版本不符時視為未命中並移除"""
+        cache = FrameCache(max_bytes=100)
+        cache.put('a', 1, 'A', 40)
+
+        assert cache.get('a', 2) is None
+        assert cache.stats()['bytes'] == 0
+
+    def test_oversized_value_not_cached(self):
+        """測試超過上限的單一項目不存入"""
+        cache = FrameCache(max_bytes=10)
+        cache.put('a', 1, 'A', 40)
+
+        assert cache.get('a', 1) is None
+
+
+class TestCacheManagerFrameCache:
+    """測試快取管理器使用已解碼快取"""
+
+    @pytest.fixture
+    def manager(self, tmp_path):
+        manager = CacheManager(str(tmp_path))
+        manager.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03']))
+        return manager
+
+    def test_repeat_load_skips_disk(self, manager, monkeypatch):
+        """測試記錄檔未變動時重複載入不讀取檔案"""
+        manager.load_frame('2330')
+        manager.load_meta('2330')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('不應讀取檔案')
+        monkeypatch.setattr(bar_store, 'open_bars', fail)
+        monkeypatch.setattr(bar_store, 'read_edges', fail)
+        monkeypatch.setattr(manager, '_read_metadata', fail)
+
+        assert len(manager.load_frame('2330')) == 2
+        assert manager.load_meta('2330')['date_range']['end_date'] == '2024-01-03'
+        assert manager.frame_cache.stats()['hits'] == 2
+
+    def test_append_invalidates(self, manager):
+        """測試附加新交易日後重新載入"""
+        assert len(manager.load_frame('2330')) == 2
+
+        manager.merge_data('2330', _frame(['2024-01-04']))
+
+        assert len(manager.load_frame('2330')) == 3
+        assert manager.load_meta('2330')['date_range']['end_date'] == '2024-01-04'
+
+    def test_write_from_other_process_invalidates(self, manager, tmp_path):
+        """測試其他進程（另一個管理器）重寫後不會讀到舊數據"""
+        manager.load_frame('2330')
+
+        CacheManager(str(tmp_path)).merge_data('2330', _frame(['2024-01-01'], close=90.0))
+
+        assert manager.load_frame('2330')['close'].tolist() == [90.0, 100.0, 100.0]
@@ -0,0 +1,84 @@
+"""
+增量技術指標引擎測試
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from services import IndicatorEngine, IndicatorService
+from services.indicator_engine import TOLERANCE
+from utils import FileLock
+
+
+def _bars(days=400, seed=3):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-01', periods=days, name='date')
+    return pd.DataFrame({
+        'open': 100.0, 'high': 101.0, 'low': 99.0,
+        'close': np.round(100 + np.cumsum(rng.normal(0, 1.5, days)), 2),
+        'volume': rng.integers(1000, 10 ** 7, days), 'capacity': 100000
+    }, index=dates)
+
+
+def _assert_matches(df, expected):
+    pd.testing.assert_frame_equal(df, expected, check_exact=False, rtol=TOLERANCE, atol=0)
+
+
+class TestIndicatorEngine:
+    """測試增量結果與 IndicatorService 一致"""
+
+    def test_appends_match_pandas(self, tmp_path, monkeypatch):
+        """測試逐日附加的結果與整段重新計算相同，且新的進程只遞推新的交易日"""
+        bars = _bars()
+        engine = IndicatorEngine(str(tmp_path))
+        engine.calculate('2330', bars.iloc[:100])
+        for end in range(101, 301):
+            _assert_matches(engine.calculate('2330', bars.iloc[:end]),
+                            IndicatorService.calculate_all(bars.iloc[:end]))
+
+        def fail(*args, **kwargs):
+            raise AssertionError('不應重新計算整段序列')
+        monkeypatch.setattr(IndicatorService, 'compute_block', fail)
+        monkeypatch.setattr(IndicatorService, 'calculate_all', fail)
+
+        other = IndicatorEngine(str(tmp_path))
+        df = other.calculate('2330', bars)
+        assert other._read_state('2330')['count'] == len(bars)
+        # 其他進程仍以較舊的數據查詢時使用已保存序列的前段
+        older = other.calculate('2330', bars.iloc[:250])
+        monkeypatch.undo()
+
+        _assert_matches(df, IndicatorService.calculate_all(bars))
+        _assert_matches(older, IndicatorService.calculate_all(bars.iloc[:250]))
+
+    @pytest.mark.parametrize('change', ['backfill', 'truncate', 'correction'])
+    def test_rebuilds_when_history_changes(self, tmp_path, change):
+        """測試補入較早日期、截斷或數據更正時重建"""
+        bars = _bars()
+        engine = IndicatorEngine(str(tmp_path), start_date='2023-01-01')
+        engine.calculate('2330', bars)
+
+        if change == 'backfill':
+            earlier = bars.iloc[:5].set_axis(pd.bdate_range('2023-12-01', periods=5, name='date'))
+            bars = pd.concat([earlier, bars])
+        elif change == 'truncate':
+            bars = pd.concat([bars.iloc[:200], bars.iloc[-10:].set_axis(bars.index[200:210])])
+        else:
+            bars = bars.copy()
+            bars.iloc[-1, bars.columns.get_loc('close')] += 1.0
+
+        _assert_matches(engine.calculate('2330', bars), IndicatorService.calculate_all(bars))
+        assert engine._read_state('2330')['count'] == len(bars)
+
+    def test_lock_is_per_ticker(self, tmp_path):
+        """測試一檔股票重建時不阻擋其他股票"""
+        bars = _bars(days=120)
+        engine = IndicatorEngine(str(tmp_path))
+
+        with FileLock(engine._lock_path('2330')):
+            worker = threading.Thread(target=engine.calculate, args=('2317', bars))
+            worker.start()
+            worker.join(timeout=10)
+            assert not worker.is_alive()
+        assert engine._read_state('2317')['count'] == len(bars)
@@ -0,0 +1,79 @@
+"""
+全市場收盤行情匯入測試（使用錄製的 STOCK_DAY_ALL 回應）
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+from services.market_ingest_service import MarketIngestService
+from utils import CacheManager, SingleFlight
+from utils.twse_parser import parse_daily_all
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'twse_stock_day_all.json')
+
+
+@pytest.fixture
+def payload():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _bar(date, close):
+    return {'date': date, 'open': close, 'high': close, 'low': close, 'close': close,
+            'volume': 1000, 'capacity': close * 1000}
+
+
+@pytest.fixture
+def service(tmp_path):
+    cache_manager = CacheManager(str(tmp_path / 'cache'))
+    cache_manager.create_cache('2330', '台積電', pd.DataFrame(
+        [_bar('2024-01-03', 578.0), _bar('2024-01-04', 578.0)]))
+    cache_manager.create_cache('2454', '聯發科', pd.DataFrame([_bar('2024-01-02', 940.0)]))
+    cache_manager.create_cache('2881', '富邦金', pd.DataFrame([_bar('2024-01-05', 64.0)]))
+    return MarketIngestService(
+        cache_manager=cache_manager,
+        fetch_engine=object(),
+        single_flight=SingleFlight(str(tmp_path / 'locks'))
+    )
+
+
+class TestParseDailyAll:
+    """測試全市場行情解析"""
+
+    def test_parse_fixture(self, payload):
+        """測試解析錄製的回應，略過無成交價的證券"""
+        table = parse_daily_all(payload)
+
+        assert len(table) == 6
+        assert '9958' not in table['ticker'].tolist()
+        row = table[table['ticker'] == '2330'].iloc[0]
+        assert row['date'] == '2024-01-05'
+        assert row['close'] == 580.0
+        assert row['volume'] == 21050000
+        assert row['capacity'] == 12243905000
+
+
+class TestMarketIngestService:
+    """測試分送到已快取的股票"""
+
+    def test_fan_out_to_cached_tickers(self, service, payload):
+        """測試只附加到連續的快取，有缺口或已是最新的略過"""
+        summary = service.ingest(payload)
+
+        assert summary['trade_date'] == '2024-01-05'
+        assert summary['updated'] == ['2330']
+        assert summary['skipped_gap'] == ['2454']
+
+        cache = service.cache_manager.load('2330')
+        assert cache['date_range']['end_date'] == '2024-01-05'
+        assert cache['data'][-1]['close'] == 580.0
+        assert service.cache_manager.load('2881')['date_range']['total_trading_days'] == 1
+
+    def test_ingest_is_idempotent(self, service, payload):
+        """測試重複匯入同一天不會重複附加"""
+        service.ingest(payload)
+        summary = service.ingest(payload)
+
+        assert summary['updated'] == []
+        assert service.cache_manager.load('2330')['date_range']['total_trading_days'] == 3
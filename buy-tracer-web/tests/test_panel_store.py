@@ -0,0 +1,128 @@
+"""
+日期 × 股票面板與全市場掃描測試
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from services import IndicatorService, MarketScanService, SignalService
+from utils import CacheManager, PanelStore
+
+
+def _bars(dates, close):
+    return pd.DataFrame({
+        'date': pd.DatetimeIndex(dates).strftime('%Y-%m-%d'), 'open': close, 'high': close + 1,
+        'low': close - 1, 'close': close, 'volume': 1000.0, 'capacity': 100000
+    })
+
+
+def _generation(store):
+    return store._read_state()['generation']
+
+
+class TestPanelStore:
+    """測試面板的增量同步"""
+
+    def test_sync_appends_and_rewrites(self, tmp_path):
+        """測試新交易日只附加、補入較早日期時重寫，已刪除的股票清空"""
+        cache_manager = CacheManager(str(tmp_path / 'cache'))
+        store = PanelStore(str(tmp_path / 'panel'))
+        dates = pd.bdate_range('2024-01-01', periods=5)
+        cache_manager.create_cache('2330', '台積電', _bars(dates[1:4], np.array([1.0, 2.0, 3.0])))
+        cache_manager.create_cache('2317', '鴻海', _bars(dates[2:3], np.array([10.0])))
+
+        assert store.sync(cache_manager) == {'appended': 0, 'rewritten': 2, 'removed': 0}
+        assert store.sync(cache_manager) == {'appended': 0, 'rewritten': 0, 'removed': 0}
+        generation = _generation(store)
+
+        cache_manager.merge_data('2330', _bars(dates[4:5], np.array([4.0])))
+        assert store.sync(cache_manager) == {'appended': 1, 'rewritten': 0, 'removed': 0}
+        assert _generation(store) == generation
+
+        panel = store.open()
+        col = panel.columns['2330']
+        assert panel.frame('close')['2330'].tolist() == [1.0, 2.0, 3.0, 4.0]
+        assert panel.valid[:, panel.columns['2317']].tolist() == [False, True, False, False]
+
+        cache_manager.merge_data('2330', _bars(dates[0:1], np.array([0.5])))
+        cache_manager.delete('2317')
+        assert store.sync(cache_manager) == {'appended': 0, 'rewritten': 1, 'removed': 1}
+        assert _generation(store) == generation + 1
+
+        panel = store.open()
+        assert panel.row('2024-01-01') == 0 and panel.row('2024-01-06') == -1
+        assert panel['close'][:, col].tolist() == [0.5, 1.0, 2.0, 3.0, 4.0]
+        assert not panel.valid[:, panel.columns['2317']].any()
+        assert sorted(p.name for p in (tmp_path / 'panel').iterdir()) == ['.lock', f'gen-{generation + 1}',
+                                                                           'panel.json']
+
+    def test_uncommitted_rows_are_truncated(self, tmp_path):
+        """測試附加中斷留下的未提交列不會被讀到，下一次寫入前截斷"""
+        store = PanelStore(str(tmp_path / 'panel'))
+        frame = _bars(pd.bdate_range('2024-01-01', periods=2), np.array([1.0, 2.0]))
+        frame['date'] = pd.to_datetime(frame['date'])
+        store.write({'2330': frame})
+
+        state = store._read_state()
+        store._append_rows(state, np.array([19725]))
+        assert len(store.open()) == 2
+
+        store.write({'2330': frame.assign(date=frame['date'] + pd.Timedelta(days=7))})
+        panel = store.open()
+        assert [str(d) for d in panel.dates] == ['2024-01-01', '2024-01-02', '2024-01-08', '2024-01-09']
+        assert (tmp_path / 'panel' / 'gen-1' / 'dates.i4').stat().st_size == 4 * 4
+
+
+class TestMarketScan:
+    """測試全市場掃描與逐檔計算一致"""
+
+    @pytest.fixture
+    def cache_manager(self, tmp_path):
+        rng = np.random.default_rng(7)
+        days = pd.bdate_range('2023-10-02', periods=260)
+        cache_manager = CacheManager(str(tmp_path / 'cache'))
+        for i in range(12):
+            # 各檔的上市日期不同，並隨機停牌
+            keep = rng.random(len(days)) > 0.08
+            keep[:i * 15] = False
+            dates = days[keep]
+            close = 50 + np.cumsum(rng.normal(0, 1.5, len(dates)))
+            df = _bars(dates, np.round(close, 2))
+            df['volume'] = rng.integers(500, 1500, len(dates)).astype(float)
+            cache_manager.create_cache(f"{1000 + i}", f"{1000 + i}", df)
+        return cache_manager
+
+    def test_matches_per_ticker_pipeline(self, tmp_path, cache_manager):
+        """測試買點與站上均線的結果與 IndicatorService + SignalService 逐檔計算相同"""
+        store = PanelStore(str(tmp_path / 'panel'))
+        service = MarketScanService(store)
+        assert service.get_panel() is None
+        store.sync(cache_manager)
+        frames = {t: cache_manager.load_frame(t) for t in sorted(cache_manager.get_all_cached_stocks())}
+        found = 0
+
+        for date in pd.bdate_range('2024-05-01', '2024-09-30')[::3].strftime('%Y-%m-%d'):
+            expected = {'type1': [], 'type2': [], 'above': []}
+            for ticker, df in frames.items():
+                history = df[df['date'] <= date]
+                if history.empty or history['date'].iloc[-1].strftime('%Y-%m-%d') != date:
+                    continue
+                if len(history) >= 20:
+                    closes = history['close'].iloc[-20:]
+                    if closes.iloc[-1] > closes.mean():
+                        expected['above'].append(ticker)
+
+                signals = SignalService.generate_signals(
+                    IndicatorService.calculate_all(history[history['date'] >= '2024-01-01']))
+                if len(signals) >= 2:
+                    for name in ('type1', 'type2'):
+                        if signals[f'buy_signal_{name}'].iloc[-1]:
+                            expected[name].append(ticker)
+
+            result = service.buy_signals(date=date, start_date='2024-01-01')
+            breadth = service.above_ma(window=20, date=date)
+            assert result['type1'] == expected['type1'], date
+            assert result['type2'] == expected['type2'], date
+            assert breadth['tickers'] == expected['above'], date
+            found += len(expected['type1']) + len(expected['type2'])
+
+        assert found > 0
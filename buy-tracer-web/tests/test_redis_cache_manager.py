@@ -0,0 +1,132 @@
+"""
+Redis 快取後端測試
+默認連線到本機替身伺服器；設定 REDIS_TEST_URL 時改用實際的 redis-server
+"""
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pytest
+from services import IndicatorEngine, StockDataService
+from utils import AccessTracker, FetchEngine, MonthStore, RedisCacheManager
+from utils.redis_client import RedisClient, RedisLock
+from utils.redis_standin import RedisStandIn
+from utils.shared_frame_store import SharedFrameStore
+
+
+def _frame(dates, close=100.0):
+    return pd.DataFrame({
+        'date': dates, 'open': close, 'high': close + 1, 'low': close - 1,
+        'close': close, 'volume': 1000, 'capacity': 100000
+    })
+
+
+@pytest.fixture
+def redis_url():
+    url = os.getenv('REDIS_TEST_URL')
+    if url:
+        yield url
+        return
+    with RedisStandIn() as standin:
+        yield standin.url
+
+
+@pytest.fixture
+def make_manager(redis_url):
+    """每個管理器代表一台主機（各自的連線與進程內快取），共用同一個前綴"""
+    prefix = f"test-{uuid.uuid4().hex}"
+    return lambda: RedisCacheManager(redis_url, prefix=prefix)
+
+
+class TestRedisCacheManager:
+    """測試欄位儲存與附加"""
+
+    def test_round_trip_and_append(self, make_manager):
+        """測試建立、附加與其他主機讀取"""
+        writer = make_manager()
+        writer.create_cache('2330', '台積電', _frame(['2024-01-02', '2024-01-03']))
+        reader = make_manager()
+        assert len(reader.load_frame('2330')) == 2
+
+        assert writer.merge_data('2330', _frame(['2024-01-04'], close=200.0))
+
+        df = reader.load_frame('2330')
+        assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-02', '2024-01-03', '2024-01-04']
+        assert df['close'].tolist() == [100.0, 100.0, 200.0]
+        assert reader.load_meta('2330')['date_range'] == {
+            'start_date': '2024-01-02', 'end_date': '2024-01-04', 'total_trading_days': 3}
+        assert len(reader.load_frame('2330', start_date='2024-01-03')) == 2
+
+    def test_backfill_rewrites_and_delete(self, make_manager):
+        """測試補入較早日期時重寫，刪除後其他主機不再讀到"""
+        manager = make_manager()
+        manager.create_cache('2330', '台積電', _frame(['2024-01-03', '2024-01-04']))
+        assert manager.merge_data('2330', _frame(['2024-01-02', '2024-01-03'], close=1.0))
+
+        df = manager.load_frame('2330')
+        assert df['close'].tolist() == [1.0, 100.0, 100.0]
+        assert manager.get_all_cached_stocks() == ['2330']
+        assert [info['record_count'] for info in manager.get_all_cache_info()] == [3]
+
+        assert manager.delete('2330')
+        assert make_manager().load_frame('2330') is None
+        assert not manager.merge_data('2330', _frame(['2024-01-05']))
+
+    def test_lock_is_exclusive_and_expires(self, redis_url):
+        """測試鎖同時只有一個持有者，逾時後可被取得且舊持有者不會誤刪"""
+        client = RedisClient(redis_url)
+        key = f"test-{uuid.uuid4().hex}:lock:2330"
+        first = RedisLock(client, key, ttl_seconds=0.2)
+        second = RedisLock(RedisClient(redis_url), key, ttl_seconds=5)
+
+        assert first.acquire(blocking=False)
+        assert not second.acquire(blocking=False)
+        time.sleep(0.3)
+        assert second.acquire(blocking=False)
+
+        first.release()
+        assert client.execute('EXISTS', key) == 1
+        second.release()
+        assert client.execute('EXISTS', key) == 0
+
+
+class TestClusterRefresh:
+    """測試多台主機共用快取時上游只抓取一次"""
+
+    def test_nodes_fetch_once(self, tmp_path, make_manager, fetcher, monkeypatch):
+        """測試兩台主機同時查詢同一檔股票，只有一台請求上游"""
+        requested = []
+        fetch_raw = fetcher.fetch_raw
+        monkeypatch.setattr(fetcher, 'fetch_raw', lambda year, month, sid, retry=5: (
+            requested.append((year, month)), fetch_raw(year, month, sid, retry))[1])
+
+        def make_node(name):
+            engine = FetchEngine(fetcher_factory=lambda ticker: fetcher,
+                                 month_store=MonthStore(str(tmp_path / name / 'months')))
+            return StockDataService(
+                cache_manager=make_manager(),
+                fetch_engine=engine,
+                access_tracker=AccessTracker(str(tmp_path / name / 'access_stats.json'), flush_interval=3600),
+                shared_store=SharedFrameStore(str(tmp_path / name / 'shm')),
+                indicator_engine=IndicatorEngine(str(tmp_path / name / 'indicators'))
+            )
+
+        nodes = [make_node('a'), make_node('b')]
+        results = {}
+
+        def query(node):
+            results[id(node)] = node.get_stock_data('2330', '2024-06-01')
+
+        threads = [threading.Thread(target=query, args=(node,)) for node in nodes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert requested and len(requested) == len(set(requested))
+        assert len(results[id(nodes[0])]) == len(results[id(nodes[1])]) > 0
+
+        nodes[1].get_stock_data('2330', '2024-06-01')
+        assert len(requested) == len(set(requested))
@@ -0,0 +1,166 @@
+"""
+收盤後背景更新排程測試
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from services.refresh_scheduler import RefreshScheduler
+from utils import AccessTracker, CacheManager, DateUtils
+
+
+def _bar(date):
+    return {'date': date, 'open': 100.0, 'high': 101.0, 'low': 99.0, 'close': 100.0,
+            'volume': 1000, 'capacity': 100000}
+
+
+class FakeStockService:
+    """只負責把快取補到最新可用日期的模擬服務"""
+
+    def __init__(self, cache_manager, access_tracker):
+        self.cache_manager = cache_manager
+        self.access_tracker = access_tracker
+        self.updated = []
+        self.on_update = None
+
+    def enforce_cache_budget(self, protect=None):
+        return []
+
+    def force_update(self, ticker):
+        self.updated.append(ticker)
+        latest = DateUtils.get_latest_available_date().strftime('%Y-%m-%d')
+        self.cache_manager.merge_data(ticker, pd.DataFrame([_bar(latest)]))
+        if self.on_update:
+            self.on_update(ticker)
+        return {'updated': True}
+
+
+class FakeIngestService:
+    def ingest(self):
+        return {'success': False, 'message': '全市場行情抓取失敗'}
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return AccessTracker(str(tmp_path / 'metadata' / 'access_stats.json'), flush_interval=3600)
+
+
+@pytest.fixture
+def stock_service(tmp_path, tracker):
+    cache_manager = CacheManager(str(tmp_path / 'cache'))
+    for ticker in ['2330', '2454', '2317', '2881']:
+        cache_manager.create_cache(ticker, ticker, pd.DataFrame([_bar('2024-01-02')]))
+    return FakeStockService(cache_manager, tracker)
+
+
+def _make_scheduler(tmp_path, stock_service):
+    return RefreshScheduler(
+        stock_service=stock_service,
+        ingest_service=FakeIngestService(),
+        progress_file=str(tmp_path / 'metadata' / 'refresh_progress.json'),
+        lock_file=str(tmp_path / 'locks' / 'refresh_scheduler.lock')
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'REFRESH_SCHEDULER_INTERVAL_SECONDS', 0)
+
+
+class TestAccessTracker:
+    """測試查詢頻率統計"""
+
+    def test_scores_include_unflushed_records(self, tracker):
+        """測試分數包含尚未寫回的查詢並跨實例共用"""
+        for ticker in ['2330', '2330', '2454']:
+            tracker.record(ticker)
+
+        scores = tracker.get_scores()
+        assert scores == pytest.approx({'2330': 2.0, '2454': 1.0}, rel=1e-3)
+
+        other = AccessTracker(tracker.stats_file)
+        other.record('2454')
+        assert other.get_scores() == pytest.approx({'2330': 2.0, '2454': 2.0}, rel=1e-3)
+
+    def test_scores_decay(self, tracker):
+        """測試分數隨半衰期衰減"""
+        tracker.record('2330')
+        tracker.flush()
+        data = tracker._read()
+        data['updated_at'] -= tracker.half_life_days * 86400
+        tracker._write(data)
+
+        assert tracker.get_scores()['2330'] == pytest.approx(0.5, rel=1e-3)
+
+
+    def test_last_access_shared(self, tracker):
+        """測試最後查詢時間包含尚未寫回的查詢並跨實例共用"""
+        tracker.record('2330')
+        other = AccessTracker(tracker.stats_file, flush_interval=3600)
+        other.record('2454')
+
+        assert set(tracker.get_last_access()) == {'2330'}
+        last_access = other.get_last_access()
+        assert set(last_access) == {'2330', '2454'}
+        assert last_access['2454'] >= last_access['2330']
+
+
+class TestRefreshScheduler:
+    """測試收盤後更新"""
+
+    def test_target_date_only_after_close(self):
+        """測試只在交易日 13:30 後執行"""
+        assert RefreshScheduler.get_target_date(datetime(2024, 1, 5, 10, 0)) is None
+        assert RefreshScheduler.get_target_date(datetime(2024, 1, 5, 14, 0)) == '2024-01-05'
+        assert RefreshScheduler.get_target_date(datetime(2024, 1, 6, 14, 0)) is None
+
+    def test_refresh_ordered_by_access(self, tmp_path, stock_service, tracker):
+        """測試依查詢頻率更新所有快取並標記完成"""
+        for ticker in ['2881', '2881', '2881', '2317', '2317', '2454']:
+            tracker.record(ticker)
+
+        progress = _make_scheduler(tmp_path, stock_service).run('2024-01-05')
+
+        assert stock_service.updated == ['2881', '2317', '2454', '2330']
+        assert progress['completed_at']
+        assert all(stock_service.cache_manager.is_up_to_date(t) for t in stock_service.updated)
+
+    def test_resume_after_interrupt(self, tmp_path, stock_service):
+        """測試中斷後重新啟動只處理未完成的股票"""
+        scheduler = _make_scheduler(tmp_path, stock_service)
+
+        def interrupt(ticker):
+            if len(stock_service.updated) == 2:
+                scheduler._stop_event.set()
+
+        stock_service.on_update = interrupt
+        progress = scheduler.run('2024-01-05')
+        assert len(progress['done']) == 2
+        assert 'completed_at' not in progress
+
+        first_pass = list(stock_service.updated)
+        stock_service.updated.clear()
+        stock_service.on_update = None
+        progress = _make_scheduler(tmp_path, stock_service).run('2024-01-05')
+
+        assert sorted(first_pass + stock_service.updated) == ['2317', '2330', '2454', '2881']
+        assert progress['completed_at']
+
+    def test_unrefreshable_ticker_gives_up(self, tmp_path, stock_service, monkeypatch):
+        """測試上游沒有更新的股票用完嘗試次數後不再請求，本輪記錄失敗後完成"""
+        from config import Config
+        monkeypatch.setattr(Config, 'REFRESH_SCHEDULER_MAX_ATTEMPTS', 2)
+        force_update = stock_service.force_update
+        stock_service.force_update = lambda ticker: None if ticker == '2317' else force_update(ticker)
+        scheduler = _make_scheduler(tmp_path, stock_service)
+
+        progress = scheduler.run('2024-01-05')
+        assert 'completed_at' not in progress
+        assert progress['failed'].keys() == {'2317'}
+
+        progress = scheduler.run('2024-01-05')
+        assert progress['completed_at']
+        assert progress['attempts'] == {'2317': 2}
+        assert scheduler.tick(datetime(2024, 1, 5, 14, 0)) is None
+        assert scheduler.get_pending_tickers(progress) == []
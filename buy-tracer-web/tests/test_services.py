@@ -1,6 +1,7 @@
 """
 服務層測試
 """
+import numpy as np
 import pytest
 import pandas as pd
 from services import IndicatorService, SignalService
@@ -43,6 +44,25 @@ class TestIndicatorService:
         assert 'dem' in result.columns
         assert 'osc' in result.columns
 
+    def test_calculate_all_matches_stepwise(self):
+        """測試單次計算與逐步計算後 dropna() 的結果相同"""
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'open': 100.0, 'high': 101.0, 'low': 99.0,
+            'close': np.round(100 + np.cumsum(rng.normal(0, 1, 300)), 2),
+            'volume': rng.integers(1000, 10 ** 6, 300), 'capacity': 100000
+        }, index=pd.bdate_range('2024-01-01', periods=300, name='date'))
+        df.iloc[150, df.columns.get_loc('open')] = np.nan
+
+        expected = IndicatorService.calculate_volume_ma(
+            IndicatorService.calculate_macd(IndicatorService.calculate_ma(df))).dropna()
+        result = IndicatorService.calculate_all(df)
+
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+        # 只有前段為 NaN 時以切片移除，股票數據欄位不複製
+        assert np.shares_memory(IndicatorService.calculate_all(df.iloc[:120])['close'].to_numpy(),
+                                df['close'].to_numpy())
+
 
 class TestSignalService:
     """測試訊號服務"""
@@ -0,0 +1,126 @@
+"""
+跨 worker 共享數據段測試
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from services import IndicatorEngine, StockDataService
+from utils import AccessTracker, CacheManager, DateUtils, SingleFlight
+from utils.shared_frame_store import SharedFrameStore
+
+
+def _indicators(days=100, close=100.0):
+    index = pd.DatetimeIndex(pd.bdate_range('2024-01-01', periods=days), name='date')
+    return pd.DataFrame({'close': close + np.arange(days, dtype=float),
+                         'volume': np.arange(days, dtype=np.int64)}, index=index)
+
+
+class TestSharedFrameStore:
+    """測試發布與唯讀附加"""
+
+    def test_attach_is_shared_and_readonly(self, tmp_path):
+        """測試其他進程（另一個實例）附加到同一份唯讀映射"""
+        SharedFrameStore(str(tmp_path)).put(('2330', '2024-01-01'), (1, 'a'), _indicators())
+        reader = SharedFrameStore(str(tmp_path))
+
+        first = reader.get(('2330', '2024-01-01'), (1, 'a'))
+        second = reader.get(('2330', '2024-01-01'), [1, 'a'])
+
+        pd.testing.assert_frame_equal(first, _indicators(), check_freq=False)
+        assert not first['close'].values.flags.writeable
+        assert np.shares_memory(first['close'].values, second['close'].values)
+        assert reader.get(('2330', '2024-01-01'), (2, 'a')) is None
+        assert reader.stats()['attached'] == 1
+
+    def test_republish_switches_generation(self, tmp_path):
+        """測試新版本發布後讀取端切換到新數據段，已取得的舊數據仍可讀取"""
+        writer = SharedFrameStore(str(tmp_path))
+        reader = SharedFrameStore(str(tmp_path))
+        writer.put('2330', 1, _indicators(close=100.0))
+        old = reader.get('2330', 1)
+
+        writer.put('2330', 2, _indicators(close=200.0))
+
+        assert reader.get('2330', 1) is None
+        assert reader.get('2330', 2)['close'].iloc[0] == 200.0
+        assert old['close'].iloc[0] == 100.0
+        assert len(list(tmp_path.glob('*.seg'))) == 1
+        assert reader.stats()['generation'] == 2
+
+    def test_evicts_oldest_published(self, tmp_path):
+        """測試超過上限時淘汰最早發布的數據段"""
+        store = SharedFrameStore(str(tmp_path), max_bytes=5000)
+        for ticker in ['2330', '2317', '2454']:
+            assert store.put(ticker, 1, _indicators())
+
+        assert store.get('2330', 1) is None
+        assert store.get('2454', 1) is not None
+        assert store.stats()['bytes'] <= 5000
+
+
+class TestStockDataServiceSharing:
+    """測試查詢流程使用共享數據段"""
+
+    @pytest.fixture
+    def make_service(self, tmp_path):
+        latest = DateUtils.get_latest_available_date()
+        dates = pd.bdate_range(end=latest.strftime('%Y-%m-%d'), periods=80)
+        CacheManager(str(tmp_path / 'cache')).create_cache('2330', '台積電', pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'), 'open': 100.0, 'high': 101.0, 'low': 99.0,
+            'close': 100.0 + np.arange(80), 'volume': 1000, 'capacity': 100000
+        }))
+
+        def make_service():
+            # 每個服務代表一個 worker：各自的快取管理器與已附加的數據段
+            return StockDataService(
+                cache_manager=CacheManager(str(tmp_path / 'cache')),
+                single_flight=SingleFlight(str(tmp_path / 'locks')),
+                access_tracker=AccessTracker(str(tmp_path / 'access_stats.json'), flush_interval=3600),
+                shared_store=SharedFrameStore(str(tmp_path / 'shm')),
+                indicator_engine=IndicatorEngine(str(tmp_path / 'indicators'))
+            )
+        return make_service
+
+    def test_other_worker_skips_load_and_compute(self, make_service, monkeypatch):
+        """測試一個 worker 計算後，其他 worker 直接附加結果"""
+        first, status = make_service().get_indicator_data('2330', '2024-01-01')
+        assert status == {'is_stale': False, 'refresh_pending': False}
+
+        other = make_service()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('不應載入快取或重新計算')
+        monkeypatch.setattr(other.cache_manager, 'load_frame', fail)
+
+        shared, _ = other.get_indicator_data('2330', '2024-01-01', compute=fail)
+
+        pd.testing.assert_frame_equal(shared, first)
+        assert other.shared_store.stats()['hits'] == 1
+
+    def test_cache_update_invalidates(self, make_service):
+        """測試快取數據更新後不使用舊的共享結果"""
+        service = make_service()
+        service.get_indicator_data('2330', '2024-01-01')
+        last = service.cache_manager.load_frame('2330').iloc[[-1]]
+        service.cache_manager.merge_data('2330', last.assign(date=last['date'] + pd.Timedelta(days=1),
+                                                             close=999.0))
+
+        df, _ = make_service().get_indicator_data('2330', '2024-01-01')
+
+        assert df['close'].iloc[-1] == 999.0
+
+    def test_eviction_removes_derived_data(self, tmp_path, make_service, monkeypatch):
+        """測試淘汰快取時一併刪除增量指標序列與共享數據段"""
+        from config import Config
+        service = make_service()
+        service.get_indicator_data('2330', service.indicator_engine.start_date)
+        assert (tmp_path / 'indicators' / '2330.ind').exists()
+        assert service.shared_store.get(('2330', service.indicator_engine.start_date),
+                                        service._data_version('2330')) is not None
+
+        monkeypatch.setattr(Config, 'CACHE_WATCHLIST', [])
+        monkeypatch.setattr(Config, 'MAX_CACHE_SIZE_MB', 1e-6)
+        assert service.enforce_cache_budget() == ['2330']
+
+        assert sorted(p.name for p in (tmp_path / 'indicators').iterdir()) == []
+        assert SharedFrameStore(str(tmp_path / 'shm'))._read_index()['entries'] == {}
@@ -0,0 +1,119 @@
+"""
+single-flight 合併測試
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+from utils.single_flight import FileLock, SingleFlight
+
+
+def _refresh_once(lock_path, marker_path, counter_path):
+    """模擬 worker 進程：取得鎖後重新檢查，只有第一個進程真正更新"""
+    with FileLock(lock_path):
+        if os.path.exists(marker_path):
+            return
+        with open(counter_path, 'a') as f:
+            f.write('x')
+        time.sleep(0.05)
+        with open(marker_path, 'w') as f:
+            f.write('done')
+
+
+class TestSingleFlight:
+    """測試同一鍵值的呼叫合併"""
+
+    def test_concurrent_calls_share_result(self, tmp_path):
+        """測試同時的呼叫只執行一次並共用結果"""
+        flight = SingleFlight(str(tmp_path))
+        calls = []
+        barrier = threading.Barrier(8)
+        results = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'rows': 42}
+
+        def caller():
+            barrier.wait()
+            results.append(flight.do('2330', work))
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert len(results) == 8
+        assert all(r is results[0] for r in results)
+        assert not flight.is_in_flight('2330')
+
+    def test_error_propagates_to_waiters(self, tmp_path):
+        """測試錯誤會傳遞給所有等待者"""
+        flight = SingleFlight(str(tmp_path))
+        started = threading.Event()
+        errors = []
+
+        def work():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError('upstream down')
+
+        def waiter():
+            started.wait()
+            try:
+                flight.do('2330', work)
+            except ValueError as e:
+                errors.append(e)
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        with pytest.raises(ValueError):
+            flight.do('2330', work)
+        t.join()
+
+        assert len(errors) == 1
+
+    def test_different_keys_run_independently(self, tmp_path):
+        """測試不同股票代號不互相阻塞"""
+        flight = SingleFlight(str(tmp_path))
+
+        assert flight.do('2330', lambda: 1) == 1
+        assert flight.do('2454', lambda: 2) == 2
+
+
+class TestFileLock:
+    """測試跨進程檔案鎖"""
+
+    def test_processes_refresh_once(self, tmp_path):
+        """測試多個進程同時更新時只有一個請求上游"""
+        lock_path = str(tmp_path / '2330.lock')
+        marker_path = str(tmp_path / '2330.json')
+        counter_path = str(tmp_path / 'upstream_calls')
+
+        processes = [
+            multiprocessing.Process(target=_refresh_once, args=(lock_path, marker_path, counter_path))
+            for _ in range(4)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+
+        with open(counter_path) as f:
+            assert f.read() == 'x'
+
+    def test_non_blocking_acquire(self, tmp_path):
+        """測試非阻塞取得已被佔用的鎖"""
+        path = str(tmp_path / 'scheduler.lock')
+
+        with FileLock(path):
+            other = FileLock(path)
+            assert other.acquire(blocking=False) is False
+
+        assert other.acquire(blocking=False) is True
+        other.release()
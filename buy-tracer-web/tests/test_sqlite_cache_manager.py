@@ -0,0 +1,68 @@
+"""
+SQLite 快取後端測試
+"""
+import pandas as pd
+import pytest
+from utils import CacheManager, SQLiteCacheManager
+
+
+def _frame(dates, close=100.0):
+    return pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close,
+                         'close': close, 'volume': 1000, 'capacity': 100000})
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = SQLiteCacheManager(str(tmp_path / 'cache.sqlite3'))
+    manager.create_cache('2330', '台積電',
+                         _frame(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']))
+    return manager
+
+
+class TestSQLiteCacheManager:
+    """測試 SQLite 後端的讀寫"""
+
+    def test_range_read(self, manager):
+        """測試只讀出日期範圍內的最後 N 個交易日"""
+        df = manager.load_frame('2330', start_date='2024-01-03', limit=2)
+
+        assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-04', '2024-01-05']
+        assert len(manager.load_frame('2330', end_date='2024-01-03')) == 2
+        assert len(manager.load_frame('2330')) == 4
+
+    def test_merge_keeps_existing_rows(self, manager):
+        """測試合併時已有的日期保留既有數據，並更新日期範圍與版本"""
+        version = manager.load_meta('2330')['metadata']['data_version']
+
+        assert manager.merge_data('2330', _frame(['2024-01-05', '2024-01-08'], close=90.0))
+
+        df = manager.load_frame('2330')
+        assert df['close'].tolist() == [100.0, 100.0, 100.0, 100.0, 90.0]
+        meta = manager.load_meta('2330')
+        assert meta['date_range'] == {'start_date': '2024-01-02', 'end_date': '2024-01-08',
+                                      'total_trading_days': 5}
+        assert meta['metadata']['stock_name'] == '台積電'
+        assert meta['metadata']['data_version'] == version + 1
+        assert not manager.merge_data('2317', _frame(['2024-01-08']))
+
+    def test_load_date_matches_file_backend(self, manager, tmp_path):
+        """測試「某日所有股票」查詢與檔案後端結果相同"""
+        files = CacheManager(str(tmp_path / 'files'))
+        for backend in (manager, files):
+            if backend is files:
+                backend.create_cache('2330', '台積電', manager.load_frame('2330'))
+            backend.create_cache('2317', '鴻海', _frame(['2024-01-03', '2024-01-08'], close=50.0))
+
+        result = manager.load_date('2024-01-03')
+
+        assert result['ticker'].tolist() == ['2317', '2330']
+        assert result['close'].tolist() == [50.0, 100.0]
+        pd.testing.assert_frame_equal(result, files.load_date('2024-01-03'))
+
+    def test_delete(self, manager):
+        """測試刪除後不再列出"""
+        assert manager.delete('2330')
+
+        assert not manager.exists('2330')
+        assert manager.get_all_cached_stocks() == []
+        assert manager.load_frame('2330') is None
@@ -0,0 +1,122 @@
+"""
+股票數據服務測試（以模擬上游取代證交所）
+"""
+import time
+
+import pandas as pd
+import pytest
+from config import Config
+from services import IndicatorEngine, StockDataService
+from utils import AccessTracker, CacheManager, FetchEngine, MonthStore, SingleFlight, bar_store
+from utils.shared_frame_store import SharedFrameStore
+
+
+def make_service(tmp_path, fetcher, months='months'):
+    """所有狀態（快取、查詢頻率、共享數據段、指標序列）都放在 tmp_path，不碰實際的 data/ 與 /dev/shm"""
+    engine = FetchEngine(fetcher_factory=lambda ticker: fetcher,
+                         month_store=MonthStore(str(tmp_path / months)))
+    return StockDataService(
+        cache_manager=CacheManager(str(tmp_path / 'cache')),
+        fetch_engine=engine,
+        single_flight=SingleFlight(str(tmp_path / 'locks')),
+        access_tracker=AccessTracker(str(tmp_path / 'access_stats.json'), flush_interval=3600),
+        shared_store=SharedFrameStore(str(tmp_path / 'shm')),
+        indicator_engine=IndicatorEngine(str(tmp_path / 'indicators'))
+    )
+
+
+@pytest.fixture
+def service(tmp_path, fetcher):
+    return make_service(tmp_path, fetcher)
+
+
+def _seed_stale_cache(service):
+    df = pd.DataFrame({
+        'date': ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'],
+        'open': 580.0, 'high': 583.0, 'low': 576.0, 'close': 580.0,
+        'volume': 1000, 'capacity': 580000
+    })
+    service.cache_manager.create_cache('2330', '台積電', df)
+
+
+def _wait_for_refresh(service, ticker, timeout=10):
+    deadline = time.monotonic() + timeout
+    while service.is_refresh_pending(ticker) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+class TestStaleWhileRevalidate:
+    """測試過期快取先回應、背景更新"""
+
+    def test_stale_cache_served_immediately(self, service, monkeypatch):
+        """測試過期快取立即回應並在背景補齊"""
+        monkeypatch.setattr(Config, 'STALE_WHILE_REVALIDATE', True)
+        _seed_stale_cache(service)
+
+        start = time.monotonic()
+        df, status = service.get_stock_data_with_status('2330')
+        elapsed = time.monotonic() - start
+
+        assert elapsed < 0.2
+        assert len(df) == 4
+        assert status == {'is_stale': True, 'refresh_pending': True}
+
+        _wait_for_refresh(service, '2330')
+        assert service.cache_manager.is_up_to_date('2330')
+
+    def test_disabled_blocks_until_updated(self, service, monkeypatch):
+        """測試關閉時等待上游更新後才回應"""
+        monkeypatch.setattr(Config, 'STALE_WHILE_REVALIDATE', False)
+        _seed_stale_cache(service)
+
+        df, status = service.get_stock_data_with_status('2330')
+
+        assert len(df) > 4
+        assert status['is_stale'] is False
+
+    def test_refresh_returns_requested_range(self, service, fetcher, monkeypatch):
+        """測試快取涵蓋更早的歷史時，更新後與直接命中快取返回相同的範圍"""
+        monkeypatch.setattr(Config, 'STALE_WHILE_REVALIDATE', False)
+        fetcher.delay = 0.0
+        dates = pd.bdate_range('2023-06-01', '2024-01-05').strftime('%Y-%m-%d')
+        service.cache_manager.create_cache('2330', '台積電', pd.DataFrame({
+            'date': dates, 'open': 580.0, 'high': 583.0, 'low': 576.0, 'close': 580.0,
+            'volume': 1000, 'capacity': 580000
+        }))
+
+        refreshed = service.get_stock_data('2330', '2024-01-01')
+        assert service.cache_manager.is_up_to_date('2330')
+        cached = service.get_stock_data('2330', '2024-01-01')
+
+        assert refreshed.index[0] == pd.Timestamp('2024-01-01')
+        pd.testing.assert_frame_equal(refreshed, cached)
+
+    def test_cold_start_downloads(self, service, fetcher):
+        """測試沒有快取時下載完整數據"""
+        df = service.get_stock_data('2330', '2024-01-01')
+
+        assert df.index[0] >= pd.Timestamp('2024-01-01')
+        assert fetcher.calls > 0
+        assert service.cache_manager.exists('2330')
+
+    def test_damaged_cache_refetches_tail_only(self, tmp_path, fetcher, monkeypatch):
+        """測試記錄檔損壞時截斷到最後一個有效區塊，只向上游補回之後的月份"""
+        fetcher.delay = 0.0
+        requested = []
+        fetch_raw = fetcher.fetch_raw
+        monkeypatch.setattr(fetcher, 'fetch_raw', lambda year, month, sid, retry=5: (
+            requested.append((year, month)), fetch_raw(year, month, sid, retry))[1])
+
+        # 各自的月份暫存，補回的月份一定來自上游
+        full = make_service(tmp_path, fetcher, 'a').get_stock_data('2330', '2024-01-01')
+        path = str(tmp_path / 'cache' / '2330.bars')
+        with open(path, 'r+b') as f:
+            f.seek(300 * bar_store.RECORD_SIZE)
+            f.write(b'\xff' * 8)
+        requested.clear()
+
+        df = make_service(tmp_path, fetcher, 'b').get_stock_data('2330', '2024-01-01')
+
+        pd.testing.assert_frame_equal(df, full)
+        kept = full.index[256 - 1]
+        assert requested and min(requested) == (kept.year, kept.month)
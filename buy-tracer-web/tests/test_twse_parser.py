@@ -0,0 +1,115 @@
+"""
+向量化回應解析器測試（與修補後的 twstock 逐列解析比對）
+"""
+import copy
+import math
+
+import numpy as np
+import pytest
+import twstock.stock
+from utils.twse_parser import (
+    FIELDS, columns_to_frame, concat_columns, parse_payload, parse_tpex_rows, parse_twse_rows
+)
+from utils.twstock_patch import patched_make_datatuple_tpex, patched_make_datatuple_twse
+
+TWSE_ROWS = [
+    ['113/01/02', '26,059,058', '15,372,150,234', '590.00', '593.00', '589.00', '593.00', '+4.00', '24,167', ''],
+    ['113/01/03', '37,106,763', '21,556,087,616', '584.00', '585.00', '576.00', '578.00', '-15.00', '57,931', ''],
+    ['113/01/04', '1,000', '580,000', '--', '--', '--', '--', 'X0.00', '0', ''],
+    ['113/01/05', '21,050,000', '12,243,905,000', '580.00', '583.00', '576.00', '580.00', '+2.00', '25,510'],
+    ['112/12/29', '1,234,567,890', '9,876,543,210,123', '1,020.50', '1,025.00', '1,010.00', '1,015.50', ' 0.00', '123,456', ''],
+]
+
+TPEX_ROWS = [
+    ['113/01/02', '5,390', '1,046,153', '194.00', '196.50', '192.50', '195.00', '1.50', '4,204'],
+    ['113/01/03＊', '7,120', '1,353,402', '192.00', '193.00', '188.50', '189.00', '-6.00', '5,803'],
+    ['113/01/04', '100', '19,000', '--', '--', '--', '--', '0.00', '0'],
+]
+
+
+def _reference(make_datatuple, fetcher, rows):
+    """以修補後的 twstock 逐列解析作為基準"""
+    return [make_datatuple(fetcher, copy.copy(row)) for row in rows]
+
+
+def _assert_parity(columns, expected):
+    assert len(columns['date']) == len(expected)
+    for i, item in enumerate(expected):
+        assert str(columns['date'][i]) == item.date.strftime('%Y-%m-%d')
+        for name in FIELDS[1:]:
+            value = getattr(item, name)
+            if value is None:
+                assert math.isnan(columns[name][i])
+            else:
+                assert columns[name][i] == pytest.approx(value)
+
+
+class TestTwseParser:
+    """測試證交所回應解析"""
+
+    def test_parity_with_twstock(self):
+        """測試與修補後的 _make_datatuple 結果一致"""
+        expected = _reference(patched_make_datatuple_twse, twstock.stock.TWSEFetcher(), TWSE_ROWS)
+
+        _assert_parity(parse_twse_rows(TWSE_ROWS), expected)
+
+    def test_column_dtypes(self):
+        """測試欄位型別"""
+        columns = parse_twse_rows(TWSE_ROWS)
+
+        assert columns['date'].dtype == np.dtype('datetime64[D]')
+        assert columns['capacity'].dtype == np.int64
+        assert columns['close'].dtype == np.float64
+
+    def test_two_digit_roc_year(self):
+        """測試民國 100 年以前的日期"""
+        row = ['99/01/04', '1,000', '64,000', '64.00', '64.50', '63.50', '64.00', '+0.50', '10']
+
+        columns = parse_twse_rows([row])
+
+        assert str(columns['date'][0]) == '2010-01-04'
+
+    def test_non_ok_payload_is_empty(self):
+        """測試查無資料的回應"""
+        columns = parse_payload('TWSE', {'stat': '很抱歉，沒有符合條件的資料!'})
+
+        assert len(columns['date']) == 0
+
+
+class TestTpexParser:
+    """測試櫃買中心回應解析"""
+
+    def test_parity_with_twstock(self):
+        """測試與修補後的 _make_datatuple 結果一致（含 ＊ 標記與千股單位）"""
+        expected = _reference(patched_make_datatuple_tpex, twstock.stock.TPEXFetcher(), TPEX_ROWS)
+
+        _assert_parity(parse_payload('TPEX', {'aaData': TPEX_ROWS}), expected)
+
+    def test_rows_direct(self):
+        """測試直接解析資料列：民國日期（含 ＊ 標記）、'--' 無成交價、千分位與千股單位"""
+        columns = parse_tpex_rows(TPEX_ROWS)
+
+        assert [str(d) for d in columns['date']] == ['2024-01-02', '2024-01-03', '2024-01-04']
+        assert columns['capacity'].tolist() == [5390000, 7120000, 100000]
+        assert columns['turnover'].tolist() == [1046153000, 1353402000, 19000000]
+        assert columns['close'][1] == 189.0 and columns['change'][1] == -6.0
+        assert all(math.isnan(columns[name][2]) for name in ('open', 'high', 'low', 'close'))
+        assert columns['transaction'].tolist() == [4204, 5803, 0]
+
+    def test_empty_rows(self):
+        """測試沒有資料列"""
+        assert len(parse_tpex_rows([])['date']) == 0
+
+
+class TestColumnsToFrame:
+    """測試轉換為快取格式"""
+
+    def test_skip_missing_prices(self):
+        """測試略過無成交價（'--'）的交易日並依序合併月份"""
+        parts = [parse_twse_rows(TWSE_ROWS[4:]), parse_twse_rows(TWSE_ROWS[:4])]
+
+        df = columns_to_frame(concat_columns(parts))
+
+        assert df['date'].tolist() == ['2023-12-29', '2024-01-02', '2024-01-03', '2024-01-05']
+        assert df['volume'].iloc[1] == 26059058
+        assert df['capacity'].iloc[1] == 15372150234
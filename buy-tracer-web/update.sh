@@ -256,13 +256,14 @@ start_containers() {
 wait_for_service() {
     print_step "等待服務就緒..."
 
-    MAX_RETRIES=30
+    # 啟動預熱最多 WARMUP_TIME_BUDGET_SECONDS（默認 60 秒）
+    MAX_RETRIES=60
     RETRY_COUNT=0
 
     while [ $RETRY_COUNT -lt $MAX_RETRIES ]; do
         if sudo docker compose -f "$COMPOSE_FILE" ps | grep -q "Up"; then
-            # 檢查應用健康狀態
-            if curl -s http://localhost:5000/api/health > /dev/null 2>&1; then
+            # 檢查應用是否就緒（熱門股票預熱完成前回應 503）
+            if curl -sf http://localhost:5000/api/ready > /dev/null 2>&1; then
                 print_success "服務已就緒"
                 return 0
             fi
@@ -322,6 +323,7 @@ show_access_info() {
 
     echo ""
     echo "📊 健康檢查: http://localhost:5000/api/health"
+    echo "📊 就緒檢查: http://localhost:5000/api/ready"
     echo ""
     echo "🔧 管理命令:"
     echo "   查看日誌: sudo docker compose -f $COMPOSE_FILE logs -f"
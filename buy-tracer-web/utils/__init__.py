@@ -1,8 +1,29 @@
 """
 工具模組
 """
-from .cache_manager import CacheManager
+from .cache_manager import CacheManager, CacheManagerBase, create_cache_manager
+from .sqlite_cache_manager import SQLiteCacheManager
+from .redis_cache_manager import RedisCacheManager
 from .date_utils import DateUtils
 from .twstock_patch import apply_twstock_patch
+from .fetch_engine import FetchEngine
+from .month_store import MonthStore
+from .single_flight import SingleFlight, FileLock
+from .access_tracker import AccessTracker
+from .panel_store import PanelStore
 
-__all__ = ['CacheManager', 'DateUtils', 'apply_twstock_patch']
+__all__ = [
+    'CacheManager',
+    'CacheManagerBase',
+    'SQLiteCacheManager',
+    'RedisCacheManager',
+    'create_cache_manager',
+    'DateUtils',
+    'apply_twstock_patch',
+    'FetchEngine',
+    'MonthStore',
+    'SingleFlight',
+    'FileLock',
+    'AccessTracker',
+    'PanelStore'
+]
@@ -0,0 +1,120 @@
+"""
+股票查詢頻率統計
+記錄各股票近期被查詢的次數（隨時間衰減），供背景更新決定優先順序，
+以及最後查詢時間，供快取淘汰決定先後；
+各 worker 進程先在記憶體累計，定期以檔案鎖合併寫入共用的統計檔
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+from config import Config
+from .atomic_file import atomic_write
+from .single_flight import FileLock
+
+
+class AccessTracker:
+    """近期查詢頻率統計（指數衰減計分）"""
+
+    def __init__(self, stats_file: str = None, half_life_days: float = None,
+                 flush_interval: float = None):
+        """
+        初始化統計器
+
+        Args:
+            stats_file: 統計檔路徑
+            half_life_days: 計分半衰期（天）
+            flush_interval: 記憶體累計寫回檔案的間隔（秒）
+        """
+        self.stats_file = stats_file or os.path.join(Config.METADATA_DIR, 'access_stats.json')
+        self.half_life_days = half_life_days or Config.ACCESS_HALF_LIFE_DAYS
+        self.flush_interval = Config.ACCESS_FLUSH_SECONDS if flush_interval is None else flush_interval
+        self._pending: Dict[str, int] = {}
+        self._pending_times: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def record(self, ticker: str):
+        """
+        記錄一次查詢
+
+        Args:
+            ticker: 股票代號
+        """
+        with self._lock:
+            self._pending[ticker] = self._pending.get(ticker, 0) + 1
+            self._pending_times[ticker] = time.time()
+            due = time.time() - self._last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """將記憶體累計的查詢次數合併寫入統計檔"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            times, self._pending_times = self._pending_times, {}
+            self._last_flush = time.time()
+
+        if not pending:
+            return
+
+        now = time.time()
+        try:
+            with FileLock(self.stats_file + '.lock'):
+                data = self._read()
+                stats = self._decayed(data, now)
+                for ticker, count in pending.items():
+                    stats[ticker] = stats.get(ticker, 0.0) + count
+                last_access = data.get('last_access', {})
+                for ticker, accessed_at in times.items():
+                    last_access[ticker] = max(last_access.get(ticker, 0.0), accessed_at)
+                self._write({'updated_at': now, 'scores': stats, 'last_access': last_access})
+        except (IOError, OSError) as e:
+            print(f"查詢統計保存失敗: {e}")
+
+    def get_scores(self) -> Dict[str, float]:
+        """
+        獲取各股票目前的查詢分數（含本進程尚未寫回的次數）
+
+        Returns:
+            Dict[str, float]: 股票代號 → 分數
+        """
+        self.flush()
+        return self._decayed(self._read(), time.time())
+
+    def get_last_access(self) -> Dict[str, float]:
+        """
+        獲取各股票最後被查詢的時間（含本進程尚未寫回的查詢）
+
+        Returns:
+            Dict[str, float]: 股票代號 → Unix 時間戳
+        """
+        self.flush()
+        return self._read().get('last_access', {})
+
+    def _decayed(self, data: Dict, now: float) -> Dict[str, float]:
+        """依距上次寫入經過的時間衰減分數"""
+        scores = data.get('scores', {})
+        if not scores:
+            return {}
+
+        elapsed_days = max(0.0, now - data.get('updated_at', now)) / 86400
+        factor = 0.5 ** (elapsed_days / self.half_life_days)
+        return {ticker: score * factor for ticker, score in scores.items()}
+
+    def _read(self) -> Dict:
+        if not os.path.exists(self.stats_file):
+            return {}
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"查詢統計讀取失敗: {e}")
+            return {}
+
+    def _write(self, data: Dict):
+        os.makedirs(os.path.dirname(self.stats_file), exist_ok=True)
+        atomic_write(self.stats_file, json.dumps(data, ensure_ascii=False).encode('utf-8'))
@@ -0,0 +1,44 @@
+"""
+原子檔案寫入
+先寫入同目錄的暫存檔並 fsync，再以 os.replace 替換目標檔，最後 fsync 目錄；
+讀取端只會看到替換前或替換後的完整檔案，斷電後也不會留下空檔或寫到一半的檔案
+"""
+import os
+import tempfile
+
+
+def fsync_dir(directory: str):
+    """fsync 目錄，讓 rename 本身寫入磁碟（不支援的平台略過）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    以暫存檔 + fsync + rename 寫入檔案
+
+    Args:
+        path: 目標檔路徑
+        data: 檔案內容
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(directory)
@@ -0,0 +1,158 @@
+"""
+日線記錄的壓縮編碼
+將 bar_store.BAR_DTYPE 記錄編碼為一個壓縮區塊，解碼全為向量化的 numpy 運算：
+
+- date：第一天的日數 + 逐日差值（多為 1～3 天，以 int8 保存）
+- open/high/low/close：乘上 10^price_scale 轉為整數檔位後取差值，
+  price_scale 取能無損還原所有價格的最小位數（0～4），無法無損轉換時保存原始 float64
+- volume/capacity：差值
+- 差值以能容納的最小整數型別保存，再依位元組重排（同一位元組位置的數值排在一起）後整塊壓縮
+
+壓縮使用 zlib；安裝 zstandard 時可設定 CACHE_COMPRESSION=zstd
+"""
+import struct
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # 可選依賴，未安裝時只能使用 zlib
+    zstandard = None
+
+
+CODECS = {'zlib': 1, 'zstd': 2}
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+# 價格無法以整數檔位無損表示時的 price_scale
+RAW_FLOAT = 255
+MAX_PRICE_SCALE = 4
+# 每個欄位的型別代碼：0 為原始 float64，其餘為差值的整數位元組數
+RAW_FLOAT_CODE = 0
+
+
+def _narrow(deltas: np.ndarray) -> np.ndarray:
+    """差值轉為能容納的最小有號整數型別"""
+    if len(deltas) == 0:
+        return deltas.astype(np.int8)
+    lo, hi = int(deltas.min()), int(deltas.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return deltas.astype(dtype)
+    return deltas.astype(np.int64)
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """依位元組位置重排（第 0 個位元組全部、第 1 個位元組全部……），提高壓縮率"""
+    return np.ascontiguousarray(values.view(np.uint8).reshape(-1, values.itemsize).T).tobytes()
+
+
+def _unshuffle(data: memoryview, dtype: np.dtype, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(data, dtype=np.uint8, count=count * dtype.itemsize).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(count)
+
+
+def price_scale(records: np.ndarray) -> int:
+    """能無損還原所有價格的最小小數位數，無法無損轉換時返回 RAW_FLOAT"""
+    prices = np.concatenate([records[name] for name in PRICE_FIELDS])
+    if not np.isfinite(prices).all():
+        return RAW_FLOAT
+    for scale in range(MAX_PRICE_SCALE + 1):
+        factor = 10 ** scale
+        ticks = np.round(prices * factor)
+        if np.abs(ticks).max(initial=0) < 2 ** 53 and np.array_equal(ticks / factor, prices):
+            return scale
+    return RAW_FLOAT
+
+
+def encode(records: np.ndarray, codec: str = 'zlib', level: int = 6) -> Tuple[bytes, int, int]:
+    """
+    記錄編碼為壓縮區塊
+
+    Args:
+        records: bar_store.BAR_DTYPE 陣列（依日期排序）
+        codec: 'zlib' 或 'zstd'
+        level: 壓縮等級
+
+    Returns:
+        Tuple[bytes, int, int]: (壓縮後的區塊, 壓縮方式代碼, price_scale)
+    """
+    if codec not in CODECS:
+        raise ValueError(f"未知的壓縮方式: {codec}")
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError('未安裝 zstandard，無法使用 zstd 壓縮')
+
+    scale = price_scale(records)
+    parts = []
+    for name in records.dtype.names:
+        column = records[name]
+        if name in PRICE_FIELDS and scale == RAW_FLOAT:
+            parts.append(struct.pack('<Bq', RAW_FLOAT_CODE, 0))
+            parts.append(_shuffle(column.astype('<f8')))
+            continue
+        if name in PRICE_FIELDS:
+            column = np.round(column * 10 ** scale)
+        values = column.astype(np.int64)
+        first = int(values[0]) if len(values) else 0
+        deltas = _narrow(np.diff(values))
+        parts.append(struct.pack('<Bq', deltas.itemsize, first))
+        parts.append(_shuffle(deltas.astype(deltas.dtype.newbyteorder('<'))))
+
+    payload = b''.join(parts)
+    if codec == 'zstd':
+        block = zstandard.ZstdCompressor(level=level).compress(payload)
+    else:
+        block = zlib.compress(payload, level)
+    return block, CODECS[codec], scale
+
+
+def decode(block: bytes, codec_id: int, scale: int, count: int, dtype: np.dtype) -> np.ndarray:
+    """
+    解碼壓縮區塊
+
+    Args:
+        block: 壓縮後的區塊
+        codec_id: 壓縮方式代碼
+        scale: price_scale
+        count: 記錄筆數
+        dtype: 記錄型別（bar_store.BAR_DTYPE）
+
+    Returns:
+        np.ndarray: dtype 陣列
+    """
+    if codec_id == CODECS['zstd']:
+        if zstandard is None:
+            raise ValueError('未安裝 zstandard，無法讀取 zstd 壓縮的記錄')
+        payload = zstandard.ZstdDecompressor().decompress(block)
+    elif codec_id == CODECS['zlib']:
+        payload = zlib.decompress(block)
+    else:
+        raise ValueError(f"未知的壓縮方式代碼: {codec_id}")
+
+    view = memoryview(payload)
+    records = np.empty(count, dtype=dtype)
+    offset = 0
+    for name in records.dtype.names:
+        code, first = struct.unpack_from('<Bq', view, offset)
+        offset += 9
+        if code == RAW_FLOAT_CODE:
+            records[name] = _unshuffle(view[offset:], '<f8', count)
+            offset += 8 * count
+            continue
+
+        width = max(count - 1, 0)
+        deltas = _unshuffle(view[offset:], f'<i{code}', width)
+        offset += code * width
+        if count == 0:
+            continue
+        values = np.empty(count, dtype=np.int64)
+        values[0] = first
+        np.cumsum(deltas, dtype=np.int64, out=values[1:])
+        values[1:] += first
+        if name in PRICE_FIELDS:
+            records[name] = values / 10 ** scale
+        else:
+            records[name] = values
+    return records
@@ -0,0 +1,427 @@
+"""
+定長日線記錄檔
+每檔股票一個 {ticker}.bars，沒有檔頭，每筆交易日為一筆 BAR_DTYPE 記錄：
+date (int32，1970-01-01 起的日數)、open/high/low/close (float64)、volume/capacity (int64)
+
+讀取以 numpy.memmap 映射，取得的欄位是檔案頁面的零複製視圖，
+同一台機器上所有 gunicorn worker 共用作業系統的頁面快取；
+新增交易日只在檔尾寫入一次，不重寫既有記錄
+
+啟用壓縮（CACHE_COMPRESSION）時，完整寫入的記錄編碼為一個壓縮區塊放在檔頭之後
+（見 utils.bar_codec），之後附加的交易日仍以定長記錄接在檔尾：
+
+    檔頭 (HEADER_SIZE) | 壓縮區塊 | 定長記錄 × 尾端筆數
+
+檔頭以 MAGIC 開頭（換算為日數遠超過任何有效日期，不會與沒有檔頭的記錄混淆），
+並保存區塊的第一筆與最後一筆記錄，日期範圍查詢不需要解壓縮
+
+每個記錄檔另有校驗檔 {記錄檔}.crc：定長記錄每 CHECKSUM_RECORDS 筆一個 CRC32，
+壓縮檔的檔頭與壓縮區塊另有一個 CRC32。校驗檔記錄所屬記錄檔的 inode 與涵蓋的筆數：
+- 原子替換後、校驗檔更新前讀到的是另一個 inode，本次讀取不驗證
+- 附加後、校驗檔更新前多出的記錄不在涵蓋範圍內，不驗證
+讀取時驗證失敗以 ChecksumError 回報最後一個有效區塊之前的筆數，由寫入端截斷
+"""
+import os
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from . import bar_codec
+from .atomic_file import atomic_write
+
+BAR_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+    ('capacity', '<i8'),
+])
+
+# 每筆記錄的位元組數（52）
+RECORD_SIZE = BAR_DTYPE.itemsize
+
+# 壓縮檔頭：MAGIC、格式版本、壓縮方式代碼、price_scale、保留、區塊筆數、區塊位元組數，
+# 之後是區塊的第一筆與最後一筆記錄
+MAGIC = b'BTBZ'
+HEADER_FORMAT = '<4sBBBBII'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT) + 2 * RECORD_SIZE
+
+# 校驗檔：MAGIC、格式版本、記錄檔 inode、定長記錄起始位移、涵蓋的定長記錄筆數、檔頭與壓縮區塊的 CRC32，
+# 之後是每個區塊的 CRC32（uint32），最後是校驗檔本身的 CRC32
+CHECKSUM_SUFFIX = '.crc'
+CHECKSUM_MAGIC = b'BTCK'
+CHECKSUM_FORMAT = '<4sIQQQI'
+CHECKSUM_HEADER_SIZE = struct.calcsize(CHECKSUM_FORMAT)
+# 每個校驗區塊的定長記錄筆數（約 3 個月的交易日）
+CHECKSUM_RECORDS = 64
+CHECKSUM_BLOCK_SIZE = CHECKSUM_RECORDS * RECORD_SIZE
+
+
+class ChecksumError(ValueError):
+    """記錄檔內容與校驗檔不符"""
+
+    def __init__(self, path: str, valid_records: int):
+        """
+        Args:
+            path: 記錄檔路徑
+            valid_records: 第一個損壞區塊之前的記錄筆數（0 表示整個檔案無法使用）
+        """
+        super().__init__(f"記錄檔校驗失敗: {path}（有效記錄 {valid_records} 筆）")
+        self.path = path
+        self.valid_records = valid_records
+
+
+def to_records(df: pd.DataFrame) -> np.ndarray:
+    """
+    DataFrame 轉為定長記錄
+
+    Args:
+        df: 已經 normalize_frame 的 DataFrame（date 為 datetime64）
+
+    Returns:
+        np.ndarray: BAR_DTYPE 陣列
+    """
+    records = np.empty(len(df), dtype=BAR_DTYPE)
+    records['date'] = df['date'].values.astype('datetime64[D]').astype(np.int32)
+    for name in BAR_DTYPE.names[1:]:
+        records[name] = df[name].values
+    return records
+
+
+def to_frame(records: np.ndarray) -> pd.DataFrame:
+    """
+    定長記錄轉為 DataFrame（date 為 datetime64[ns]）
+
+    Args:
+        records: BAR_DTYPE 陣列或 memmap
+
+    Returns:
+        pd.DataFrame: 含 date 與價量欄位的 DataFrame
+    """
+    return pd.DataFrame({
+        'date': records['date'].astype('datetime64[D]').astype('datetime64[ns]'),
+        **{name: records[name] for name in BAR_DTYPE.names[1:]}
+    })
+
+
+def date_string(ordinal) -> str:
+    """日數轉為 YYYY-MM-DD"""
+    return str(np.datetime64(int(ordinal), 'D'))
+
+
+def date_ordinal(date_str: str) -> int:
+    """YYYY-MM-DD 轉為日數"""
+    return int(np.datetime64(date_str, 'D').astype(np.int64))
+
+
+def _read_layout(f) -> Tuple[int, int, Optional[tuple]]:
+    """
+    讀取檔案配置
+
+    Returns:
+        Tuple: (尾端定長記錄的起始位移, 壓縮區塊筆數, 檔頭欄位)，沒有檔頭時為 (0, 0, None)
+    """
+    f.seek(0)
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:len(MAGIC)] != MAGIC:
+        return 0, 0, None
+    fields = struct.unpack_from(HEADER_FORMAT, raw)
+    block_count, block_nbytes = fields[5], fields[6]
+    edges = np.frombuffer(raw, dtype=BAR_DTYPE, count=2, offset=struct.calcsize(HEADER_FORMAT))
+    return HEADER_SIZE + block_nbytes, block_count, fields + (edges[0], edges[1])
+
+
+def record_count(path: str) -> int:
+    """檔案中完整記錄的筆數（檔尾不完整的記錄不計）"""
+    try:
+        with open(path, 'rb') as f:
+            data_start, block_count, _ = _read_layout(f)
+            return block_count + (os.fstat(f.fileno()).st_size - data_start) // RECORD_SIZE
+    except OSError:
+        return 0
+
+
+def tail_count(path: str) -> int:
+    """檔尾未壓縮的定長記錄筆數（沒有檔頭時為全部記錄）"""
+    try:
+        with open(path, 'rb') as f:
+            data_start, _, _ = _read_layout(f)
+            return (os.fstat(f.fileno()).st_size - data_start) // RECORD_SIZE
+    except OSError:
+        return 0
+
+
+def open_bars(path: str, verify: bool = False) -> Optional[np.ndarray]:
+    """
+    以唯讀 memmap 開啟記錄檔
+
+    只映射開啟當下的完整記錄；之後附加的記錄或原子替換都不影響已映射的視圖。
+    有壓縮區塊時解壓縮後與檔尾的定長記錄合併，返回唯讀的一般陣列
+
+    Args:
+        path: 記錄檔路徑
+        verify: 是否依校驗檔驗證（映射的頁面本來就要讀取，驗證只多一次 CRC32 計算）
+
+    Returns:
+        np.ndarray: BAR_DTYPE 的 memmap（空檔為空陣列），檔案不存在時返回 None
+
+    Raises:
+        ChecksumError: 驗證失敗，或壓縮區塊無法解碼
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    # 筆數與映射取自同一個已開啟的檔案，不受其間的原子替換影響
+    with f:
+        data_start, block_count, header = _read_layout(f)
+        count = (os.fstat(f.fileno()).st_size - data_start) // RECORD_SIZE
+        if header is None:
+            if count == 0:
+                return np.empty(0, dtype=BAR_DTYPE)
+            records = np.memmap(f, dtype=BAR_DTYPE, mode='r', shape=(count,))
+            if verify:
+                _verify(path, f, data_start, 0, b'', records.view(np.uint8))
+            return records
+
+        f.seek(0)
+        prefix = f.read(data_start)
+        tail = np.frombuffer(f.read(count * RECORD_SIZE), dtype=BAR_DTYPE)
+        if verify:
+            _verify(path, f, data_start, block_count, prefix, tail.view(np.uint8))
+    try:
+        records = bar_codec.decode(prefix[HEADER_SIZE:], header[2], header[3], block_count, BAR_DTYPE)
+    except (zlib.error, struct.error, ValueError) as e:
+        raise ChecksumError(path, 0) from e
+    if len(tail):
+        records = np.concatenate([records, tail])
+    records.flags.writeable = False
+    return records
+
+
+def verify_bars(path: str) -> Optional[bool]:
+    """
+    依校驗檔驗證整個記錄檔（不解壓縮）
+
+    Returns:
+        Optional[bool]: 全部記錄通過驗證為 True；沒有對應的校驗檔（舊版快取）或有未涵蓋的記錄
+            （附加後更新校驗檔前中斷）為 False；記錄檔不存在時為 None
+
+    Raises:
+        ChecksumError: 驗證失敗
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        data_start, block_count, _ = _read_layout(f)
+        count = (os.fstat(f.fileno()).st_size - data_start) // RECORD_SIZE
+        f.seek(0)
+        prefix = f.read(data_start)
+        tail = f.read(count * RECORD_SIZE)
+        return _verify(path, f, data_start, block_count, prefix, memoryview(tail))
+
+
+def checksum_path(path: str) -> str:
+    """校驗檔路徑"""
+    return path + CHECKSUM_SUFFIX
+
+
+def _block_checksums(data) -> List[int]:
+    """定長記錄區每 CHECKSUM_RECORDS 筆的 CRC32（最後一個區塊可以不滿）"""
+    data = memoryview(data).cast('B')
+    return [zlib.crc32(data[i:i + CHECKSUM_BLOCK_SIZE]) for i in range(0, len(data), CHECKSUM_BLOCK_SIZE)]
+
+
+def _read_checksums(path: str) -> Optional[Tuple[int, int, int, int, np.ndarray]]:
+    """
+    讀取校驗檔
+
+    Returns:
+        Tuple: (inode, 定長記錄起始位移, 涵蓋筆數, 檔頭與壓縮區塊的 CRC32, 各區塊 CRC32)，
+            不存在或本身損壞時返回 None
+    """
+    try:
+        with open(checksum_path(path), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    if len(raw) < CHECKSUM_HEADER_SIZE + 4 or raw[:len(CHECKSUM_MAGIC)] != CHECKSUM_MAGIC:
+        return None
+    if zlib.crc32(raw[:-4]) != struct.unpack_from('<I', raw, len(raw) - 4)[0]:
+        return None
+    _, _, inode, data_start, covered, base_crc = struct.unpack_from(CHECKSUM_FORMAT, raw)
+    crcs = np.frombuffer(raw[CHECKSUM_HEADER_SIZE:-4], dtype='<u4')
+    if len(crcs) != -(-covered // CHECKSUM_RECORDS):
+        return None
+    return inode, data_start, covered, base_crc, crcs
+
+
+def _write_checksums(path: str, inode: int, data_start: int, covered: int, base_crc: int, crcs: List[int]):
+    """寫入校驗檔（原子替換）"""
+    body = struct.pack(CHECKSUM_FORMAT, CHECKSUM_MAGIC, 1, inode, data_start, covered, base_crc)
+    body += np.asarray(crcs, dtype='<u4').tobytes()
+    atomic_write(checksum_path(path), body + struct.pack('<I', zlib.crc32(body)))
+
+
+def write_checksums(path: str):
+    """依記錄檔目前的內容重建校驗檔（寫入端在股票鎖內呼叫）"""
+    with open(path, 'rb') as f:
+        data_start, _, _ = _read_layout(f)
+        st = os.fstat(f.fileno())
+        count = (st.st_size - data_start) // RECORD_SIZE
+        f.seek(0)
+        prefix = f.read(data_start)
+        tail = f.read(count * RECORD_SIZE)
+    _write_checksums(path, st.st_ino, data_start, count, zlib.crc32(prefix), _block_checksums(tail))
+
+
+def _verify(path: str, f, data_start: int, block_count: int, prefix: bytes, tail) -> bool:
+    """
+    以校驗檔驗證已讀取的檔頭、壓縮區塊與定長記錄
+
+    Args:
+        path: 記錄檔路徑
+        f: 已開啟的記錄檔（以 inode 確認校驗檔屬於同一個檔案）
+        data_start: 定長記錄起始位移
+        block_count: 壓縮區塊筆數
+        prefix: 檔頭與壓縮區塊
+        tail: 本次讀取的定長記錄（位元組）
+
+    Returns:
+        bool: 是否驗證了全部記錄（沒有對應的校驗檔、或有校驗檔之後才附加的記錄時為 False）
+    """
+    sums = _read_checksums(path)
+    if sums is None:
+        return False
+    inode, sums_start, covered, base_crc, crcs = sums
+    if inode != os.fstat(f.fileno()).st_ino or sums_start != data_start:
+        return False
+    if data_start and zlib.crc32(prefix) != base_crc:
+        raise ChecksumError(path, 0)
+
+    tail = memoryview(tail).cast('B')
+    count = len(tail) // RECORD_SIZE
+    for i, expected in enumerate(crcs.tolist()):
+        end = min((i + 1) * CHECKSUM_RECORDS, covered)
+        if end > count:
+            # 校驗值包含本次讀取之後才附加的記錄
+            break
+        if zlib.crc32(tail[i * CHECKSUM_BLOCK_SIZE:end * RECORD_SIZE]) != expected:
+            raise ChecksumError(path, block_count + i * CHECKSUM_RECORDS)
+
+    if covered > count and data_start + covered * RECORD_SIZE > os.fstat(f.fileno()).st_size:
+        # 檔案比校驗檔涵蓋的範圍短：之後的記錄已遺失
+        raise ChecksumError(path, block_count + count // CHECKSUM_RECORDS * CHECKSUM_RECORDS)
+    return covered >= count
+
+
+def read_edges(path: str) -> Optional[Tuple[np.void, np.void, int]]:
+    """
+    只讀取第一筆與最後一筆記錄（狀態查詢不映射整個檔案，也不解壓縮）
+
+    Returns:
+        Tuple: (第一筆, 最後一筆, 筆數)，沒有記錄時返回 None
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        data_start, block_count, header = _read_layout(f)
+        count = (os.fstat(f.fileno()).st_size - data_start) // RECORD_SIZE
+        if block_count + count == 0:
+            return None
+        if block_count:
+            first = header[7]
+        else:
+            f.seek(data_start)
+            first = np.frombuffer(f.read(RECORD_SIZE), dtype=BAR_DTYPE)[0]
+        if count:
+            f.seek(data_start + (count - 1) * RECORD_SIZE)
+            last = np.frombuffer(f.read(RECORD_SIZE), dtype=BAR_DTYPE)[0]
+        else:
+            last = header[8]
+    return first, last, block_count + count
+
+
+def repair_tail(path: str) -> bool:
+    """
+    截斷附加中斷留下的不完整記錄（寫入端在股票鎖內呼叫）
+
+    Returns:
+        bool: 是否有截斷
+    """
+    with open(path, 'r+b') as f:
+        data_start, _, _ = _read_layout(f)
+        size = os.fstat(f.fileno()).st_size
+        partial = (size - data_start) % RECORD_SIZE
+        if partial == 0:
+            return False
+        f.truncate(size - partial)
+    return True
+
+
+def append_bars(path: str, records: np.ndarray):
+    """
+    在檔尾附加記錄（一次 write 並 fsync）
+
+    Args:
+        path: 記錄檔路徑
+        records: BAR_DTYPE 陣列
+    """
+    data = records.astype(BAR_DTYPE, copy=False).tobytes()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+        st = os.fstat(fd)
+    finally:
+        os.close(fd)
+
+    sums = _read_checksums(path)
+    if sums is None or sums[0] != st.st_ino or sums[1] + sums[2] * RECORD_SIZE != st.st_size - len(data):
+        # 校驗檔缺少或落後（上次附加在更新校驗檔前中斷）：依目前內容重建
+        write_checksums(path)
+        return
+
+    # 只計算新增的部分：先補完最後一個未滿的區塊，再接續新的區塊
+    _, data_start, covered, base_crc, crcs = sums
+    crcs = crcs.tolist()
+    view = memoryview(data)
+    partial = covered % CHECKSUM_RECORDS
+    if partial:
+        take = min(len(data), (CHECKSUM_RECORDS - partial) * RECORD_SIZE)
+        crcs[-1] = zlib.crc32(view[:take], crcs[-1])
+        view = view[take:]
+    crcs += _block_checksums(view)
+    _write_checksums(path, st.st_ino, data_start, covered + len(records), base_crc, crcs)
+
+
+def write_bars(path: str, records: np.ndarray, compression: str = 'none'):
+    """
+    寫入完整記錄檔（暫存檔 + fsync + 原子替換）
+
+    已映射舊檔的讀取端仍持有舊檔內容，不會讀到寫到一半的檔案
+
+    Args:
+        path: 記錄檔路徑
+        records: BAR_DTYPE 陣列
+        compression: 'none'（定長記錄）、'zlib' 或 'zstd'（整段編碼為壓縮區塊）
+    """
+    records = records.astype(BAR_DTYPE, copy=False)
+    if compression == 'none' or len(records) == 0:
+        prefix, tail = b'', records.tobytes()
+    else:
+        block, codec_id, scale = bar_codec.encode(records, compression)
+        header = struct.pack(HEADER_FORMAT, MAGIC, 1, codec_id, scale, 0, len(records), len(block))
+        prefix, tail = header + records[[0, -1]].tobytes() + block, b''
+    atomic_write(path, prefix + tail)
+    # 校驗檔在替換後更新：其間讀到新檔的讀取端因 inode 不符而不驗證
+    _write_checksums(path, os.stat(path).st_ino, len(prefix), len(tail) // RECORD_SIZE,
+                     zlib.crc32(prefix), _block_checksums(tail))
@@ -0,0 +1,136 @@
+"""
+快取目錄（catalog）
+以 SQLite 表保存每檔股票的名稱、日期範圍、筆數、檔案大小、最後更新時間與數據版本，
+狀態、是否最新與列表查詢只查這張表，不讀取記錄檔；
+每次寫入快取後在股票鎖內以一個交易更新對應的列（WAL 模式，多進程可同時讀取）
+
+每列同時記錄寫入當下記錄檔的 (inode, 大小, 修改時間)，與檔案不符時
+（例如寫入記錄檔後、更新目錄前進程中斷）由讀取端從檔案重建該列
+"""
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_catalog (
+    ticker TEXT PRIMARY KEY,
+    stock_name TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    last_update TEXT,
+    format_version TEXT,
+    data_version INTEGER NOT NULL DEFAULT 1,
+    file_inode INTEGER,
+    file_size INTEGER,
+    file_mtime_ns INTEGER
+)
+"""
+
+COLUMNS = ['ticker', 'stock_name', 'start_date', 'end_date', 'record_count', 'size_bytes',
+           'last_update', 'format_version', 'data_version', 'file_inode', 'file_size', 'file_mtime_ns']
+
+
+class CacheCatalog:
+    """快取目錄（SQLite）"""
+
+    def __init__(self, path: str):
+        """
+        初始化快取目錄
+
+        Args:
+            path: SQLite 檔路徑
+        """
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        每次操作開新連線（連線不跨執行緒或 fork 共用）
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def get(self, ticker: str) -> Optional[Dict]:
+        """
+        查詢單一股票
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: 目錄列，不存在時返回 None
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM cache_catalog WHERE ticker = ?', (ticker,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def all(self) -> List[Dict]:
+        """
+        查詢所有股票
+
+        Returns:
+            List[Dict]: 目錄列（依股票代號排序）
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT * FROM cache_catalog ORDER BY ticker').fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def put(self, entry: Dict, bump_version: bool = True) -> Dict:
+        """
+        新增或更新一列（單一交易），寫入端更新時 data_version 加一
+
+        Args:
+            entry: 目錄列（不含 data_version）
+            bump_version: 是否遞增 data_version；讀取端從檔案重建時為 False（數據沒有變動，
+                不讓共享數據段與面板以為有新版本）
+
+        Returns:
+            Dict: 更新後的目錄列
+        """
+        fields = [name for name in COLUMNS if name != 'data_version']
+        updates = ', '.join(f"{name} = excluded.{name}" for name in fields[1:])
+        if bump_version:
+            updates += ", data_version = cache_catalog.data_version + 1"
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT INTO cache_catalog ({', '.join(fields)}) "
+                    f"VALUES ({', '.join('?' for _ in fields)}) "
+                    f"ON CONFLICT(ticker) DO UPDATE SET {updates}",
+                    [entry.get(name) for name in fields]
+                )
+                row = conn.execute('SELECT * FROM cache_catalog WHERE ticker = ?',
+                                   (entry['ticker'],)).fetchone()
+        finally:
+            conn.close()
+        return dict(row)
+
+    def delete(self, ticker: str):
+        """
+        刪除一列
+
+        Args:
+            ticker: 股票代號
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM cache_catalog WHERE ticker = ?', (ticker,))
+        finally:
+            conn.close()
@@ -1,51 +1,114 @@
 """
 快取管理器
-負責 JSON 快取的讀寫、驗證與更新
-"""
-import json
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-import pandas as pd
-from config import Config
+負責股票數據快取的讀寫、驗證與更新
 
+每檔股票由兩個檔案組成：
+- {ticker}.bars：定長日線記錄（見 utils.bar_store），以 memmap 零複製讀取，
+  每日更新只在檔尾附加；日期範圍由第一筆與最後一筆記錄得出
+- {ticker}.meta.json：股票名稱、建立時間等不隨每日更新變動的 metadata
 
-class CacheManager:
-    """JSON 快取管理器"""
+寫入（附加、重寫、轉換、刪除）在跨進程的股票檔案鎖內進行；重寫一律經由
+暫存檔 + fsync + rename，讀取端不加鎖，只會看到替換前或替換後的完整檔案
 
-    def __init__(self, cache_dir: str = None):
-        """
-        初始化快取管理器
+CACHE_COMPRESSION 啟用時，完整寫入的記錄檔改為壓縮區塊 + 檔尾定長記錄（見 utils.bar_store），
+每日更新仍只在檔尾附加，累積 CACHE_COMPACT_RECORDS 筆後併入壓縮區塊
 
-        Args:
-            cache_dir: 快取目錄路徑
-        """
-        self.cache_dir = cache_dir or Config.CACHE_DIR
-        self._ensure_cache_dir()
+已解碼的 DataFrame 與 metadata 保留在進程內的 FrameCache，以記錄檔的
+(inode, 大小, 修改時間) 驗證；附加與重寫都會改變版本，不需要跨進程通知
 
-    def _ensure_cache_dir(self):
-        """確保快取目錄存在"""
-        os.makedirs(self.cache_dir, exist_ok=True)
+每個記錄檔另有校驗檔 {ticker}.bars.crc（見 utils.bar_store），載入時驗證；
+損壞時以原子替換截斷到最後一個有效區塊，之後的交易日由下一次更新重新取得
+（不整檔刪除重新下載），背景巡檢見 services.cache_scrubber
 
-    def _get_cache_path(self, ticker: str) -> str:
-        """獲取快取文件路徑"""
-        return os.path.join(self.cache_dir, f"{ticker}.json")
+名稱、日期範圍、筆數、大小等狀態另存於快取目錄（utils.cache_catalog），
+每次寫入後在股票鎖內更新；狀態、是否最新與列表查詢只查目錄，不讀取記錄檔
 
-    def exists(self, ticker: str) -> bool:
+舊版格式在第一次讀取時轉換為 .bars：
+- 1.0：{ticker}.json（每列一個 dict）
+- 2.0：{ticker}.npz（欄位陣列）
+兩者的 {ticker}.delta.jsonl 增量記錄一併併入
+"""
+import json
+import os
+import sqlite3
+import zipfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import Config
+from . import bar_codec, bar_store
+from .atomic_file import atomic_write
+from .cache_catalog import CacheCatalog
+from .frame_cache import FrameCache
+from .single_flight import FileLock
+
+# 快取檔副檔名
+CACHE_SUFFIX = '.bars'
+META_SUFFIX = '.meta.json'
+NPZ_SUFFIX = '.npz'
+LEGACY_SUFFIX = '.json'
+DELTA_SUFFIX = '.delta.jsonl'
+
+# 快取格式版本（1.0 為 JSON 列格式，2.0 為 .npz 欄位格式）
+FORMAT_VERSION = '3.0'
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+VOLUME_COLUMNS = ['volume', 'capacity']
+DATA_COLUMNS = ['date'] + PRICE_COLUMNS + VOLUME_COLUMNS
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    轉換為快取欄位型別（date 為 datetime64，價格 float64，成交量與金額 int64）
+
+    Args:
+        df: 含 DATA_COLUMNS 的 DataFrame，date 可為字串或日期
+
+    Returns:
+        pd.DataFrame: 只含 DATA_COLUMNS 的新 DataFrame
+    """
+    df = df.reindex(columns=DATA_COLUMNS)
+    columns = {'date': pd.to_datetime(df['date']).values.astype('datetime64[D]')}
+    for name in PRICE_COLUMNS:
+        columns[name] = df[name].to_numpy(dtype=np.float64)
+    for name in VOLUME_COLUMNS:
+        columns[name] = np.rint(df[name].to_numpy(dtype=np.float64)).astype(np.int64)
+    return pd.DataFrame({
+        'date': columns['date'].astype('datetime64[ns]'),
+        **{name: columns[name] for name in DATA_COLUMNS[1:]}
+    })
+
+
+class CacheManagerBase:
+    """
+    快取管理器共用介面
+
+    子類別實作儲存相關的方法：exists、load_frame、load_meta、get_cache_info、
+    get_all_cache_info、get_all_cached_stocks、merge_data、delete、_create_cache；
+    其餘查詢與建立快取的流程在此共用
+
+    lock_for 提供股票的跨進程更新鎖（SingleFlight 使用），默認為本機檔案鎖；
+    多台主機共用的後端以後端本身的鎖取代
+    """
+
+    def lock_for(self, ticker: str):
         """
-        檢查快取是否存在
+        獲取股票的上游更新鎖（與寫入鎖不同：持有更新鎖時可以再取得寫入鎖）
 
         Args:
             ticker: 股票代號
 
         Returns:
-            bool: 快取是否存在
+            FileLock: LOCK_DIR 下的檔案鎖
         """
-        return os.path.exists(self._get_cache_path(ticker))
+        return FileLock(os.path.join(Config.LOCK_DIR, f"{ticker}.lock"))
 
     def load(self, ticker: str) -> Optional[Dict]:
         """
-        載入快取數據
+        載入快取數據（列格式，與舊版 JSON 結構相同）
+
+        分析流程請改用 load_frame()，不需要逐列轉換
 
         Args:
             ticker: 股票代號
@@ -53,126 +116,37 @@ class CacheManager:
         Returns:
             Dict: 快取數據，如果不存在或損壞則返回 None
         """
-        cache_path = self._get_cache_path(ticker)
-
-        if not os.path.exists(cache_path):
-            return None
-
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"快取讀取失敗: {ticker} - {e}")
-            # JSON 損壞，刪除快取
-            self.delete(ticker)
+        meta = self.load_meta(ticker)
+        df = self.load_frame(ticker)
+        if meta is None or df is None:
             return None
 
-    def save(self, ticker: str, data: Dict) -> bool:
-        """
-        保存快取數據
-
-        Args:
-            ticker: 股票代號
-            data: 要保存的數據
-
-        Returns:
-            bool: 是否保存成功
-        """
-        cache_path = self._get_cache_path(ticker)
-
-        try:
-            # 確保快取目錄存在
-            self._ensure_cache_dir()
-
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-            # 驗證文件是否成功創建
-            if os.path.exists(cache_path):
-                file_size = os.path.getsize(cache_path)
-                print(f"快取文件已創建: {cache_path} ({file_size} bytes)")
-                return True
-            else:
-                print(f"快取文件創建失敗: 文件不存在")
-                return False
-
-        except Exception as e:
-            print(f"快取保存失敗: {ticker} - {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        data = df.assign(date=df['date'].dt.strftime('%Y-%m-%d')).to_dict('records')
+        return {'metadata': meta['metadata'], 'date_range': meta['date_range'], 'data': data}
 
-    def delete(self, ticker: str) -> bool:
+    @staticmethod
+    def slice_range(df: pd.DataFrame, start_date: str = None, end_date: str = None,
+                    limit: int = None) -> pd.DataFrame:
         """
-        刪除快取
+        依日期範圍與筆數取出依日期排序的 DataFrame 的一段（不複製欄位數據）
 
         Args:
-            ticker: 股票代號
-
-        Returns:
-            bool: 是否刪除成功
-        """
-        cache_path = self._get_cache_path(ticker)
-
-        if os.path.exists(cache_path):
-            try:
-                os.remove(cache_path)
-                return True
-            except OSError as e:
-                print(f"快取刪除失敗: {ticker} - {e}")
-                return False
-        return False
-
-    def get_cache_info(self, ticker: str) -> Optional[Dict]:
-        """
-        獲取快取資訊
-
-        Args:
-            ticker: 股票代號
-
-        Returns:
-            Dict: 快取資訊
-        """
-        if not self.exists(ticker):
-            return None
-
-        cache_path = self._get_cache_path(ticker)
-        cache_data = self.load(ticker)
-
-        if not cache_data:
-            return None
-
-        file_size = os.path.getsize(cache_path)
-
-        return {
-            'ticker': ticker,
-            'stock_name': cache_data.get('metadata', {}).get('stock_name', ticker),
-            'exists': True,
-            'file_path': cache_path,
-            'file_size_kb': round(file_size / 1024, 2),
-            'date_range': cache_data.get('date_range', {}),
-            'last_update': cache_data.get('metadata', {}).get('last_update'),
-            'record_count': len(cache_data.get('data', []))
-        }
-
-    def get_all_cached_stocks(self) -> List[str]:
-        """
-        獲取所有已快取的股票代號
+            df: 含 date 欄位（datetime64，已排序）的 DataFrame
+            start_date: 開始日期 (YYYY-MM-DD)，可選
+            end_date: 結束日期 (YYYY-MM-DD)，可選
+            limit: 只取範圍內最後 N 筆，可選
 
         Returns:
-            List[str]: 股票代號列表
+            pd.DataFrame: 範圍內的 DataFrame（index 從 0 開始）
         """
-        if not os.path.exists(self.cache_dir):
-            return []
-
-        stocks = []
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.json'):
-                ticker = filename[:-5]  # 移除 .json
-                stocks.append(ticker)
-
-        return stocks
+        dates = df['date'].values
+        lo = np.searchsorted(dates, np.datetime64(start_date), 'left') if start_date else 0
+        hi = np.searchsorted(dates, np.datetime64(end_date), 'right') if end_date else len(df)
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        if lo == 0 and hi == len(df):
+            return df.copy(deep=False)
+        return df.iloc[lo:hi].reset_index(drop=True)
 
     def is_up_to_date(self, ticker: str) -> bool:
         """
@@ -187,7 +161,7 @@ class CacheManager:
         """
         from utils import DateUtils
 
-        cache_data = self.load(ticker)
+        cache_data = self.load_meta(ticker)
         if not cache_data:
             return False
 
@@ -214,7 +188,7 @@ class CacheManager:
         """
         from utils import DateUtils
 
-        cache_data = self.load(ticker)
+        cache_data = self.load_meta(ticker)
         if not cache_data:
             return []
 
@@ -238,35 +212,26 @@ class CacheManager:
 
         return missing_dates
 
-    def merge_data(self, ticker: str, new_df: pd.DataFrame) -> bool:
+    def merge_many(self, frames: Dict[str, pd.DataFrame], lock_for=None) -> Dict[str, bool]:
         """
-        合併新數據到現有快取
+        批次合併多檔股票的新數據
 
         Args:
-            ticker: 股票代號
-            new_df: 新的 DataFrame
+            frames: {股票代號: 新的 DataFrame}
+            lock_for: 依股票代號取得寫入鎖的函數（可選）
+            on_evict: 淘汰後在同一個鎖內呼叫的函數（以股票代號為參數，清除衍生數據），可選
 
         Returns:
-            bool: 是否合併成功
+            Dict[str, bool]: 各股票是否合併成功
         """
-        cache_data = self.load(ticker)
-        if not cache_data:
-            return False
-
-        # 載入現有數據
-        existing_df = pd.DataFrame(cache_data['data'])
-
-        # 合併數據（避免重複）
-        merged_df = pd.concat([existing_df, new_df]).drop_duplicates(subset=['date'])
-        merged_df = merged_df.sort_values('date')
-
-        # 更新快取數據
-        cache_data['data'] = merged_df.to_dict('records')
-        cache_data['date_range']['end_date'] = merged_df['date'].iloc[-1]
-        cache_data['date_range']['total_trading_days'] = len(merged_df)
-        cache_data['metadata']['last_update'] = datetime.now().isoformat()
-
-        return self.save(ticker, cache_data)
+        results = {}
+        for ticker, new_df in frames.items():
+            if lock_for is None:
+                results[ticker] = self.merge_data(ticker, new_df)
+                continue
+            with lock_for(ticker):
+                results[ticker] = self.merge_data(ticker, new_df)
+        return results
 
     def create_cache(self, ticker: str, stock_name: str, df: pd.DataFrame) -> bool:
         """
@@ -290,27 +255,19 @@ class CacheManager:
                 print(f"可用欄位: {df.columns.tolist()}")
                 return False
 
-            cache_data = {
-                'metadata': {
-                    'ticker': ticker,
-                    'stock_name': stock_name,
-                    'data_source': 'twstock',
-                    'created_at': datetime.now().isoformat(),
-                    'last_update': datetime.now().isoformat(),
-                    'version': '1.0'
-                },
-                'date_range': {
-                    'start_date': df['date'].iloc[0],
-                    'end_date': df['date'].iloc[-1],
-                    'total_trading_days': len(df)
-                },
-                'data': df.to_dict('records')
+            df = normalize_frame(df).drop_duplicates(subset=['date']).sort_values('date')
+            metadata = {
+                'ticker': ticker,
+                'stock_name': stock_name,
+                'data_source': 'twstock',
+                'created_at': datetime.now().isoformat(),
+                'version': FORMAT_VERSION
             }
 
-            result = self.save(ticker, cache_data)
+            result = self._create_cache(ticker, metadata, df)
 
             if result:
-                print(f"快取已保存: {self._get_cache_path(ticker)}")
+                print(f"快取已保存: {ticker}")
             else:
                 print(f"快取保存失敗")
 
@@ -322,29 +279,744 @@ class CacheManager:
             traceback.print_exc()
             return False
 
-    def cleanup_old_caches(self, max_count: int = None):
+    def cleanup_old_caches(self, last_access: Dict[str, float] = None, pinned=None,
+                           max_bytes: int = None, max_count: int = None, lock_for=None,
+                           on_evict=None) -> List[str]:
         """
-        清理舊快取（保留最近使用的）
+        淘汰最久未查詢的快取，使總大小與股票數不超過上限
+
+        依最後查詢時間由舊到新淘汰（從未查詢的股票最先淘汰，其間依最後更新時間），
+        pinned 中的股票不淘汰，但計入總量
 
         Args:
-            max_count: 最大保留數量
+            last_access: {股票代號: 最後查詢時間戳}（AccessTracker.get_last_access()）
+            pinned: 不淘汰的股票代號，默認為 CACHE_WATCHLIST
+            max_bytes: 總大小上限（位元組），默認為 MAX_CACHE_SIZE_MB，0 為不限制
+            max_count: 股票數上限，默認為 MAX_CACHED_STOCKS，0 為不限制
+            lock_for: 依股票代號取得寫入鎖的函數（可選）
+
+        Returns:
+            List[str]: 已淘汰的股票代號
         """
+        if max_bytes is None:
+            max_bytes = Config.MAX_CACHE_SIZE_MB * 1024 * 1024
         if max_count is None:
             max_count = Config.MAX_CACHED_STOCKS
+        last_access = last_access or {}
+        pinned = set(Config.CACHE_WATCHLIST if pinned is None else pinned)
+
+        infos = self.get_all_cache_info()
+        total_bytes = sum(info['size_bytes'] for info in infos)
+        count = len(infos)
+
+        def over_budget() -> bool:
+            return (max_bytes > 0 and total_bytes > max_bytes) or (max_count > 0 and count > max_count)
+
+        if not over_budget():
+            return []
+
+        def eviction_order(info: Dict) -> Tuple[float, str, str]:
+            # 收盤後更新會改寫所有快取，最後更新時間只用於區分從未查詢的股票
+            return last_access.get(info['ticker'], 0.0), info['last_update'] or '', info['ticker']
+
+        evicted = []
+        for info in sorted((i for i in infos if i['ticker'] not in pinned), key=eviction_order):
+            if not over_budget():
+                break
+            if lock_for is None:
+                deleted = self._evict_one(info['ticker'], on_evict)
+            else:
+                with lock_for(info['ticker']):
+                    deleted = self._evict_one(info['ticker'], on_evict)
+            if deleted:
+                evicted.append(info['ticker'])
+                total_bytes -= info['size_bytes']
+                count -= 1
+
+        if evicted:
+            print(f"已淘汰快取 {len(evicted)} 檔（{total_bytes / 1024 / 1024:.1f} MB / {count} 檔）: "
+                  f"{', '.join(evicted)}")
+        if over_budget():
+            print(f"警告: 快取仍超過上限，其餘股票不可淘汰（{total_bytes / 1024 / 1024:.1f} MB / {count} 檔）")
+        return evicted
+
+    def _evict_one(self, ticker: str, on_evict=None) -> bool:
+        deleted = self.delete(ticker)
+        if deleted and on_evict is not None:
+            on_evict(ticker)
+        return deleted
+
+    def save(self, ticker: str, data: Dict) -> bool:
+        """
+        保存快取數據（取代既有快取）
+
+        Args:
+            ticker: 股票代號
+            data: 要保存的數據（列格式，與 load() 返回的結構相同）
+
+        Returns:
+            bool: 是否保存成功
+        """
+        df = normalize_frame(pd.DataFrame(data.get('data', []), columns=DATA_COLUMNS))
+        df = df.drop_duplicates(subset=['date']).sort_values('date')
+        return self._create_cache(ticker, data.get('metadata', {}), df)
+
+    def verify(self, ticker: str) -> Optional[Dict]:
+        """
+        驗證快取完整性並修復（背景巡檢用）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: {'ticker', 'status', 'bytes'}，後端沒有校驗機制時返回 None
+        """
+        return None
+
+
+class CacheManager(CacheManagerBase):
+    """定長記錄快取管理器"""
+
+    def __init__(self, cache_dir: str = None, lock_dir: str = None, frame_cache: FrameCache = None,
+                 catalog: CacheCatalog = None, compression: str = None):
+        """
+        初始化快取管理器
 
-        stocks = self.get_all_cached_stocks()
+        Args:
+            cache_dir: 快取目錄路徑
+            lock_dir: 寫入鎖目錄，默認為快取目錄下的 .locks
+            frame_cache: 已解碼快取，默認依 FRAME_CACHE_SIZE_MB 建立
+            catalog: 快取目錄，默認為快取目錄下的 .catalog.sqlite3
+            compression: 記錄檔壓縮方式（'none'、'zlib'、'zstd'），默認為 CACHE_COMPRESSION
+        """
+        self.compression = compression or Config.CACHE_COMPRESSION
+        if self.compression not in ('none',) + tuple(bar_codec.CODECS):
+            raise ValueError(f"未知的快取壓縮方式: {self.compression}")
+        self.cache_dir = cache_dir or Config.CACHE_DIR
+        self.lock_dir = lock_dir or os.path.join(self.cache_dir, '.locks')
+        self.frame_cache = frame_cache or FrameCache()
+        self.catalog = catalog or CacheCatalog(os.path.join(self.cache_dir, '.catalog.sqlite3'))
+        self._ensure_cache_dir()
 
-        if len(stocks) <= max_count:
-            return
+    def _ensure_cache_dir(self):
+        """確保快取目錄存在"""
+        os.makedirs(self.cache_dir, exist_ok=True)
 
-        # 按修改時間排序
-        cache_files = [
-            (ticker, os.path.getmtime(self._get_cache_path(ticker)))
-            for ticker in stocks
-        ]
-        cache_files.sort(key=lambda x: x[1])
+    def _get_cache_path(self, ticker: str) -> str:
+        """獲取快取文件路徑"""
+        return os.path.join(self.cache_dir, f"{ticker}{CACHE_SUFFIX}")
+
+    def _get_meta_path(self, ticker: str) -> str:
+        """獲取 metadata 文件路徑"""
+        return os.path.join(self.cache_dir, f"{ticker}{META_SUFFIX}")
+
+    def _get_legacy_paths(self, ticker: str) -> List[str]:
+        """獲取舊版快取文件路徑（新到舊）"""
+        return [os.path.join(self.cache_dir, f"{ticker}{suffix}") for suffix in (NPZ_SUFFIX, LEGACY_SUFFIX)]
+
+    def _get_delta_path(self, ticker: str) -> str:
+        """獲取舊版增量記錄文件路徑"""
+        return os.path.join(self.cache_dir, f"{ticker}{DELTA_SUFFIX}")
+
+    def _lock_for(self, ticker: str) -> FileLock:
+        """
+        獲取股票快取的寫入鎖（跨進程）
+
+        與 SingleFlight 的上游更新鎖是不同的鎖檔：持有更新鎖時可以再取得寫入鎖，
+        反之不行
+        """
+        return FileLock(os.path.join(self.lock_dir, f"{ticker}.lock"))
+
+    def _get_version(self, ticker: str) -> Optional[Tuple[int, int, int]]:
+        """記錄檔版本 (inode, 大小, 修改時間)，檔案不存在時返回 None"""
+        try:
+            st = os.stat(self._get_cache_path(ticker))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def exists(self, ticker: str) -> bool:
+        """
+        檢查快取是否存在
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 快取是否存在
+        """
+        return any(os.path.exists(path)
+                   for path in [self._get_cache_path(ticker)] + self._get_legacy_paths(ticker))
+
+    def load_bars(self, ticker: str) -> Optional[np.ndarray]:
+        """
+        以唯讀 memmap 載入日線記錄（零複製，所有進程共用頁面快取；
+        有壓縮區塊時為解壓縮後的唯讀陣列）
 
-        # 刪除最舊的快取
-        for ticker, _ in cache_files[:-max_count]:
-            self.delete(ticker)
-            print(f"已清理舊快取: {ticker}")
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            np.ndarray: bar_store.BAR_DTYPE 記錄，不存在或損壞時返回 None
+        """
+        if not self._ensure_current(ticker):
+            return None
+        return self._open_verified(ticker)
+
+    def load_frame(self, ticker: str, start_date: str = None, end_date: str = None,
+                   limit: int = None) -> Optional[pd.DataFrame]:
+        """
+        載入快取數據為 DataFrame（欄位直接取自 memmap 記錄，沒有逐列處理）
+
+        記錄檔未變動時直接取自進程內快取，不讀取檔案；
+        返回的 DataFrame 與快取共用數據，呼叫端不可原地修改欄位值
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期 (YYYY-MM-DD)，可選
+            end_date: 結束日期 (YYYY-MM-DD)，可選
+            limit: 只取範圍內最後 N 個交易日，可選
+
+        Returns:
+            pd.DataFrame: 含 DATA_COLUMNS 的 DataFrame（date 為 datetime64），不存在或損壞時返回 None
+        """
+        if not self._ensure_current(ticker):
+            return None
+
+        version = self._get_version(ticker)
+        df = self.frame_cache.get((ticker, 'frame'), version)
+        if df is None:
+            bars = self._open_verified(ticker)
+            if bars is None:
+                return None
+            # 先取版本再讀檔：其間若有寫入，下次查詢版本不符會重新載入
+            df = bar_store.to_frame(bars)
+            self.frame_cache.put((ticker, 'frame'), version, df, int(df.memory_usage(index=True).sum()))
+        return self.slice_range(df, start_date, end_date, limit)
+
+    def _open_verified(self, ticker: str) -> Optional[np.ndarray]:
+        """
+        開啟記錄檔並驗證校驗值
+
+        損壞時截斷到最後一個有效區塊並返回 None：呼叫端視為沒有快取，
+        更新流程依截斷後的最後日期只重新取得缺少的交易日
+        """
+        try:
+            return bar_store.open_bars(self._get_cache_path(ticker), verify=True)
+        except bar_store.ChecksumError as e:
+            print(e)
+            with self._lock_for(ticker):
+                self._repair_locked(ticker)
+            return None
+
+    def _repair_locked(self, ticker: str) -> str:
+        """
+        截斷損壞的記錄檔（持有寫入鎖時呼叫）
+
+        以原子替換寫入有效的記錄（其他進程已映射的舊檔仍可讀取，不直接截斷檔案）；
+        壓縮區塊損壞時沒有可保留的記錄，刪除快取
+
+        Returns:
+            str: 'ok'（等待鎖期間已由其他進程修復）、'repaired'、'deleted' 或 'missing'
+        """
+        cache_path = self._get_cache_path(ticker)
+        try:
+            if bar_store.verify_bars(cache_path) is None:
+                return 'missing'
+            return 'ok'
+        except bar_store.ChecksumError as e:
+            valid = e.valid_records
+
+        self.frame_cache.invalidate((ticker, 'frame'))
+        self.frame_cache.invalidate((ticker, 'meta'))
+        if valid == 0:
+            print(f"記錄檔無有效區塊，刪除快取: {ticker}")
+            self._delete_files(ticker)
+            return 'deleted'
+
+        bars = bar_store.open_bars(cache_path)
+        bar_store.write_bars(cache_path, np.array(bars[:valid]), self.compression)
+        self._refresh_catalog(ticker)
+        print(f"記錄檔已截斷到最後一個有效區塊: {ticker}（保留 {valid} 筆，之後的交易日由下一次更新重新取得）")
+        return 'repaired'
+
+    def verify(self, ticker: str) -> Optional[Dict]:
+        """
+        驗證整個記錄檔的校驗值（不解壓縮）
+
+        損壞時截斷到最後一個有效區塊；沒有對應的校驗檔（舊版快取或寫入中斷）時依目前內容補建
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: {'ticker', 'status': 'ok'/'sealed'/'repaired'/'deleted'/'missing', 'bytes': 讀取的位元組數}
+        """
+        cache_path = self._get_cache_path(ticker)
+        try:
+            size = os.path.getsize(cache_path)
+        except OSError:
+            return {'ticker': ticker, 'status': 'missing', 'bytes': 0}
+
+        try:
+            verified = bar_store.verify_bars(cache_path)
+        except bar_store.ChecksumError as e:
+            print(e)
+            verified = False
+        if verified:
+            return {'ticker': ticker, 'status': 'ok', 'bytes': size}
+
+        with self._lock_for(ticker):
+            status = self._repair_locked(ticker)
+            if status == 'ok' and not bar_store.verify_bars(cache_path):
+                bar_store.write_checksums(cache_path)
+                status = 'sealed'
+        return {'ticker': ticker, 'status': status, 'bytes': size}
+
+    def load_date(self, date_str: str) -> pd.DataFrame:
+        """
+        載入所有股票在某一交易日的數據（逐檔以二分搜尋定位該日記錄）
+
+        Args:
+            date_str: 日期 (YYYY-MM-DD)
+
+        Returns:
+            pd.DataFrame: 含 ticker 與 DATA_COLUMNS 的 DataFrame（依股票代號排序）
+        """
+        ordinal = bar_store.date_ordinal(date_str)
+        tickers, records = [], []
+        for ticker in sorted(self.get_all_cached_stocks()):
+            bars = self.load_bars(ticker)
+            if bars is None or len(bars) == 0:
+                continue
+            pos = int(np.searchsorted(bars['date'], ordinal))
+            if pos < len(bars) and bars['date'][pos] == ordinal:
+                tickers.append(ticker)
+                records.append(bars[pos])
+
+        return bar_store.to_frame(np.array(records, dtype=bar_store.BAR_DTYPE)).assign(ticker=tickers)
+
+    def load_meta(self, ticker: str) -> Optional[Dict]:
+        """
+        只載入 metadata 與 date_range（只讀第一筆與最後一筆記錄）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: {'metadata', 'date_range'}，不存在或損壞時返回 None
+        """
+        if not self._ensure_current(ticker):
+            return None
+
+        version = self._get_version(ticker)
+        if version is None:
+            # 讀取期間快取已被刪除
+            return None
+        meta = self.frame_cache.get((ticker, 'meta'), version)
+        if meta is None:
+            entry = self._get_catalog_entry(ticker, version)
+            meta = {
+                'metadata': {
+                    'ticker': ticker,
+                    'stock_name': entry['stock_name'],
+                    'last_update': entry['last_update'],
+                    'version': entry['format_version'],
+                    'data_version': entry['data_version']
+                },
+                'date_range': {
+                    'start_date': entry['start_date'],
+                    'end_date': entry['end_date'],
+                    'total_trading_days': entry['record_count']
+                }
+            }
+            self.frame_cache.put((ticker, 'meta'), version, meta, len(json.dumps(meta)))
+        return {'metadata': dict(meta['metadata']), 'date_range': dict(meta['date_range'])}
+
+    def _get_catalog_entry(self, ticker: str, version: Tuple[int, int, int]) -> Dict:
+        """查詢目錄列，與記錄檔版本不符時（寫入中斷或舊快取）從檔案重建"""
+        entry = self.catalog.get(ticker)
+        if entry and (entry['file_inode'], entry['file_size'], entry['file_mtime_ns']) == version:
+            return entry
+        return self._update_catalog(ticker, version, bump_version=False)
+
+    def _refresh_catalog(self, ticker: str):
+        """寫入後更新目錄列；失敗時只記錄，下次查詢發現版本不符會重建"""
+        try:
+            self._update_catalog(ticker)
+        except sqlite3.Error as e:
+            print(f"快取目錄更新失敗: {ticker} - {e}")
+
+    def _update_catalog(self, ticker: str, version: Tuple[int, int, int] = None,
+                        bump_version: bool = True) -> Dict:
+        """
+        從檔案重建目錄列（寫入端在股票鎖內呼叫；讀取端重建時 bump_version 為 False，保留原本的 data_version）
+
+        Returns:
+            Dict: 更新後的目錄列
+        """
+        version = version or self._get_version(ticker)
+        meta = self._read_meta(ticker, version)
+        meta_path = self._get_meta_path(ticker)
+        return self.catalog.put({
+            'ticker': ticker,
+            'stock_name': meta['metadata'].get('stock_name', ticker),
+            'start_date': meta['date_range']['start_date'],
+            'end_date': meta['date_range']['end_date'],
+            'record_count': meta['date_range']['total_trading_days'],
+            'size_bytes': version[1] + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0),
+            'last_update': meta['metadata']['last_update'],
+            'format_version': meta['metadata'].get('version', FORMAT_VERSION),
+            'file_inode': version[0],
+            'file_size': version[1],
+            'file_mtime_ns': version[2]
+        }, bump_version=bump_version)
+
+    def _read_meta(self, ticker: str, version: Tuple[int, int, int]) -> Dict:
+        """讀取 metadata 與第一筆、最後一筆記錄"""
+        cache_path = self._get_cache_path(ticker)
+        metadata = self._read_metadata(ticker)
+        # 附加記錄不改寫 metadata，最後更新時間以記錄檔的修改時間為準
+        metadata['last_update'] = datetime.fromtimestamp(version[2] / 1e9).isoformat()
+
+        edges = bar_store.read_edges(cache_path)
+        if edges is None:
+            date_range = {'start_date': None, 'end_date': None, 'total_trading_days': 0}
+        else:
+            first, last, count = edges
+            date_range = {
+                'start_date': bar_store.date_string(first['date']),
+                'end_date': bar_store.date_string(last['date']),
+                'total_trading_days': count
+            }
+        return {'metadata': metadata, 'date_range': date_range}
+
+    def _read_metadata(self, ticker: str) -> Dict:
+        """讀取 metadata，檔案缺少或損壞時以股票代號補上預設值"""
+        try:
+            with open(self._get_meta_path(ticker), 'r', encoding='utf-8') as f:
+                return json.load(f)['metadata']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, IOError) as e:
+            print(f"快取 metadata 讀取失敗: {ticker} - {e}")
+        return {'ticker': ticker, 'stock_name': ticker, 'data_source': 'twstock',
+                'version': FORMAT_VERSION}
+
+    def _ensure_current(self, ticker: str) -> bool:
+        """確認記錄檔存在，只有舊版格式時在寫入鎖內轉換（同時讀取的進程只轉換一次）"""
+        if os.path.exists(self._get_cache_path(ticker)):
+            return True
+        if not any(os.path.exists(path) for path in self._get_legacy_paths(ticker)):
+            return False
+
+        with self._lock_for(ticker):
+            if os.path.exists(self._get_cache_path(ticker)):
+                return True
+            for legacy_path in self._get_legacy_paths(ticker):
+                if os.path.exists(legacy_path):
+                    return self._migrate_legacy(ticker, legacy_path)
+        return False
+
+    def _migrate_legacy(self, ticker: str, legacy_path: str) -> bool:
+        """將舊版快取（含增量記錄）轉換為定長記錄（持有寫入鎖時呼叫）"""
+        try:
+            if legacy_path.endswith(NPZ_SUFFIX):
+                with np.load(legacy_path, allow_pickle=False) as npz:
+                    meta = json.loads(str(npz['meta']))
+                    df = pd.DataFrame({name: npz[name] for name in DATA_COLUMNS})
+            else:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                meta = {'metadata': data.get('metadata', {}), 'date_range': data.get('date_range', {})}
+                df = pd.DataFrame(data.get('data', []), columns=DATA_COLUMNS)
+        except (ValueError, KeyError, OSError, zipfile.BadZipFile) as e:
+            print(f"快取讀取失敗: {ticker} - {e}")
+            # 快取損壞，刪除快取
+            self._delete_files(ticker)
+            return False
+
+        # 併入基底之後附加的交易日
+        end_date = meta['date_range'].get('end_date') or ''
+        appended = [bar for bar in self._read_legacy_delta(ticker) if bar['date'] > end_date]
+        if appended:
+            df = pd.concat([df, pd.DataFrame(appended, columns=DATA_COLUMNS)], ignore_index=True)
+
+        df = normalize_frame(df).drop_duplicates(subset=['date']).sort_values('date')
+        if not self._write_cache(ticker, meta.get('metadata', {}), df):
+            return False
+
+        for path in (legacy_path, self._get_delta_path(ticker)):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"快取已轉換為定長記錄格式: {ticker}")
+        return True
+
+    def _read_legacy_delta(self, ticker: str) -> List[Dict]:
+        """讀取舊版增量記錄中的完整交易日（讀到不完整的行即停止）"""
+        delta_path = self._get_delta_path(ticker)
+        if not os.path.exists(delta_path):
+            return []
+
+        bars = []
+        with open(delta_path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        break
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if 'bar' in record:
+                    bars.append(record['bar'])
+        return bars
+
+    def _write_cache(self, ticker: str, metadata: Dict, df: pd.DataFrame) -> bool:
+        """
+        以原子替換寫入完整記錄檔與 metadata（持有寫入鎖時呼叫）
+
+        Args:
+            ticker: 股票代號
+            metadata: 股票 metadata
+            df: 已經 normalize_frame 的 DataFrame
+
+        Returns:
+            bool: 是否寫入成功
+        """
+        cache_path = self._get_cache_path(ticker)
+        metadata = dict(metadata, version=FORMAT_VERSION)
+        metadata.pop('last_update', None)
+
+        try:
+            # 確保快取目錄存在
+            self._ensure_cache_dir()
+
+            # 先寫入暫存檔再替換，中斷時不會留下寫到一半的快取
+            bar_store.write_bars(cache_path, bar_store.to_records(df), self.compression)
+            atomic_write(self._get_meta_path(ticker),
+                         json.dumps({'metadata': metadata}, ensure_ascii=False, indent=2).encode('utf-8'))
+
+            self._refresh_catalog(ticker)
+            print(f"快取文件已創建: {cache_path} ({os.path.getsize(cache_path)} bytes)")
+            return True
+
+        except Exception as e:
+            print(f"快取保存失敗: {ticker} - {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def _create_cache(self, ticker: str, metadata: Dict, df: pd.DataFrame) -> bool:
+        """在寫入鎖內寫入完整快取（取代既有快取）"""
+        with self._lock_for(ticker):
+            return self._write_cache(ticker, metadata, df)
+
+    def delete(self, ticker: str) -> bool:
+        """
+        刪除快取
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 是否刪除成功
+        """
+        with self._lock_for(ticker):
+            self.frame_cache.invalidate((ticker, 'frame'))
+            self.frame_cache.invalidate((ticker, 'meta'))
+            return self._delete_files(ticker)
+
+    def _delete_files(self, ticker: str) -> bool:
+        """刪除股票的所有快取檔與目錄列（持有寫入鎖時呼叫）"""
+        self.catalog.delete(ticker)
+        for path in (self._get_meta_path(ticker), self._get_delta_path(ticker),
+                     bar_store.checksum_path(self._get_cache_path(ticker))):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"快取 metadata 刪除失敗: {ticker} - {e}")
+
+        deleted = False
+        for cache_path in [self._get_cache_path(ticker)] + self._get_legacy_paths(ticker):
+            if os.path.exists(cache_path):
+                try:
+                    os.remove(cache_path)
+                    deleted = True
+                except OSError as e:
+                    print(f"快取刪除失敗: {ticker} - {e}")
+                    return False
+        return deleted
+
+    def get_cache_info(self, ticker: str) -> Optional[Dict]:
+        """
+        獲取快取資訊
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: 快取資訊
+        """
+        if not self._ensure_current(ticker):
+            return None
+
+        version = self._get_version(ticker)
+        if version is None:
+            return None
+
+        return self._to_cache_info(self._get_catalog_entry(ticker, version))
+
+    def get_all_cache_info(self) -> List[Dict]:
+        """
+        獲取所有已快取股票的資訊（一次查詢目錄，每檔只 stat 記錄檔驗證）
+
+        Returns:
+            List[Dict]: 快取資訊列表
+        """
+        entries = {entry['ticker']: entry for entry in self.catalog.all()}
+        infos = []
+        for ticker in self.get_all_cached_stocks():
+            if not self._ensure_current(ticker):
+                continue
+            version = self._get_version(ticker)
+            if version is None:
+                continue
+            entry = entries.get(ticker)
+            if not entry or (entry['file_inode'], entry['file_size'], entry['file_mtime_ns']) != version:
+                entry = self._update_catalog(ticker, version, bump_version=False)
+            infos.append(self._to_cache_info(entry))
+        return infos
+
+    def _to_cache_info(self, entry: Dict) -> Dict:
+        """目錄列轉為快取資訊"""
+        return {
+            'ticker': entry['ticker'],
+            'stock_name': entry['stock_name'],
+            'exists': True,
+            'file_path': self._get_cache_path(entry['ticker']),
+            'file_size_kb': round(entry['size_bytes'] / 1024, 2),
+            'size_bytes': entry['size_bytes'],
+            'date_range': {
+                'start_date': entry['start_date'],
+                'end_date': entry['end_date'],
+                'total_trading_days': entry['record_count']
+            },
+            'last_update': entry['last_update'],
+            'record_count': entry['record_count'],
+            'data_version': entry['data_version']
+        }
+
+    def get_all_cached_stocks(self) -> List[str]:
+        """
+        獲取所有已快取的股票代號
+
+        Returns:
+            List[str]: 股票代號列表
+        """
+        if not os.path.exists(self.cache_dir):
+            return []
+
+        stocks = {}
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(META_SUFFIX):
+                continue
+            for suffix in (CACHE_SUFFIX, NPZ_SUFFIX, LEGACY_SUFFIX):
+                if filename.endswith(suffix):
+                    stocks[filename[:-len(suffix)]] = True
+
+        return list(stocks)
+
+    def merge_data(self, ticker: str, new_df: pd.DataFrame) -> bool:
+        """
+        合併新數據到現有快取
+
+        新數據都在快取最後日期之後時只在記錄檔尾附加（一次寫入，成本與新增筆數成正比），
+        需要補入較早日期時讀取完整快取合併後重寫；
+        在寫入鎖內進行，順便截斷中斷的附加
+
+        Args:
+            ticker: 股票代號
+            new_df: 新的 DataFrame
+
+        Returns:
+            bool: 是否合併成功
+        """
+        if not self._ensure_current(ticker):
+            return False
+
+        new_df = normalize_frame(new_df).drop_duplicates(subset=['date']).sort_values('date')
+        if new_df.empty:
+            return True
+
+        with self._lock_for(ticker):
+            return self._merge_locked(ticker, new_df)
+
+    def _merge_locked(self, ticker: str, new_df: pd.DataFrame) -> bool:
+        """附加或重寫（持有寫入鎖時呼叫）"""
+        cache_path = self._get_cache_path(ticker)
+        if not os.path.exists(cache_path):
+            # 等待鎖期間快取已被刪除
+            return False
+        if bar_store.repair_tail(cache_path):
+            print(f"記錄檔尾不完整，已截斷到最後一筆完整記錄: {ticker}")
+
+        edges = bar_store.read_edges(cache_path)
+        first_new = new_df['date'].values[0].astype('datetime64[D]').astype(np.int64)
+        if edges is None or first_new <= edges[1]['date']:
+            return self._rewrite_merged(ticker, new_df)
+
+        try:
+            bar_store.append_bars(cache_path, bar_store.to_records(new_df))
+            if self.compression != 'none' and bar_store.tail_count(cache_path) >= Config.CACHE_COMPACT_RECORDS:
+                # 檔尾累積的定長記錄（含未壓縮的舊檔）併入壓縮區塊；重寫前先驗證，不讓損壞的記錄取得新的校驗值
+                bar_store.write_bars(cache_path, bar_store.open_bars(cache_path, verify=True), self.compression)
+            self._refresh_catalog(ticker)
+            return True
+        except bar_store.ChecksumError as e:
+            print(e)
+            self._repair_locked(ticker)
+            return False
+        except OSError as e:
+            print(f"記錄附加失敗: {ticker} - {e}")
+            return False
+
+    def _rewrite_merged(self, ticker: str, new_df: pd.DataFrame) -> bool:
+        """讀取完整快取合併新數據後重寫（持有寫入鎖時呼叫）"""
+        try:
+            bars = bar_store.open_bars(self._get_cache_path(ticker), verify=True)
+        except bar_store.ChecksumError as e:
+            # 損壞的記錄不併入重寫（重寫會取得新的校驗值）；截斷後由下一次更新補回
+            print(e)
+            self._repair_locked(ticker)
+            return False
+        existing_df = bar_store.to_frame(bars)
+
+        # 合併數據（避免重複，保留既有數據）
+        merged_df = pd.concat([existing_df, new_df], ignore_index=True)
+        merged_df = merged_df.drop_duplicates(subset=['date']).sort_values('date')
+
+        return self._write_cache(ticker, self._read_metadata(ticker), merged_df)
+
+
+def create_cache_manager(cache_dir: str = None, backend: str = None) -> CacheManagerBase:
+    """
+    依 CACHE_BACKEND 建立快取管理器
+
+    Args:
+        cache_dir: 檔案後端的快取目錄（sqlite 後端使用 CACHE_SQLITE_PATH，redis 後端使用 REDIS_URL）
+        backend: 'file'、'sqlite' 或 'redis'，默認為 CACHE_BACKEND
+
+    Returns:
+        CacheManagerBase: 快取管理器
+    """
+    backend = backend or Config.CACHE_BACKEND
+    if backend == 'sqlite':
+        from .sqlite_cache_manager import SQLiteCacheManager
+        return SQLiteCacheManager()
+    if backend == 'redis':
+        from .redis_cache_manager import RedisCacheManager
+        return RedisCacheManager()
+    if backend != 'file':
+        raise ValueError(f"未知的快取後端: {backend}")
+    return CacheManager(cache_dir)
@@ -0,0 +1,111 @@
+"""
+上游斷路器
+上游連續失敗達門檻後暫停請求一段時間，避免在證交所故障或限流時持續重試
+"""
+import threading
+import time
+import urllib.parse
+from typing import Dict
+from config import Config
+
+
+class CircuitOpenError(ConnectionError):
+    """斷路器開啟中，請求未送出"""
+
+
+class CircuitBreaker:
+    """單一主機的斷路器（closed → open → half-open）"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = None, cooldown_seconds: float = None):
+        """
+        初始化斷路器
+
+        Args:
+            failure_threshold: 連續失敗幾次後開啟
+            cooldown_seconds: 開啟後多久允許一次試探請求
+        """
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_BREAKER_THRESHOLD
+        self.cooldown_seconds = cooldown_seconds or Config.CIRCUIT_BREAKER_COOLDOWN_SECONDS
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """目前狀態"""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """
+        是否允許送出請求
+
+        half-open 狀態只允許一個試探請求，其結果決定關閉或重新開啟
+
+        Returns:
+            bool: 是否允許
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """記錄成功，關閉斷路器"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """記錄失敗，達門檻或試探失敗時開啟斷路器"""
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """
+    獲取 URL 所屬主機的斷路器（同一進程內共用）
+
+    Args:
+        url: 請求 URL
+
+    Returns:
+        CircuitBreaker: 斷路器
+    """
+    host = urllib.parse.urlparse(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            _breakers[host] = breaker
+    return breaker
+
+
+def reset_circuit_breakers():
+    """清除所有斷路器狀態"""
+    with _breakers_lock:
+        _breakers.clear()
@@ -106,15 +106,19 @@ class DateUtils:
         return yesterday.strftime('%Y-%m-%d')
 
     @staticmethod
-    def get_latest_available_date() -> datetime:
+    def get_latest_available_date(now: datetime = None) -> datetime:
         """
         獲取最新可獲取的數據日期
         台灣股市收盤時間為 13:30，在此之後可以獲取當天數據
 
+        Args:
+            now: 參考時間，默認為現在
+
         Returns:
             datetime: 最新可獲取數據的日期
         """
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
 
         # 台灣股市收盤時間 13:30
         market_close_time = now.replace(hour=13, minute=30, second=0, microsecond=0)
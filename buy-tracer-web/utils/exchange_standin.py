@@ -0,0 +1,400 @@
+"""
+證交所／櫃買中心離線替身伺服器
+在本機提供與上游相同路徑與格式的 STOCK_DAY、STOCK_DAY_ALL 及櫃買個股日成交回應，
+可注入延遲、錯誤與限流，讓抓取並行度、重試與冷啟動延遲在無網路環境下可重現地量測。
+
+回應來源依序為：
+1. 錄製的原始回應（與 MonthStore 相同的目錄結構，data/months 可直接作為錄製檔）
+2. 依股票代號與月份決定的合成數據（只涵蓋設定的股票與日期範圍）
+
+啟用方式：設定 EXCHANGE_BASE_URL（例如 http://127.0.0.1:8765/），
+apply_twstock_patch() 會將 twstock 的上游網址指向替身
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from .date_utils import DateUtils
+from .month_store import MonthStore
+
+TWSE_STOCK_DAY_PATH = '/twse/exchangeReport/STOCK_DAY'
+TWSE_DAILY_ALL_PATH = '/twse/exchangeReport/STOCK_DAY_ALL'
+TPEX_STOCK_DAY_PATH = '/tpex/web/stock/aftertrading/daily_trading_info/st43_result.php'
+
+TWSE_FIELDS = ['日期', '成交股數', '成交金額', '開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '成交筆數', '註記']
+DAILY_ALL_FIELDS = ['證券代號', '證券名稱', '成交股數', '成交金額', '開盤價', '最高價', '最低價',
+                    '收盤價', '漲跌價差', '成交筆數']
+TWSE_NO_DATA = '很抱歉，沒有符合條件的資料!'
+
+
+def _roc_date(day: date) -> str:
+    return f"{day.year - 1911}/{day.month:02d}/{day.day:02d}"
+
+
+def synthetic_rows(ticker: str, year: int, month: int, end_date: date = None,
+                   start_date: date = None) -> List[list]:
+    """
+    產生單月合成日成交資料（相同輸入永遠得到相同結果）
+
+    欄位與 STOCK_DAY 相同；成交股數與成交金額以股、元為單位
+
+    Args:
+        ticker: 股票代號
+        year: 年
+        month: 月
+        end_date: 最後一天（含），之後的日期不產生
+        start_date: 第一天（含），之前的日期不產生
+
+    Returns:
+        List[list]: 字串欄位的資料列
+    """
+    seed = zlib.crc32(f"{ticker}-{year}-{month}".encode())
+    rng = random.Random(seed)
+    base = 20 + zlib.crc32(ticker.encode()) % 900
+    # 以月份序號緩慢漂移，跨月價格大致連續
+    price = base * (1 + 0.01 * ((year * 12 + month) % 24))
+
+    rows = []
+    day = date(year, month, 1)
+    while day.month == month:
+        if end_date is not None and day > end_date:
+            break
+        if DateUtils.is_trading_day(day) and (start_date is None or day >= start_date):
+            open_price = round(price, 2)
+            close = round(max(1.0, open_price * (1 + rng.uniform(-0.03, 0.03))), 2)
+            high = round(max(open_price, close) * (1 + rng.uniform(0, 0.01)), 2)
+            low = round(min(open_price, close) * (1 - rng.uniform(0, 0.01)), 2)
+            volume = rng.randint(1000, 50000) * 1000
+            change = close - open_price
+            rows.append([
+                _roc_date(day), f"{volume:,}", f"{int(volume * close):,}",
+                f"{open_price:,.2f}", f"{high:,.2f}", f"{low:,.2f}", f"{close:,.2f}",
+                f"{'+' if change >= 0 else '-'}{abs(change):.2f}", f"{rng.randint(100, 9000):,}", ''
+            ])
+            price = close
+        day += timedelta(days=1)
+    return rows
+
+
+def twse_payload(ticker: str, year: int, month: int, rows: List[list]) -> Dict:
+    """組成 STOCK_DAY 回應"""
+    if not rows:
+        return {'stat': TWSE_NO_DATA}
+    return {
+        'stat': 'OK',
+        'date': f"{year:04d}{month:02d}01",
+        'title': f"{year - 1911}年{month:02d}月 {ticker} 各日成交資訊",
+        'fields': TWSE_FIELDS,
+        'data': rows,
+        'notes': []
+    }
+
+
+def tpex_payload(ticker: str, year: int, month: int, rows: List[list]) -> Dict:
+    """組成櫃買中心個股日成交回應（成交股數、金額以千為單位）"""
+    aa_data = []
+    for row in rows:
+        volume = int(row[1].replace(',', '')) // 1000
+        turnover = int(row[2].replace(',', '')) // 1000
+        aa_data.append([row[0], f"{volume:,}", f"{turnover:,}"] + row[3:9])
+    return {
+        'stkNo': ticker,
+        'reportDate': f"{year - 1911}/{month:02d}",
+        'iTotalRecords': len(aa_data),
+        'aaData': aa_data
+    }
+
+
+def generate_fixtures(store_dir: str, tickers: List[str], start_date: str, end_date: str,
+                      market: str = 'TWSE') -> int:
+    """
+    將合成回應寫成錄製檔（MonthStore 目錄結構），供無網路環境使用
+
+    Args:
+        store_dir: 錄製檔目錄
+        tickers: 股票代號列表
+        start_date: 開始日期 (YYYY-MM-DD)
+        end_date: 結束日期 (YYYY-MM-DD)
+        market: 'TWSE' 或 'TPEX'
+
+    Returns:
+        int: 寫入的月份數
+    """
+    store = MonthStore(store_dir)
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    build = tpex_payload if market == 'TPEX' else twse_payload
+
+    count = 0
+    for ticker in tickers:
+        for year, month in DateUtils.get_date_range_months(start, end):
+            rows = synthetic_rows(ticker, year, month, end.date(), start.date())
+            if store.put(market, ticker, year, month, build(ticker, year, month, rows)):
+                count += 1
+    return count
+
+
+class ExchangeStandIn:
+    """本機上游替身伺服器"""
+
+    def __init__(self, fixture_dir: str = None, tickers: List[str] = None,
+                 start_date: str = '2024-01-01', end_date: str = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, max_rps: float = None, seed: int = 0,
+                 host: str = '127.0.0.1', port: int = 0):
+        """
+        初始化替身伺服器
+
+        Args:
+            fixture_dir: 錄製檔目錄（MonthStore 結構），None 時只提供合成數據
+            tickers: 提供合成數據的股票代號，None 表示不限
+            start_date: 合成數據開始日期 (YYYY-MM-DD)
+            end_date: 合成數據結束日期 (YYYY-MM-DD)，默認為最新可用日期
+            latency: 每個回應的固定延遲（秒）
+            jitter: 額外隨機延遲上限（秒）
+            error_rate: 回應 500 錯誤頁的機率
+            throttle_rate: 回應限流頁的機率
+            max_rps: 每秒最多處理的請求數，超過的回應限流頁
+            seed: 隨機注入的種子（相同種子得到相同的錯誤序列）
+            host: 綁定位址
+            port: 綁定埠號，0 表示由系統分配
+        """
+        self.fixture_store = MonthStore(fixture_dir) if fixture_dir else None
+        self.tickers = set(tickers) if tickers else None
+        self.start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        self.end_date = (datetime.strptime(end_date, '%Y-%m-%d').date() if end_date
+                         else DateUtils.get_latest_available_date().date())
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.host = host
+        self.port = port
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._server = None
+        self._thread = None
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0, 'not_found': 0}
+
+    @property
+    def base_url(self) -> str:
+        """替身伺服器根網址（供 EXCHANGE_BASE_URL 使用）"""
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self) -> 'ExchangeStandIn':
+        """在背景執行緒啟動伺服器"""
+        handler = type('StandInHandler', (_StandInHandler,), {'standin': self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='exchange-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止伺服器"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _record(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _inject(self) -> Optional[str]:
+        """決定本次請求是否注入限流或錯誤"""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.max_rps:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.max_rps:
+                    return 'throttled'
+            roll = self._rng.random()
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+        if delay > 0:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            return 'throttled'
+        if roll < self.throttle_rate + self.error_rate:
+            return 'errors'
+        return None
+
+    def _covers(self, ticker: str, year: int, month: int) -> bool:
+        """合成數據是否涵蓋此股票與月份"""
+        if self.tickers is not None and ticker not in self.tickers:
+            return False
+        return ((self.start_date.year, self.start_date.month) <= (year, month)
+                <= (self.end_date.year, self.end_date.month))
+
+    def _month_rows(self, ticker: str, year: int, month: int) -> List[list]:
+        if not self._covers(ticker, year, month):
+            return []
+        return synthetic_rows(ticker, year, month, self.end_date, self.start_date)
+
+    def month_payload(self, market: str, ticker: str, year: int, month: int) -> Dict:
+        """
+        獲取單月回應（錄製檔優先）
+
+        Args:
+            market: 'TWSE' 或 'TPEX'
+            ticker: 股票代號
+            year: 年
+            month: 月
+
+        Returns:
+            Dict: 與上游格式相同的回應
+        """
+        if self.fixture_store:
+            entry = self.fixture_store.get(market, ticker, year, month)
+            if entry:
+                return entry['payload']
+
+        rows = self._month_rows(ticker, year, month)
+        if market == 'TPEX':
+            return tpex_payload(ticker, year, month, rows)
+        return twse_payload(ticker, year, month, rows)
+
+    def daily_all_payload(self) -> Dict:
+        """獲取最後一個交易日的全市場收盤行情（只含合成數據涵蓋的股票）"""
+        trade_date = self.end_date
+        while not DateUtils.is_trading_day(trade_date):
+            trade_date -= timedelta(days=1)
+
+        roc = _roc_date(trade_date)
+        rows = []
+        for ticker in sorted(self.tickers or []):
+            for row in self._month_rows(ticker, trade_date.year, trade_date.month):
+                if row[0] == roc:
+                    rows.append([ticker, ticker] + row[1:9])
+        if not rows:
+            return {'stat': TWSE_NO_DATA}
+        return {
+            'stat': 'OK',
+            'date': trade_date.strftime('%Y%m%d'),
+            'title': f"{trade_date.year - 1911}年{trade_date.month:02d}月{trade_date.day:02d}日 每日收盤行情(全部)",
+            'fields': DAILY_ALL_FIELDS,
+            'data': rows
+        }
+
+    def route(self, path: str, query: Dict[str, str]) -> Optional[Dict]:
+        """依路徑與查詢參數產生回應，無對應路徑時返回 None"""
+        if path == TWSE_STOCK_DAY_PATH:
+            day = query.get('date', '')
+            if len(day) != 8 or not day.isdigit():
+                return {'stat': TWSE_NO_DATA}
+            return self.month_payload('TWSE', query.get('stockNo', ''), int(day[:4]), int(day[4:6]))
+
+        if path == TPEX_STOCK_DAY_PATH:
+            roc_year, _, month = query.get('d', '').partition('/')
+            if not (roc_year.isdigit() and month.isdigit()):
+                return tpex_payload(query.get('stkno', ''), 0, 0, [])
+            return self.month_payload('TPEX', query.get('stkno', ''), int(roc_year) + 1911, int(month))
+
+        if path == TWSE_DAILY_ALL_PATH:
+            return self.daily_all_payload()
+
+        return None
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """替身伺服器請求處理"""
+
+    standin: ExchangeStandIn = None
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path == '/_stats':
+            self._send(200, json.dumps(self.standin.stats), 'application/json')
+            return
+
+        injected = self.standin._inject()
+        if injected == 'throttled':
+            self.standin._record('throttled')
+            # 證交所限流時回應 HTML 頁面而非 JSON
+            self._send(429, '<html><body>請求過於頻繁，請稍後再試</body></html>', 'text/html')
+            return
+        if injected == 'errors':
+            self.standin._record('errors')
+            self._send(500, '<html><body>Internal Server Error</body></html>', 'text/html')
+            return
+
+        payload = self.standin.route(url.path, query)
+        if payload is None:
+            self.standin._record('not_found')
+            self._send(404, '<html><body>Not Found</body></html>', 'text/html')
+            return
+
+        self.standin._record('ok')
+        self._send(200, json.dumps(payload, ensure_ascii=False), 'application/json')
+
+    def _send(self, status: int, body: str, content_type: str):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='證交所／櫃買中心離線替身伺服器')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', help='錄製檔目錄（MonthStore 結構）')
+    parser.add_argument('--tickers', default='2330,2317,2454', help='合成數據的股票代號，逗號分隔')
+    parser.add_argument('--start', default='2024-01-01', help='合成數據開始日期')
+    parser.add_argument('--end', help='合成數據結束日期（默認為最新可用日期）')
+    parser.add_argument('--latency', type=float, default=0.0, help='固定延遲（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='隨機延遲上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='500 錯誤機率')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='限流回應機率')
+    parser.add_argument('--max-rps', type=float, help='每秒最多處理的請求數')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--generate', action='store_true', help='將合成數據寫入錄製檔目錄後結束')
+    args = parser.parse_args()
+
+    tickers = [t for t in args.tickers.split(',') if t]
+    if args.generate:
+        end = args.end or DateUtils.get_latest_available_date().strftime('%Y-%m-%d')
+        written = generate_fixtures(args.fixtures, tickers, args.start, end)
+        print(f"已寫入 {written} 個月份錄製檔: {args.fixtures}")
+    else:
+        standin = ExchangeStandIn(
+            fixture_dir=args.fixtures, tickers=tickers, start_date=args.start, end_date=args.end,
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate, max_rps=args.max_rps, seed=args.seed, port=args.port
+        ).start()
+        print(f"替身伺服器啟動: {standin.base_url}（EXCHANGE_BASE_URL={standin.base_url}）")
+        try:
+            standin._thread.join()
+        except KeyboardInterrupt:
+            standin.stop()
@@ -0,0 +1,330 @@
+"""
+上游數據抓取引擎
+以有界執行緒池並行抓取多個月份，並依主機限制請求速率以避免證交所限流；
+失敗時指數退避重試，連續失敗則由斷路器暫停請求
+"""
+import multiprocessing
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import twstock
+from config import Config
+from .circuit_breaker import CircuitOpenError, get_circuit_breaker
+from .month_store import MonthStore
+from .twse_parser import parse_payload
+from .twstock_patch import request_json
+
+# 證交所全部證券當日收盤行情（只提供最新交易日）
+DAILY_ALL_PATH = 'exchangeReport/STOCK_DAY_ALL'
+
+
+class HostRateLimiter:
+    """單一主機的請求速率限制器（令牌桶）"""
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        """
+        初始化速率限制器
+
+        Args:
+            rate_per_second: 每秒補充的請求數
+            burst: 可瞬間發出的最大請求數
+        """
+        self.rate_per_second = max(float(rate_per_second), 0.001)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一次請求額度，額度不足時阻塞等待"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.burst),
+                self._tokens + (now - self._updated) * self.rate_per_second
+            )
+            self._updated = now
+            # 先預扣額度，讓後續呼叫者依序排隊
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate_per_second
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """跨進程共用的請求速率限制器（以共享記憶體記錄下一個可用時間點）"""
+
+    def __init__(self, rate_per_second: float, next_slot=None):
+        """
+        初始化速率限制器
+
+        Args:
+            rate_per_second: 所有進程合計的每秒請求數
+            next_slot: 共享的 multiprocessing.Value('d')，子進程傳入父進程建立的同一個值
+        """
+        self.interval = 1.0 / max(float(rate_per_second), 0.001)
+        self.next_slot = next_slot if next_slot is not None else multiprocessing.Value('d', 0.0)
+
+    def acquire(self):
+        """取得一次請求額度，依序排入下一個可用時間點"""
+        with self.next_slot.get_lock():
+            now = time.time()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_host_limiters: Dict[str, HostRateLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+
+def set_host_limit(host: str, rate_per_second: float, burst: int = 1) -> HostRateLimiter:
+    """
+    設定指定主機的請求預算
+
+    Args:
+        host: 主機名稱（含埠號）
+        rate_per_second: 每秒請求數
+        burst: 瞬間最大請求數
+
+    Returns:
+        HostRateLimiter: 新的速率限制器
+    """
+    return set_host_limiter(host, HostRateLimiter(rate_per_second, burst))
+
+
+def set_host_limiter(host: str, limiter):
+    """
+    替換指定主機的速率限制器（例如多進程回填共用的 SharedRateLimiter）
+
+    Args:
+        host: 主機名稱（含埠號）
+        limiter: 具有 acquire() 的速率限制器
+
+    Returns:
+        傳入的速率限制器
+    """
+    with _host_limiters_lock:
+        _host_limiters[host] = limiter
+    return limiter
+
+
+def get_host_limiter(url: str) -> HostRateLimiter:
+    """
+    獲取 URL 所屬主機的速率限制器（同一進程內共用）
+
+    Args:
+        url: 請求 URL
+
+    Returns:
+        HostRateLimiter: 速率限制器
+    """
+    host = urllib.parse.urlparse(url).netloc
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None:
+            limiter = HostRateLimiter(
+                Config.UPSTREAM_REQUESTS_PER_SECOND,
+                Config.UPSTREAM_BURST
+            )
+            _host_limiters[host] = limiter
+    return limiter
+
+
+def _default_fetcher_factory(ticker: str):
+    """建立 twstock 抓取器（不觸發初始抓取）"""
+    from .twstock_patch import apply_twstock_patch
+    apply_twstock_patch()
+    return twstock.Stock(ticker, initial_fetch=False).fetcher
+
+
+def get_market(fetcher) -> str:
+    """
+    依抓取器類型判斷市場
+
+    Returns:
+        str: 'TPEX'（上櫃）或 'TWSE'（上市）
+    """
+    if isinstance(fetcher, twstock.stock.TPEXFetcher):
+        return 'TPEX'
+    return 'TWSE'
+
+
+class FetchEngine:
+    """月份數據並行抓取引擎"""
+
+    def __init__(self, max_workers: int = None, fetcher_factory: Callable = None,
+                 month_store: MonthStore = None, max_retries: int = None,
+                 backoff_seconds: float = None):
+        """
+        初始化抓取引擎
+
+        Args:
+            max_workers: 執行緒池大小
+            fetcher_factory: 依股票代號建立抓取器的函數
+            month_store: 月份原始快取，默認使用 Config.MONTH_STORE_DIR
+            max_retries: 每次上游請求的最大嘗試次數
+            backoff_seconds: 第一次重試前的等待秒數（之後每次加倍）
+        """
+        self.max_workers = max_workers or Config.FETCH_MAX_WORKERS
+        self.max_retries = max_retries or Config.UPSTREAM_MAX_RETRIES
+        if backoff_seconds is None:
+            backoff_seconds = Config.UPSTREAM_BACKOFF_SECONDS
+        self.backoff_seconds = backoff_seconds
+        self._fetcher_factory = fetcher_factory or _default_fetcher_factory
+        self.month_store = month_store or MonthStore()
+        self._fetchers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='twse-fetch'
+        )
+
+    def get_fetcher(self, ticker: str):
+        """
+        獲取股票代號對應的抓取器（每個代號只建立一次）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            抓取器（TWSEFetcher / TPEXFetcher）
+        """
+        with self._lock:
+            fetcher = self._fetchers.get(ticker)
+            if fetcher is None:
+                fetcher = self._fetcher_factory(ticker)
+                self._fetchers[ticker] = fetcher
+        return fetcher
+
+    def fetch_month(self, ticker: str, year: int, month: int) -> Dict[str, np.ndarray]:
+        """
+        抓取單一月份數據
+
+        已收盤月份直接從月份原始快取讀取，不再請求上游；
+        未收盤月份（當月）每次都重新驗證
+
+        Args:
+            ticker: 股票代號
+            year: 年
+            month: 月
+
+        Returns:
+            Dict[str, np.ndarray]: 該月的欄位陣列（見 utils.twse_parser.FIELDS）
+        """
+        fetcher = self.get_fetcher(ticker)
+        market = get_market(fetcher)
+
+        payload = self.month_store.get_closed(market, ticker, year, month)
+        if payload is None:
+            payload = self.call_upstream(fetcher.REPORT_URL, fetcher.fetch_raw, year, month, ticker, retry=1)
+            self.month_store.put(market, ticker, year, month, payload)
+
+        return parse_payload(market, payload)
+
+    def fetch_daily_all(self) -> Optional[Dict]:
+        """
+        抓取證交所全部證券的當日收盤行情（一次請求涵蓋整個上市市場）
+
+        Returns:
+            Dict: 原始 JSON 回應，失敗時返回 None
+        """
+        url = urllib.parse.urljoin(twstock.stock.TWSE_BASE_URL, DAILY_ALL_PATH)
+        try:
+            payload = self.call_upstream(url, request_json, url, {'response': 'json'}, retry=1)
+        except ConnectionError as e:
+            print(f"  !!! 全市場行情抓取失敗: {e}")
+            return None
+
+        if payload.get('stat') != 'OK':
+            return None
+        return payload
+
+    def call_upstream(self, url: str, fn: Callable, *args, **kwargs):
+        """
+        帶速率限制、重試退避與斷路器的上游請求
+
+        fn 拋出例外或返回 None 視為失敗；連續失敗達門檻後斷路器開啟，
+        冷卻期間直接拋出 CircuitOpenError 而不送出請求
+
+        Args:
+            url: 請求 URL（用於決定主機）
+            fn: 實際發送請求的函數
+
+        Returns:
+            fn 的返回值
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+            ConnectionError: 所有重試皆失敗
+        """
+        breaker = get_circuit_breaker(url)
+        limiter = get_host_limiter(url)
+        last_error = None
+
+        for attempt in range(self.max_retries):
+            if not breaker.allow_request():
+                raise CircuitOpenError(f"上游暫停請求中（斷路器開啟）: {urllib.parse.urlparse(url).netloc}")
+
+            limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                result, last_error = None, e
+
+            if result is not None:
+                breaker.record_success()
+                return result
+
+            breaker.record_failure()
+            if attempt < self.max_retries - 1:
+                # 指數退避並加入隨機抖動，避免多個執行緒同時重試
+                delay = self.backoff_seconds * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+        raise ConnectionError(f"上游無有效回應（重試 {self.max_retries} 次）: {last_error or url}")
+
+    def fetch_months(self, ticker: str,
+                     months: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Dict[str, np.ndarray]]:
+        """
+        並行抓取多個月份數據
+
+        Args:
+            ticker: 股票代號
+            months: (year, month) 元組列表
+
+        Returns:
+            Dict[Tuple[int, int], Dict[str, np.ndarray]]: 成功抓取的月份欄位，失敗的月份不包含在內
+
+        Raises:
+            CircuitOpenError: 斷路器開啟且沒有任何月份可用
+        """
+        futures = [
+            ((year, month), self._executor.submit(self.fetch_month, ticker, year, month))
+            for year, month in months
+        ]
+
+        results = {}
+        circuit_error = None
+        for (year, month), future in futures:
+            try:
+                results[(year, month)] = future.result()
+            except CircuitOpenError as e:
+                circuit_error = e
+            except Exception as e:
+                print(f"  !!! 獲取 {year} 年 {month} 月數據失敗: {e}")
+
+        if circuit_error is not None:
+            print(f"  !!! {circuit_error}")
+            if not results:
+                raise circuit_error
+
+        return results
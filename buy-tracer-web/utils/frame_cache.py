@@ -0,0 +1,105 @@
+"""
+進程內已解碼快取（LRU）
+每個 worker 保留最近使用的已解碼數據，以檔案版本（inode、大小、修改時間）驗證；
+版本不符視為未命中，總大小以實際位元組數計算，超過上限時淘汰最久未使用的項目
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from config import Config
+
+
+class FrameCache:
+    """以位元組數為上限的 LRU"""
+
+    def __init__(self, max_bytes: int = None):
+        """
+        初始化快取
+
+        Args:
+            max_bytes: 總大小上限（位元組），默認為 FRAME_CACHE_SIZE_MB，0 為停用
+        """
+        self.max_bytes = Config.FRAME_CACHE_SIZE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """
+        取得快取值
+
+        Args:
+            key: 鍵值
+            version: 目前的數據版本，與存入時不同即視為未命中並移除
+
+        Returns:
+            Any: 快取值，未命中時返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any, nbytes: int):
+        """
+        存入快取值，超過上限時淘汰最久未使用的項目
+
+        Args:
+            key: 鍵值
+            version: 數據版本
+            value: 快取值
+            nbytes: 快取值佔用的位元組數
+        """
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, value, nbytes)
+            self._bytes += nbytes
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """移除鍵值"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: Hashable):
+        _, _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def stats(self) -> Dict:
+        """
+        快取統計
+
+        Returns:
+            Dict: {'entries', 'bytes', 'max_bytes', 'hits', 'misses', 'evictions', 'hit_rate'}
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,144 @@
+"""
+月份原始數據快取
+以 (市場, 股票代號, 年, 月) 為鍵保存上游原始回應，已收盤月份視為不可變、不再重新請求
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+from config import Config
+from .atomic_file import atomic_write
+
+
+class MonthStore:
+    """月份粒度的上游原始回應快取"""
+
+    def __init__(self, store_dir: str = None):
+        """
+        初始化月份快取
+
+        Args:
+            store_dir: 快取目錄路徑
+        """
+        self.store_dir = store_dir or Config.MONTH_STORE_DIR
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _get_path(self, market: str, ticker: str, year: int, month: int) -> str:
+        """獲取月份快取文件路徑"""
+        return os.path.join(self.store_dir, market, ticker, f"{year:04d}-{month:02d}.json")
+
+    @staticmethod
+    def is_month_closed(year: int, month: int, latest_date: datetime = None) -> bool:
+        """
+        判斷月份是否已收盤（數據不會再變動）
+
+        Args:
+            year: 年
+            month: 月
+            latest_date: 最新可用數據日期，默認為 DateUtils.get_latest_available_date()
+
+        Returns:
+            bool: 最新可用日期已進入之後的月份時返回 True
+        """
+        from utils import DateUtils
+
+        if latest_date is None:
+            latest_date = DateUtils.get_latest_available_date()
+
+        return (year, month) < (latest_date.year, latest_date.month)
+
+    @staticmethod
+    def is_valid_payload(market: str, payload: Dict) -> bool:
+        """
+        判斷上游回應是否為有效的月份數據
+
+        證交所需 stat == 'OK' 且有 data，櫃買中心需有 aaData；
+        錯誤或「查無資料」的回應不可視為已收盤，否則會被永久沿用
+
+        Args:
+            market: 市場 ('TWSE' / 'TPEX')
+            payload: 上游原始 JSON 回應
+
+        Returns:
+            bool: 是否為有效數據
+        """
+        if not isinstance(payload, dict):
+            return False
+        if market == 'TPEX':
+            return bool(payload.get('aaData'))
+        return payload.get('stat') == 'OK' and bool(payload.get('data'))
+
+    def get(self, market: str, ticker: str, year: int, month: int) -> Optional[Dict]:
+        """
+        讀取月份快取
+
+        Args:
+            market: 市場 ('TWSE' / 'TPEX')
+            ticker: 股票代號
+            year: 年
+            month: 月
+
+        Returns:
+            Dict: {'closed', 'fetched_at', 'payload'}，不存在或損壞時返回 None
+        """
+        path = self._get_path(market, ticker, year, month)
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"月份快取讀取失敗: {market}/{ticker} {year}-{month:02d} - {e}")
+            return None
+
+    def get_closed(self, market: str, ticker: str, year: int, month: int) -> Optional[Dict]:
+        """
+        讀取已收盤（不可變）的月份原始回應
+
+        Returns:
+            Dict: 原始回應，月份未收盤或不存在時返回 None
+        """
+        entry = self.get(market, ticker, year, month)
+        if entry and entry.get('closed'):
+            return entry.get('payload')
+        return None
+
+    def put(self, market: str, ticker: str, year: int, month: int, payload: Dict) -> bool:
+        """
+        保存月份原始回應，並依目前日期標記是否已收盤
+
+        已收盤的月份不會被覆寫；無效的回應（錯誤或查無資料）一律標記為未收盤，下次重新請求
+
+        Args:
+            market: 市場
+            ticker: 股票代號
+            year: 年
+            month: 月
+            payload: 上游原始 JSON 回應
+
+        Returns:
+            bool: 是否保存成功
+        """
+        if self.get_closed(market, ticker, year, month) is not None:
+            return False
+
+        path = self._get_path(market, ticker, year, month)
+        entry = {
+            'market': market,
+            'ticker': ticker,
+            'year': year,
+            'month': month,
+            'closed': self.is_valid_payload(market, payload) and self.is_month_closed(year, month),
+            'fetched_at': datetime.now().isoformat(),
+            'payload': payload
+        }
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+            return True
+        except (IOError, OSError) as e:
+            print(f"月份快取保存失敗: {market}/{ticker} {year}-{month:02d} - {e}")
+            return False
@@ -0,0 +1,373 @@
+"""
+日期 × 股票面板
+全市場的橫斷面計算（今天哪些股票出現買點、多少股票站上均線）需要所有股票在同一組交易日上對齊的價量，
+逐檔開啟記錄檔要解析數百個檔案。面板把已快取股票的 open/high/low/close/volume
+存成依日期排列的稠密 float64 矩陣（每列一個交易日、每行一檔股票），另有有效遮罩（當日有成交記錄），
+讀取端以唯讀 memmap 附加，全市場掃描只是幾個向量化的 NumPy 運算
+
+目錄（默認 data/panel）：
+- panel.json：{'generation', 'rows', 'capacity', 'tickers', 'synced'}，提交點（原子替換）
+- gen-{generation}/dates.i4：每列的交易日（1970-01-01 起的日數）
+- gen-{generation}/{欄位}.f8：rows × capacity 的 float64 矩陣（列優先），沒有數據的格為 NaN
+- gen-{generation}/valid.u1：rows × capacity 的有效遮罩
+
+更新：
+- 新的交易日附加在檔尾（每個矩陣附加一列），數值寫入並 fsync 後才提交 panel.json 的列數，
+  讀取端只映射已提交的列；附加中斷留下的未提交列在下一次寫入前截斷
+- 既有交易日的數值原地寫入（先寫數值再寫遮罩）
+- 插入較早的交易日或股票數超過容量時寫入新的 generation 目錄，再以 panel.json 原子切換；
+  已映射舊 generation 的讀取端仍可讀取（刪除後映射仍有效）
+- sync() 依快取目錄的 (最後日期, 筆數, data_version) 找出變動的股票，
+  只有附加時只寫入新的交易日，其餘重寫整行（重寫期間讀取端可能短暫看到該股票沒有數據）
+"""
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from .atomic_file import atomic_write, fsync_dir
+from .single_flight import FileLock
+
+PANEL_FILE = 'panel.json'
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+# 股票容量以此為單位成長，新增股票不必每次重寫
+CAPACITY_STEP = 256
+
+
+class Panel:
+    """已提交的面板（欄位為唯讀 memmap 視圖，列依日期排序）"""
+
+    def __init__(self, dates: np.ndarray, tickers: List[str], fields: Dict[str, np.ndarray],
+                 valid: np.ndarray):
+        self.dates = dates
+        self.tickers = tickers
+        self.columns = {ticker: i for i, ticker in enumerate(tickers)}
+        self.fields = fields
+        self.valid = valid
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.fields[name]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def row(self, date_str: str = None) -> int:
+        """
+        交易日所在的列
+
+        Args:
+            date_str: 日期 (YYYY-MM-DD)，未指定時為最後一列
+
+        Returns:
+            int: 列號，不存在時為 -1
+        """
+        if not len(self.dates):
+            return -1
+        if date_str is None:
+            return len(self.dates) - 1
+        day = np.datetime64(date_str, 'D')
+        pos = int(np.searchsorted(self.dates, day))
+        return pos if pos < len(self.dates) and self.dates[pos] == day else -1
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """欄位轉為 DataFrame（index 為日期、columns 為股票代號，沒有數據為 NaN）"""
+        index = pd.DatetimeIndex(self.dates.astype('datetime64[ns]'), name='date')
+        return pd.DataFrame(self.fields[name], index=index, columns=self.tickers, copy=False)
+
+
+class PanelStore:
+    """日期 × 股票面板的讀寫（同一時間只有一個寫入者）"""
+
+    def __init__(self, directory: str = None):
+        """
+        初始化面板
+
+        Args:
+            directory: 面板目錄，默認為 PANEL_DIR
+        """
+        self.directory = directory or Config.PANEL_DIR
+        self.panel_path = os.path.join(self.directory, PANEL_FILE)
+        self.lock_path = os.path.join(self.directory, '.lock')
+        self._lock = threading.Lock()
+        self._cached = None
+
+    def _gen_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"gen-{generation}")
+
+    def _read_state(self) -> Optional[Dict]:
+        try:
+            with open(self.panel_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _commit(self, state: Dict):
+        atomic_write(self.panel_path, json.dumps(state, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def _files(directory: str) -> Dict[str, str]:
+        files = {name: os.path.join(directory, f"{name}.f8") for name in FIELDS}
+        files['dates'] = os.path.join(directory, 'dates.i4')
+        files['valid'] = os.path.join(directory, 'valid.u1')
+        return files
+
+    @staticmethod
+    def _row_bytes(name: str, capacity: int) -> int:
+        if name == 'dates':
+            return 4
+        return capacity if name == 'valid' else 8 * capacity
+
+    def _map(self, state: Dict, mode: str = 'r') -> Dict[str, np.ndarray]:
+        """映射 state 的已提交列（rows × capacity）"""
+        rows, capacity = state['rows'], state['capacity']
+        arrays = {}
+        for name, path in self._files(self._gen_dir(state['generation'])).items():
+            dtype = {'dates': '<i4', 'valid': np.uint8}.get(name, '<f8')
+            shape = (rows,) if name == 'dates' else (rows, capacity)
+            if rows == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+        return arrays
+
+    def open(self) -> Optional[Panel]:
+        """
+        附加目前提交的面板（panel.json 未變動時沿用已映射的視圖）
+
+        Returns:
+            Panel: 面板，尚未建立時為 None
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.panel_path)
+            except FileNotFoundError:
+                return None
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if self._cached and self._cached[0] == key:
+                return self._cached[1]
+
+            state = self._read_state()
+            if state is None:
+                return None
+            n = len(state['tickers'])
+            arrays = self._map(state)
+            panel = Panel(
+                dates=np.asarray(arrays['dates']).astype('datetime64[D]'),
+                tickers=list(state['tickers']),
+                fields={name: arrays[name][:, :n] for name in FIELDS},
+                valid=arrays['valid'][:, :n].view(bool)
+            )
+            self._cached = (key, panel)
+            return panel
+
+    def get_synced(self) -> Dict[str, list]:
+        """各股票上次同步時的 [最後日期, 筆數, data_version]"""
+        state = self._read_state()
+        return dict(state['synced']) if state else {}
+
+    def write(self, frames: Dict[str, pd.DataFrame], replace: Iterable[str] = (),
+              synced: Dict[str, Optional[list]] = None, fresh: bool = False) -> Dict:
+        """
+        寫入各股票的日線並提交
+
+        Args:
+            frames: {股票代號: DataFrame}（date 與 FIELDS 欄位），已有的格直接覆蓋
+            replace: 寫入前先清空整行的股票
+            synced: 記錄的同步標記，值為 None 時移除
+            fresh: 捨棄現有面板，從空白的新 generation 開始
+
+        Returns:
+            Dict: 提交後的 state
+        """
+        with FileLock(self.lock_path):
+            previous = self._read_state()
+            state = None if fresh else previous
+            if state is None:
+                state = {'version': 1, 'generation': previous['generation'] if previous else 0,
+                         'rows': 0, 'capacity': 0, 'tickers': [], 'synced': {}}
+
+            tickers = list(state['tickers'])
+            for ticker in list(frames) + list(replace):
+                if ticker not in tickers:
+                    tickers.append(ticker)
+
+            ordinals = {ticker: df['date'].values.astype('datetime64[D]').astype(np.int64)
+                        for ticker, df in frames.items() if len(df)}
+            incoming = np.unique(np.concatenate(list(ordinals.values()))) if ordinals else np.zeros(0, np.int64)
+
+            current = self._map(state)
+            dates = np.asarray(current['dates'], dtype=np.int64)
+            last = dates[-1] if len(dates) else np.iinfo(np.int64).min
+            missing = np.setdiff1d(incoming, dates, assume_unique=True)
+
+            if not state['capacity'] or len(tickers) > state['capacity'] or (missing < last).any():
+                all_dates = np.union1d(dates, missing)
+                state = self._new_generation(state, current, tickers, len(all_dates), all_dates)
+            else:
+                state = self._append_rows(state, missing[missing > last])
+            del current
+
+            state['tickers'] = tickers
+            arrays = self._map(state, mode='r+') if state['rows'] else None
+            if arrays is not None:
+                dates = np.asarray(arrays['dates'], dtype=np.int64)
+                columns = {ticker: i for i, ticker in enumerate(tickers)}
+                for ticker in replace:
+                    col = columns[ticker]
+                    for name in FIELDS:
+                        arrays[name][:, col] = np.nan
+                    arrays['valid'][:, col] = 0
+                for ticker, df in frames.items():
+                    if ticker not in ordinals:
+                        continue
+                    col, rows = columns[ticker], np.searchsorted(dates, ordinals[ticker])
+                    for name in FIELDS:
+                        arrays[name][rows, col] = df[name].to_numpy(dtype=np.float64)
+                    arrays['valid'][rows, col] = 1
+                for array in arrays.values():
+                    array.flush()
+                del arrays
+
+            for ticker, mark in (synced or {}).items():
+                if mark is None:
+                    state['synced'].pop(ticker, None)
+                else:
+                    state['synced'][ticker] = mark
+            self._commit(state)
+
+            if previous and state['generation'] != previous['generation']:
+                shutil.rmtree(self._gen_dir(previous['generation']), ignore_errors=True)
+            return state
+
+    def _append_rows(self, state: Dict, new_dates: np.ndarray) -> Dict:
+        """截斷未提交的列後在檔尾附加新的交易日（數值為 NaN、遮罩為 0），返回尚未提交的 state"""
+        files = self._files(self._gen_dir(state['generation']))
+        count = len(new_dates)
+        for name, path in files.items():
+            row_bytes = self._row_bytes(name, state['capacity'])
+            with open(path, 'r+b') as f:
+                f.truncate(state['rows'] * row_bytes)
+                if count == 0:
+                    continue
+                f.seek(0, os.SEEK_END)
+                if name == 'dates':
+                    f.write(new_dates.astype('<i4').tobytes())
+                elif name == 'valid':
+                    f.write(bytes(count * row_bytes))
+                else:
+                    f.write(np.full(count * state['capacity'], np.nan, dtype='<f8').tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        return dict(state, rows=state['rows'] + count)
+
+    def _new_generation(self, state: Dict, current: Dict[str, np.ndarray], tickers: List[str],
+                        rows: int, dates: np.ndarray = None) -> Dict:
+        """把現有數據複製到新 generation 目錄（新的交易日與容量），返回尚未提交的 state"""
+        generation = state['generation'] + 1
+        capacity = max(CAPACITY_STEP, -(-len(tickers) // CAPACITY_STEP) * CAPACITY_STEP)
+        directory = self._gen_dir(generation)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+        dates = np.zeros(0, dtype=np.int64) if dates is None else dates
+        old_rows = np.searchsorted(dates, np.asarray(current['dates'], dtype=np.int64))
+        n = len(state['tickers'])
+        for name, path in self._files(directory).items():
+            if name == 'dates':
+                data = dates.astype('<i4')
+            else:
+                data = np.full((rows, capacity), np.nan if name != 'valid' else 0,
+                               dtype='<f8' if name != 'valid' else np.uint8)
+                if n:
+                    data[old_rows, :n] = current[name][:, :n]
+            with open(path, 'wb') as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del data
+        fsync_dir(directory)
+        return dict(state, generation=generation, rows=rows, capacity=capacity)
+
+    @staticmethod
+    def _mark(info: Optional[Dict]) -> Optional[list]:
+        if not info:
+            return None
+        return [info['date_range'].get('end_date'), info['record_count'], info.get('data_version')]
+
+    def sync(self, cache_manager, tickers: Iterable[str] = None) -> Dict:
+        """
+        依快取更新面板：只處理 (最後日期, 筆數, data_version) 與上次同步不同的股票，
+        只有附加時只寫入新的交易日，其餘重寫整行；已不在快取中的股票清空其行
+
+        Args:
+            cache_manager: 快取管理器
+            tickers: 只檢查這些股票（默認為全部已快取與已同步的股票）
+
+        Returns:
+            Dict: {'appended', 'rewritten', 'removed'} 股票數
+        """
+        infos = {info['ticker']: info for info in cache_manager.get_all_cache_info()}
+        synced = self.get_synced()
+        scope = set(infos) | set(synced) if tickers is None else set(tickers)
+        changed = sorted(t for t in scope if self._mark(infos.get(t)) != synced.get(t))
+        summary = {'appended': 0, 'rewritten': 0, 'removed': 0}
+        if not changed:
+            return summary
+
+        frames, replace, marks = {}, [], {}
+        for ticker in changed:
+            info = infos.get(ticker)
+            df = cache_manager.load_frame(ticker) if info else None
+            if df is None:
+                if ticker in synced:
+                    replace.append(ticker)
+                    marks[ticker] = None
+                    summary['removed'] += 1
+                continue
+
+            old = synced.get(ticker)
+            if old and old[0] and (df['date'] <= old[0]).sum() == old[1]:
+                df = df[df['date'] > old[0]]
+                summary['appended'] += 1
+            else:
+                replace.append(ticker)
+                summary['rewritten'] += 1
+            frames[ticker] = df
+            marks[ticker] = self._mark(info)
+
+        self.write(frames, replace=replace, synced=marks)
+        return summary
+
+    def rebuild(self, cache_manager) -> Dict:
+        """
+        從快取重建整個面板（寫入新的 generation 後切換）
+
+        Returns:
+            Dict: {'tickers', 'rows'}
+        """
+        frames, marks = {}, {}
+        for info in cache_manager.get_all_cache_info():
+            df = cache_manager.load_frame(info['ticker'])
+            if df is not None:
+                frames[info['ticker']] = df
+                marks[info['ticker']] = self._mark(info)
+        state = self.write(frames, synced=marks, fresh=True)
+        return {'tickers': len(state['tickers']), 'rows': state['rows']}
+
+
+if __name__ == '__main__':
+    # python -m utils.panel_store [sync|rebuild]
+    import sys
+    from .cache_manager import create_cache_manager
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'sync'
+    store = PanelStore()
+    if command == 'rebuild':
+        print(store.rebuild(create_cache_manager()))
+    else:
+        print(store.sync(create_cache_manager()))
@@ -0,0 +1,366 @@
+"""
+Redis 快取管理器（可選的儲存後端，CACHE_BACKEND=redis）
+多台主機共用同一個 Redis 相容伺服器上的快取：一台主機下載的數據其他主機直接使用，
+上游更新以 Redis 鎖在整個叢集內只進行一次
+
+鍵（前綴為 REDIS_KEY_PREFIX）：
+- {前綴}:stocks：已快取的股票代號（集合）
+- {前綴}:meta:{ticker}：名稱、建立與更新時間、日期範圍（1970-01-01 起的日數）、筆數、數據版本（雜湊）
+- {前綴}:col:{ticker}:{欄位}：BAR_DTYPE 各欄位的連續陣列（little-endian 原始位元組）
+- {前綴}:version：全域數據版本計數器，每次寫入取新值，刪除後重建的股票不會與舊版本相同
+- {前綴}:lock:{ticker}：上游更新鎖（SingleFlight 使用）
+- {前綴}:wlock:{ticker}：寫入鎖
+
+新數據都在最後日期之後時，以 MULTI/EXEC 對每個欄位 APPEND 並更新 metadata，
+其他主機讀取時同樣以 MULTI/EXEC 取得一致的欄位與版本；
+已解碼的 DataFrame 保留在進程內的 FrameCache，以數據版本驗證，命中時只需一次 HGET
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from config import Config
+from . import bar_store
+from .cache_manager import CacheManagerBase, FORMAT_VERSION, normalize_frame
+from .frame_cache import FrameCache
+from .redis_client import RedisClient, RedisError, RedisLock
+
+BAR_FIELDS = list(bar_store.BAR_DTYPE.names)
+
+
+class RedisCacheManager(CacheManagerBase):
+    """Redis 快取管理器"""
+
+    def __init__(self, url: str = None, prefix: str = None, client: RedisClient = None,
+                 frame_cache: FrameCache = None):
+        """
+        初始化快取管理器
+
+        Args:
+            url: Redis 網址，默認為 REDIS_URL
+            prefix: 鍵的前綴，默認為 REDIS_KEY_PREFIX
+            client: Redis 用戶端（指定時忽略 url）
+            frame_cache: 已解碼快取，默認依 FRAME_CACHE_SIZE_MB 建立
+        """
+        self.client = client or RedisClient(url or Config.REDIS_URL)
+        self.prefix = prefix or Config.REDIS_KEY_PREFIX
+        self.frame_cache = frame_cache or FrameCache()
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    def _column_keys(self, ticker: str) -> List[str]:
+        return [self._key('col', ticker, field) for field in BAR_FIELDS]
+
+    def lock_for(self, ticker: str) -> RedisLock:
+        """
+        獲取股票的上游更新鎖（整個叢集共用）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            RedisLock: Redis 鎖
+        """
+        return RedisLock(self.client, self._key('lock', ticker), Config.REDIS_LOCK_TTL_SECONDS)
+
+    def _write_lock(self, ticker: str) -> RedisLock:
+        """獲取股票的寫入鎖（與更新鎖是不同的鍵：持有更新鎖時可以再取得寫入鎖）"""
+        return RedisLock(self.client, self._key('wlock', ticker), Config.REDIS_LOCK_TTL_SECONDS)
+
+    @staticmethod
+    def _decode_meta(reply: list) -> Optional[Dict]:
+        """HGETALL 回應轉為 dict（日期範圍、筆數與版本為整數），不存在時返回 None"""
+        if not reply:
+            return None
+        meta = {reply[i].decode(): reply[i + 1].decode() for i in range(0, len(reply), 2)}
+        for field in ('start_date', 'end_date', 'record_count', 'data_version'):
+            meta[field] = int(meta[field]) if meta.get(field) else None
+        meta['record_count'] = meta['record_count'] or 0
+        return meta
+
+    def _read_meta(self, ticker: str) -> Optional[Dict]:
+        return self._decode_meta(self.client.execute('HGETALL', self._key('meta', ticker)))
+
+    def exists(self, ticker: str) -> bool:
+        """
+        檢查快取是否存在
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 快取是否存在
+        """
+        return self.client.execute('EXISTS', self._key('meta', ticker)) > 0
+
+    def load_frame(self, ticker: str, start_date: str = None, end_date: str = None,
+                   limit: int = None) -> Optional[pd.DataFrame]:
+        """
+        載入快取數據為 DataFrame（各欄位直接由 Redis 的連續陣列建立）
+
+        數據版本未變時取自進程內快取，只查詢一次版本；
+        返回的 DataFrame 與快取共用數據，呼叫端不可原地修改欄位值
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期 (YYYY-MM-DD)，可選
+            end_date: 結束日期 (YYYY-MM-DD)，可選
+            limit: 只取範圍內最後 N 個交易日，可選
+
+        Returns:
+            pd.DataFrame: 含 DATA_COLUMNS 的 DataFrame（date 為 datetime64），不存在或損壞時返回 None
+        """
+        version = self.client.execute('HGET', self._key('meta', ticker), 'data_version')
+        if version is None:
+            return None
+
+        df = self.frame_cache.get((ticker, 'frame'), int(version))
+        if df is None:
+            # 版本與欄位在同一個交易內讀取，不會讀到寫入到一半的數據
+            version, blobs = self.client.transaction([
+                ('HGET', self._key('meta', ticker), 'data_version'),
+                ('MGET', *self._column_keys(ticker))
+            ])
+            if version is None:
+                return None
+            df = self._decode_columns(ticker, blobs)
+            if df is None:
+                return None
+            self.frame_cache.put((ticker, 'frame'), int(version), df, int(df.memory_usage(index=True).sum()))
+        return self.slice_range(df, start_date, end_date, limit)
+
+    @staticmethod
+    def _decode_columns(ticker: str, blobs: List[Optional[bytes]]) -> Optional[pd.DataFrame]:
+        """欄位陣列轉為 DataFrame，欄位長度不一致時返回 None"""
+        columns = {field: np.frombuffer(blob or b'', dtype=bar_store.BAR_DTYPE[field])
+                   for field, blob in zip(BAR_FIELDS, blobs)}
+        if len({len(values) for values in columns.values()}) != 1:
+            print(f"Redis 快取欄位長度不一致，已忽略: {ticker}")
+            return None
+        dates = columns.pop('date')
+        return pd.DataFrame({'date': dates.astype('datetime64[D]').astype('datetime64[ns]'), **columns})
+
+    def load_date(self, date_str: str) -> pd.DataFrame:
+        """
+        載入所有股票在某一交易日的數據（逐檔以二分搜尋定位該日記錄）
+
+        Args:
+            date_str: 日期 (YYYY-MM-DD)
+
+        Returns:
+            pd.DataFrame: 含 ticker 與 DATA_COLUMNS 的 DataFrame（依股票代號排序）
+        """
+        target = np.datetime64(date_str, 'ns')
+        tickers, rows = [], []
+        for ticker in self.get_all_cached_stocks():
+            df = self.load_frame(ticker)
+            if df is None or df.empty:
+                continue
+            pos = int(np.searchsorted(df['date'].values, target))
+            if pos < len(df) and df['date'].values[pos] == target:
+                tickers.append(ticker)
+                rows.append(df.iloc[[pos]])
+
+        if not rows:
+            return bar_store.to_frame(np.empty(0, dtype=bar_store.BAR_DTYPE)).assign(ticker=[])
+        return pd.concat(rows, ignore_index=True).assign(ticker=tickers)
+
+    def load_meta(self, ticker: str) -> Optional[Dict]:
+        """
+        只載入 metadata 與 date_range（讀取 metadata 雜湊）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: {'metadata', 'date_range'}，不存在時返回 None
+        """
+        meta = self._read_meta(ticker)
+        if meta is None:
+            return None
+        return self._to_meta(ticker, meta)
+
+    @staticmethod
+    def _to_meta(ticker: str, meta: Dict) -> Dict:
+        has_records = meta['record_count'] > 0
+        return {
+            'metadata': {
+                'ticker': ticker,
+                'stock_name': meta.get('stock_name'),
+                'data_source': meta.get('data_source'),
+                'created_at': meta.get('created_at'),
+                'last_update': meta.get('last_update'),
+                'version': FORMAT_VERSION,
+                'data_version': meta['data_version']
+            },
+            'date_range': {
+                'start_date': bar_store.date_string(meta['start_date']) if has_records else None,
+                'end_date': bar_store.date_string(meta['end_date']) if has_records else None,
+                'total_trading_days': meta['record_count']
+            }
+        }
+
+    def _to_cache_info(self, ticker: str, meta: Dict) -> Dict:
+        """metadata 轉為快取資訊（大小以定長記錄估算）"""
+        size_bytes = meta['record_count'] * bar_store.RECORD_SIZE
+        return {
+            'ticker': ticker,
+            'stock_name': meta.get('stock_name'),
+            'exists': True,
+            'file_path': self._key('col', ticker, '*'),
+            'file_size_kb': round(size_bytes / 1024, 2),
+            'size_bytes': size_bytes,
+            'date_range': self._to_meta(ticker, meta)['date_range'],
+            'last_update': meta.get('last_update'),
+            'record_count': meta['record_count'],
+            'data_version': meta['data_version']
+        }
+
+    def get_cache_info(self, ticker: str) -> Optional[Dict]:
+        """
+        獲取快取資訊
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: 快取資訊
+        """
+        meta = self._read_meta(ticker)
+        return self._to_cache_info(ticker, meta) if meta else None
+
+    def get_all_cache_info(self) -> List[Dict]:
+        """
+        獲取所有已快取股票的資訊（一次往返讀取所有 metadata）
+
+        Returns:
+            List[Dict]: 快取資訊列表
+        """
+        tickers = self.get_all_cached_stocks()
+        replies = self.client.pipeline([('HGETALL', self._key('meta', ticker)) for ticker in tickers])
+        infos = []
+        for ticker, reply in zip(tickers, replies):
+            meta = self._decode_meta(reply)
+            if meta is not None:
+                infos.append(self._to_cache_info(ticker, meta))
+        return infos
+
+    def get_all_cached_stocks(self) -> List[str]:
+        """
+        獲取所有已快取的股票代號
+
+        Returns:
+            List[str]: 股票代號列表
+        """
+        return sorted(member.decode() for member in self.client.execute('SMEMBERS', self._key('stocks')))
+
+    def merge_data(self, ticker: str, new_df: pd.DataFrame) -> bool:
+        """
+        合併新數據到現有快取
+
+        新數據都在快取最後日期之後時只對各欄位 APPEND（傳輸量與新增筆數成正比），
+        需要補入較早日期時合併後重寫；在寫入鎖內進行
+
+        Args:
+            ticker: 股票代號
+            new_df: 新的 DataFrame
+
+        Returns:
+            bool: 是否合併成功
+        """
+        new_df = normalize_frame(new_df).drop_duplicates(subset=['date']).sort_values('date')
+        try:
+            with self._write_lock(ticker):
+                meta = self._read_meta(ticker)
+                if meta is None:
+                    return False
+                if new_df.empty:
+                    return True
+
+                records = bar_store.to_records(new_df)
+                if meta['record_count'] == 0 or records['date'][0] <= meta['end_date']:
+                    return self._rewrite_merged(ticker, meta, new_df)
+
+                version = self.client.execute('INCR', self._key('version'))
+                commands = [('APPEND', key, np.ascontiguousarray(records[field]).tobytes())
+                            for field, key in zip(BAR_FIELDS, self._column_keys(ticker))]
+                commands.append(('HSET', self._key('meta', ticker),
+                                 'end_date', int(records['date'][-1]),
+                                 'record_count', meta['record_count'] + len(records),
+                                 'last_update', datetime.now().isoformat(),
+                                 'data_version', version))
+                self.client.transaction(commands)
+                return True
+        except RedisError as e:
+            print(f"快取合併失敗: {ticker} - {e}")
+            return False
+
+    def _rewrite_merged(self, ticker: str, meta: Dict, new_df: pd.DataFrame) -> bool:
+        """讀取完整快取合併新數據後重寫（持有寫入鎖時呼叫）"""
+        existing_df = self.load_frame(ticker)
+        if existing_df is None:
+            return False
+
+        # 合併數據（避免重複，保留既有數據）
+        merged_df = pd.concat([existing_df, new_df], ignore_index=True)
+        merged_df = merged_df.drop_duplicates(subset=['date']).sort_values('date')
+        self._write(ticker, meta, merged_df)
+        return True
+
+    def _create_cache(self, ticker: str, metadata: Dict, df: pd.DataFrame) -> bool:
+        """在一個交易內取代股票的所有欄位與 metadata"""
+        try:
+            with self._write_lock(ticker):
+                self._write(ticker, metadata, df)
+            return True
+        except RedisError as e:
+            print(f"快取保存失敗: {ticker} - {e}")
+            return False
+
+    def _write(self, ticker: str, metadata: Dict, df: pd.DataFrame):
+        """寫入完整欄位與 metadata（持有寫入鎖時呼叫）"""
+        records = bar_store.to_records(df)
+        version = self.client.execute('INCR', self._key('version'))
+        meta_key = self._key('meta', ticker)
+
+        commands = [('SET', key, np.ascontiguousarray(records[field]).tobytes())
+                    for field, key in zip(BAR_FIELDS, self._column_keys(ticker))]
+        fields = {
+            'stock_name': metadata.get('stock_name', ticker),
+            'data_source': metadata.get('data_source', 'twstock'),
+            'created_at': metadata.get('created_at', datetime.now().isoformat()),
+            'last_update': datetime.now().isoformat(),
+            'start_date': int(records['date'][0]) if len(records) else '',
+            'end_date': int(records['date'][-1]) if len(records) else '',
+            'record_count': len(records),
+            'data_version': version
+        }
+        commands.append(('DEL', meta_key))
+        commands.append(('HSET', meta_key, *[item for pair in fields.items() for item in pair]))
+        commands.append(('SADD', self._key('stocks'), ticker))
+        self.client.transaction(commands)
+
+    def delete(self, ticker: str) -> bool:
+        """
+        刪除快取
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 是否刪除成功
+        """
+        try:
+            with self._write_lock(ticker):
+                replies = self.client.transaction([
+                    ('DEL', self._key('meta', ticker)),
+                    ('DEL', *self._column_keys(ticker)),
+                    ('SREM', self._key('stocks'), ticker)
+                ])
+        except RedisError as e:
+            print(f"快取刪除失敗: {ticker} - {e}")
+            return False
+        self.frame_cache.invalidate((ticker, 'frame'))
+        return replies[0] > 0
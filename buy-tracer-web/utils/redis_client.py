@@ -0,0 +1,240 @@
+"""
+Redis 協定（RESP2）用戶端
+快取後端只需要少數指令，直接以 socket 實作，不依賴 redis-py；
+任何相容 RESP 的伺服器（redis-server、KeyDB、Valkey 或 utils.redis_standin）皆可使用
+
+每個執行緒一條連線（WATCH 與 MULTI 的狀態屬於連線），fork 後的子進程重新連線
+"""
+import os
+import socket
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Any, List, Sequence
+
+
+class RedisError(Exception):
+    """伺服器回應錯誤或連線失敗"""
+
+
+class RedisClient:
+    """最小的 RESP 用戶端"""
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', timeout: float = 10.0):
+        """
+        初始化用戶端（第一次執行指令時才連線）
+
+        Args:
+            url: redis://[:密碼@]主機[:埠號][/資料庫編號]
+            timeout: 連線與讀取逾時（秒）
+        """
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"不支援的 Redis 網址: {url}")
+        self.url = url
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """取得本執行緒的連線 (socket, 讀取檔)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise RedisError(f"Redis 連線失敗: {self.host}:{self.port} - {e}") from e
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            for reply in self._roundtrip(setup):
+                if isinstance(reply, RedisError):
+                    self.close()
+                    raise reply
+        return conn
+
+    def close(self):
+        """關閉本執行緒的連線"""
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None and self._local.pid == os.getpid():
+            conn[1].close()
+            conn[0].close()
+
+    def execute(self, *args) -> Any:
+        """
+        執行一個指令
+
+        Returns:
+            Any: 回應（bulk string 為 bytes，狀態為 str，整數為 int，陣列為 list，空值為 None）
+        """
+        reply = self._roundtrip([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands: Sequence[Sequence]) -> List[Any]:
+        """
+        一次送出多個指令（一次往返），依序返回回應
+
+        Raises:
+            RedisError: 任一指令回應錯誤
+        """
+        replies = self._roundtrip(commands)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def transaction(self, commands: Sequence[Sequence]) -> List[Any]:
+        """
+        以 MULTI/EXEC 原子執行多個指令
+
+        Returns:
+            List[Any]: 各指令的回應；WATCH 的鍵被修改而放棄執行時返回 None
+        """
+        replies = self._roundtrip([('MULTI',), *commands, ('EXEC',)])
+        for reply in replies[:-1]:
+            if isinstance(reply, RedisError):
+                raise reply
+        result = replies[-1]
+        if isinstance(result, RedisError):
+            raise result
+        if result is not None:
+            for reply in result:
+                if isinstance(reply, RedisError):
+                    raise reply
+        return result
+
+    def _roundtrip(self, commands: Sequence[Sequence]) -> List[Any]:
+        """送出指令並讀取同樣數量的回應（錯誤回應以 RedisError 物件返回）"""
+        sock, reader = self._connection()
+        try:
+            sock.sendall(b''.join(_encode(command) for command in commands))
+            return [_read_reply(reader) for _ in commands]
+        except (OSError, ValueError) as e:
+            # 連線狀態已不確定，丟棄連線，下一次指令重新連線
+            self.close()
+            raise RedisError(f"Redis 通訊失敗: {self.host}:{self.port} - {e}") from e
+
+
+class RedisLock:
+    """
+    Redis 鎖（SET NX PX）
+
+    持有者異常結束時鎖在 ttl 後自動失效；釋放時以 WATCH 確認仍由自己持有才刪除，
+    不會刪除逾時後被其他主機取得的鎖
+    """
+
+    def __init__(self, client: RedisClient, key: str, ttl_seconds: float = 300, poll_interval: float = 0.05):
+        """
+        初始化鎖
+
+        Args:
+            client: Redis 用戶端
+            key: 鎖的鍵
+            ttl_seconds: 鎖的存活時間（秒），需大於持有鎖的最長時間
+            poll_interval: 等待時的重試間隔（秒）
+        """
+        self.client = client
+        self.key = key
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.poll_interval = poll_interval
+        self._token = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        取得鎖
+
+        Args:
+            blocking: 是否等待到取得為止
+
+        Returns:
+            bool: 是否取得鎖
+        """
+        token = uuid.uuid4().hex
+        while True:
+            if self.client.execute('SET', self.key, token, 'NX', 'PX', self.ttl_ms) is not None:
+                self._token = token
+                return True
+            if not blocking:
+                return False
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """釋放鎖（已逾時並被其他持有者取得時不刪除）"""
+        token, self._token = self._token, None
+        if token is None:
+            return
+        self.client.execute('WATCH', self.key)
+        current = self.client.execute('GET', self.key)
+        if current is None or current.decode() != token:
+            self.client.execute('UNWATCH')
+            print(f"警告: Redis 鎖已逾時失效: {self.key}")
+            return
+        self.client.transaction([('DEL', self.key)])
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def _encode(command: Sequence) -> bytes:
+    """指令編碼為 RESP 陣列"""
+    parts = [b'*%d\r\n' % len(command)]
+    for arg in command:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode('utf-8')
+        elif isinstance(arg, (int, float)):
+            data = repr(arg).encode('ascii')
+        else:
+            raise TypeError(f"不支援的參數型別: {type(arg).__name__}")
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+def _read_reply(reader) -> Any:
+    """讀取一個回應"""
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ValueError('連線已中斷')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode('utf-8')
+    if kind == b'-':
+        return RedisError(payload.decode('utf-8'))
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ValueError('連線已中斷')
+        return data[:-2]
+    if kind == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [_read_reply(reader) for _ in range(length)]
+    raise ValueError(f"無法解析的回應: {line[:20]!r}")
@@ -0,0 +1,373 @@
+"""
+Redis 替身伺服器
+在本機執行緒中提供 RESP 協定的記憶體鍵值庫，只實作 RedisCacheManager 與 RedisLock 用到的指令
+（字串、雜湊、集合、INCR、SET NX PX、MULTI/EXEC/WATCH），
+讓測試與開發環境不需要安裝 redis-server 就能驗證多台主機共用快取的流程
+
+用法：
+    with RedisStandIn() as standin:
+        client = RedisClient(standin.url)
+
+所有指令在同一把鎖內執行，EXEC 內的指令不會與其他連線交錯；
+WATCH 以每個鍵的修改序號判斷 EXEC 前是否被其他連線修改
+"""
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .redis_client import RedisError, _read_reply
+
+# EXEC 因 WATCH 的鍵被修改而放棄時的回應（RESP 空陣列）
+NIL_ARRAY = object()
+
+
+class RedisStandIn:
+    """本機 Redis 替身伺服器"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        初始化替身伺服器
+
+        Args:
+            host: 綁定位址
+            port: 綁定埠號，0 表示由系統分配
+        """
+        self.host = host
+        self.port = port
+        self._data: Dict[bytes, Any] = {}
+        self._expires: Dict[bytes, float] = {}
+        # 每個鍵最後一次修改的序號（WATCH 用）
+        self._versions: Dict[bytes, int] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.stats = {'connections': 0, 'commands': 0}
+
+    @property
+    def url(self) -> str:
+        """連線網址（供 REDIS_URL 使用）"""
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self) -> 'RedisStandIn':
+        """在背景執行緒啟動伺服器"""
+        handler = type('RedisStandInHandler', (_StandInHandler,), {'standin': self})
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='redis-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止伺服器"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def version_of(self, key: bytes) -> int:
+        """鍵的修改序號（呼叫端需持有鎖）"""
+        self._expire(key)
+        return self._versions.get(key, 0)
+
+    def run(self, command: List[bytes]) -> Any:
+        """執行一個指令（呼叫端需持有鎖）"""
+        self.stats['commands'] += 1
+        name = command[0].decode().upper()
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return RedisError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*command[1:])
+        except TypeError:
+            return RedisError(f"ERR wrong number of arguments for '{name.lower()}' command")
+        except ValueError:
+            return RedisError('ERR value is not an integer or out of range')
+        except RedisError as e:
+            return e
+
+    def _expire(self, key: bytes):
+        deadline = self._expires.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self._delete(key)
+
+    def _touch(self, key: bytes):
+        self._counter += 1
+        self._versions[key] = self._counter
+
+    def _delete(self, key: bytes) -> bool:
+        self._expires.pop(key, None)
+        if self._data.pop(key, None) is None:
+            return False
+        self._touch(key)
+        return True
+
+    def _get(self, key: bytes, kind: type) -> Optional[Any]:
+        """取得鍵的值，型別不符時回應 WRONGTYPE"""
+        self._expire(key)
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise RedisError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    # 連線與伺服器
+
+    def _cmd_ping(self, message: bytes = None):
+        return message if message is not None else 'PONG'
+
+    def _cmd_auth(self, *args):
+        return 'OK'
+
+    def _cmd_select(self, db: bytes):
+        return 'OK'
+
+    def _cmd_flushall(self, *args):
+        for key in list(self._data):
+            self._delete(key)
+        return 'OK'
+
+    _cmd_flushdb = _cmd_flushall
+
+    # 鍵與字串
+
+    def _cmd_exists(self, *keys: bytes):
+        if not keys:
+            raise TypeError
+        return sum(self._get(key, object) is not None for key in keys)
+
+    def _cmd_del(self, *keys: bytes):
+        if not keys:
+            raise TypeError
+        for key in keys:
+            self._expire(key)
+        return sum(self._delete(key) for key in keys)
+
+    def _cmd_get(self, key: bytes):
+        return self._get(key, bytes)
+
+    def _cmd_mget(self, *keys: bytes):
+        if not keys:
+            raise TypeError
+        values = []
+        for key in keys:
+            self._expire(key)
+            value = self._data.get(key)
+            values.append(value if isinstance(value, bytes) else None)
+        return values
+
+    def _cmd_set(self, key: bytes, value: bytes, *options: bytes):
+        nx = xx = False
+        ttl = None
+        options = list(options)
+        while options:
+            option = options.pop(0).upper()
+            if option == b'NX':
+                nx = True
+            elif option == b'XX':
+                xx = True
+            elif option in (b'PX', b'EX') and options:
+                ttl = int(options.pop(0)) / (1000 if option == b'PX' else 1)
+            else:
+                raise RedisError('ERR syntax error')
+
+        self._expire(key)
+        exists = key in self._data
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._data[key] = value
+        self._expires.pop(key, None)
+        if ttl is not None:
+            self._expires[key] = time.monotonic() + ttl
+        self._touch(key)
+        return 'OK'
+
+    def _cmd_append(self, key: bytes, value: bytes):
+        current = self._get(key, bytes) or b''
+        self._data[key] = current + value
+        self._touch(key)
+        return len(self._data[key])
+
+    def _cmd_incr(self, key: bytes):
+        return self._cmd_incrby(key, b'1')
+
+    def _cmd_incrby(self, key: bytes, amount: bytes):
+        value = int(self._get(key, bytes) or 0) + int(amount)
+        self._data[key] = str(value).encode()
+        self._touch(key)
+        return value
+
+    # 雜湊
+
+    def _cmd_hset(self, key: bytes, *pairs: bytes):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        fields = self._get(key, dict)
+        if fields is None:
+            fields = self._data[key] = {}
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        self._touch(key)
+        return added
+
+    def _cmd_hget(self, key: bytes, field: bytes):
+        return (self._get(key, dict) or {}).get(field)
+
+    def _cmd_hgetall(self, key: bytes):
+        fields = self._get(key, dict) or {}
+        return [item for pair in fields.items() for item in pair]
+
+    def _cmd_hincrby(self, key: bytes, field: bytes, amount: bytes):
+        fields = self._get(key, dict)
+        if fields is None:
+            fields = self._data[key] = {}
+        value = int(fields.get(field, b'0')) + int(amount)
+        fields[field] = str(value).encode()
+        self._touch(key)
+        return value
+
+    # 集合
+
+    def _cmd_sadd(self, key: bytes, *members: bytes):
+        if not members:
+            raise TypeError
+        values = self._get(key, set)
+        if values is None:
+            values = self._data[key] = set()
+        added = len(set(members) - values)
+        values.update(members)
+        self._touch(key)
+        return added
+
+    def _cmd_srem(self, key: bytes, *members: bytes):
+        if not members:
+            raise TypeError
+        values = self._get(key, set) or set()
+        removed = len(values & set(members))
+        values.difference_update(members)
+        if not values:
+            self._delete(key)
+        elif removed:
+            self._touch(key)
+        return removed
+
+    def _cmd_smembers(self, key: bytes):
+        return sorted(self._get(key, set) or ())
+
+    def _cmd_sismember(self, key: bytes, member: bytes):
+        return int(member in (self._get(key, set) or ()))
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    """一條用戶端連線（保有 MULTI 與 WATCH 狀態）"""
+
+    standin: RedisStandIn = None
+
+    def handle(self):
+        standin = self.standin
+        with standin._lock:
+            standin.stats['connections'] += 1
+        queued = None
+        queue_error = False
+        watched: Dict[bytes, int] = {}
+
+        while True:
+            try:
+                command = _read_reply(self.rfile)
+            except (OSError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                self._send(RedisError('ERR Protocol error'))
+                return
+
+            name = command[0].decode().upper()
+            with standin._lock:
+                if name == 'MULTI':
+                    reply = RedisError('ERR MULTI calls can not be nested') if queued is not None else 'OK'
+                    if queued is None:
+                        queued, queue_error = [], False
+                elif name == 'DISCARD':
+                    reply = 'OK' if queued is not None else RedisError('ERR DISCARD without MULTI')
+                    queued = None
+                    watched = {}
+                elif name == 'WATCH':
+                    if queued is not None:
+                        reply = RedisError('ERR WATCH inside MULTI is not allowed')
+                    else:
+                        for key in command[1:]:
+                            watched.setdefault(key, standin.version_of(key))
+                        reply = 'OK'
+                elif name == 'UNWATCH':
+                    watched = {}
+                    reply = 'OK'
+                elif name == 'EXEC':
+                    if queued is None:
+                        reply = RedisError('ERR EXEC without MULTI')
+                    elif queue_error:
+                        reply = RedisError('EXECABORT Transaction discarded because of previous errors.')
+                    elif any(standin.version_of(key) != version for key, version in watched.items()):
+                        reply = NIL_ARRAY
+                    else:
+                        reply = [standin.run(queued_command) for queued_command in queued]
+                    queued = None
+                    watched = {}
+                elif queued is not None:
+                    if hasattr(standin, f"_cmd_{name.lower()}"):
+                        queued.append(command)
+                        reply = 'QUEUED'
+                    else:
+                        queue_error = True
+                        reply = RedisError(f"ERR unknown command '{name}'")
+                else:
+                    reply = standin.run(command)
+
+            try:
+                self._send(reply)
+            except OSError:
+                return
+
+    def _send(self, reply: Any):
+        self.wfile.write(_encode_reply(reply))
+        self.wfile.flush()
+
+
+def _encode_reply(reply: Any) -> bytes:
+    """回應編碼為 RESP"""
+    if reply is None:
+        return b'$-1\r\n'
+    if reply is NIL_ARRAY:
+        return b'*-1\r\n'
+    if isinstance(reply, RedisError):
+        return b'-%s\r\n' % str(reply).encode('utf-8')
+    if isinstance(reply, str):
+        return b'+%s\r\n' % reply.encode('utf-8')
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    return b'*%d\r\n' % len(reply) + b''.join(_encode_reply(item) for item in reply)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本機 Redis 替身伺服器（僅供開發與測試）')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    standin = RedisStandIn(port=args.port).start()
+    print(f"Redis 替身伺服器啟動: {standin.url}（REDIS_URL={standin.url}）")
+    try:
+        standin._thread.join()
+    except KeyboardInterrupt:
+        standin.stop()
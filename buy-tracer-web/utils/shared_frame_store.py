@@ -0,0 +1,319 @@
+"""
+跨 worker 共享的熱門股票數據（共享記憶體 mmap）
+同一台主機上的 gunicorn worker 共用一份熱門股票的 OHLCV 與技術指標陣列，
+不再各自在 heap 保留一份
+
+目錄（默認位於 /dev/shm，即共享記憶體）內容：
+- index.json：{'generation': 全域發布次數, 'entries': {鍵: {'file', 'version', 'generation', 'nbytes', 'published_at'}}}
+- {鍵}.{generation}.seg：不可變的數據段，檔頭為欄位名稱、型別與位移，之後是 64 bytes 對齊的欄位陣列
+
+讀取端只在 index.json 變動時重新讀取索引，以唯讀 mmap 附加數據段，
+欄位為映射頁面的零複製唯讀視圖，同一段在進程內只映射一次；
+寫入端在鎖內寫入新的數據段、原子替換索引後才刪除舊段，
+已附加舊段的讀取端在解除映射前仍可讀取（POSIX unlink 語意）
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from config import Config
+from .single_flight import FileLock
+
+INDEX_FILE = 'index.json'
+SEGMENT_SUFFIX = '.seg'
+MAGIC = b'BTSEG001'
+ALIGNMENT = 64
+
+
+def _key_name(key: Hashable) -> str:
+    """鍵值轉為檔名（tuple 以 '_' 連接，其餘字元只保留英數與 -）"""
+    parts = key if isinstance(key, tuple) else (key,)
+    return '_'.join(re.sub(r'[^0-9A-Za-z-]', '-', str(part)) for part in parts)
+
+
+def _normalize_version(version: Any) -> Any:
+    """版本轉為 JSON 可比較的形式（tuple 轉為 list）"""
+    return json.loads(json.dumps(version))
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SharedFrameStore:
+    """跨進程共享、唯讀附加的 DataFrame 數據段"""
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        """
+        初始化共享數據段目錄
+
+        Args:
+            directory: 目錄路徑，默認為 SHARED_FRAME_DIR
+            max_bytes: 數據段總大小上限（位元組），默認為 SHARED_FRAME_CACHE_MB
+        """
+        self.directory = directory or Config.SHARED_FRAME_DIR
+        self.max_bytes = Config.SHARED_FRAME_CACHE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index: Dict = {'generation': 0, 'entries': {}}
+        self._index_stat = None
+        # 本進程已附加的數據段：檔名 → (數據版本, DataFrame)，欄位為 mmap 視圖
+        self._attached: Dict[str, Tuple[Any, pd.DataFrame]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[pd.DataFrame]:
+        """
+        附加共享數據段
+
+        Args:
+            key: 鍵值
+            version: 目前的數據版本，與發布時不同即視為未命中
+
+        Returns:
+            pd.DataFrame: 欄位為唯讀共享記憶體視圖的 DataFrame，未命中時返回 None
+        """
+        with self._lock:
+            self._refresh_index()
+            entry = self._index['entries'].get(_key_name(key))
+            version = _normalize_version(version)
+            frame = None
+            if entry is not None and entry['version'] == version:
+                frame = self._attach(entry['file'], version)
+
+            if frame is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return frame.copy(deep=False)
+
+    def put(self, key: Hashable, version: Any, df: pd.DataFrame) -> bool:
+        """
+        發布數據段（寫入新段後原子替換索引），超過上限時淘汰最早發布的數據段
+
+        Args:
+            key: 鍵值
+            version: 數據版本
+            df: 欄位皆為數值型別、index 為日期的 DataFrame
+
+        Returns:
+            bool: 是否發布成功
+        """
+        try:
+            payload = self._encode(version, df)
+        except (TypeError, ValueError) as e:
+            print(f"共享數據段無法編碼: {key} - {e}")
+            return False
+        if len(payload) > self.max_bytes:
+            return False
+
+        name = _key_name(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with FileLock(os.path.join(self.directory, '.lock')):
+                index = self._read_index()
+                index['generation'] += 1
+                filename = f"{name}.{index['generation']}{SEGMENT_SUFFIX}"
+                self._write_file(filename, payload)
+
+                index['entries'][name] = {
+                    'file': filename,
+                    'version': _normalize_version(version),
+                    'generation': index['generation'],
+                    'nbytes': len(payload),
+                    'published_at': time.time()
+                }
+                self._evict(index, keep=name)
+                self._write_file(INDEX_FILE, json.dumps(index).encode('utf-8'))
+                self._remove_unreferenced(index)
+            return True
+        except OSError as e:
+            print(f"共享數據段發布失敗: {key} - {e}")
+            return False
+
+    def invalidate(self, key: Hashable):
+        """移除鍵值對應的數據段"""
+        name = _key_name(key)
+        self._remove_entries(lambda entry: entry == name, key)
+
+    def invalidate_prefix(self, prefix: Hashable):
+        """移除鍵值以 prefix 開頭的所有數據段（例如同一股票各開始日期的數據）"""
+        name = _key_name(prefix)
+        self._remove_entries(lambda entry: entry == name or entry.startswith(name + '_'), prefix)
+
+    def _remove_entries(self, match, key: Hashable):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with FileLock(os.path.join(self.directory, '.lock')):
+                index = self._read_index()
+                names = [entry for entry in index['entries'] if match(entry)]
+                if not names:
+                    return
+                for entry in names:
+                    del index['entries'][entry]
+                index['generation'] += 1
+                self._write_file(INDEX_FILE, json.dumps(index).encode('utf-8'))
+                self._remove_unreferenced(index)
+        except OSError as e:
+            print(f"共享數據段移除失敗: {key} - {e}")
+
+    def stats(self) -> Dict:
+        """
+        共享數據段統計（命中與附加數為本進程）
+
+        Returns:
+            Dict: {'entries', 'bytes', 'max_bytes', 'generation', 'attached', 'hits', 'misses', 'hit_rate'}
+        """
+        with self._lock:
+            self._refresh_index()
+            entries = self._index['entries']
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(entry['nbytes'] for entry in entries.values()),
+                'max_bytes': self.max_bytes,
+                'generation': self._index['generation'],
+                'attached': len(self._attached),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _refresh_index(self):
+        """index.json 變動時重新讀取，並解除不再被索引引用的數據段"""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            st = None
+        stat_key = (st.st_ino, st.st_size, st.st_mtime_ns) if st else None
+        if stat_key == self._index_stat:
+            return
+
+        self._index = self._read_index()
+        self._index_stat = stat_key
+        referenced = {entry['file'] for entry in self._index['entries'].values()}
+        for filename in list(self._attached):
+            if filename not in referenced:
+                # 只移除引用，仍在使用中的 DataFrame 保有映射直到被回收
+                del self._attached[filename]
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'entries': {}}
+        except ValueError as e:
+            print(f"共享數據段索引損壞，已忽略: {e}")
+            return {'generation': 0, 'entries': {}}
+
+    def _attach(self, filename: str, version: Any) -> Optional[pd.DataFrame]:
+        """
+        以唯讀 mmap 附加數據段（同一段只映射一次）；
+        以段內記錄的版本再次驗證，索引被清除後重複使用的檔名不會取得舊映射
+        """
+        attached = self._attached.get(filename)
+        if attached is not None and attached[0] == version:
+            return attached[1]
+
+        try:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # 讀取索引後數據段已被替換或淘汰
+            return None
+
+        segment_version, frame = self._decode(buffer)
+        if segment_version != version:
+            return None
+        self._attached[filename] = (segment_version, frame)
+        return frame
+
+    @staticmethod
+    def _encode(version: Any, df: pd.DataFrame) -> bytes:
+        """DataFrame 編碼為數據段（檔頭 + 對齊的欄位陣列）"""
+        arrays = [('__index__', np.ascontiguousarray(df.index.values))]
+        arrays += [(str(name), np.ascontiguousarray(df[name].to_numpy())) for name in df.columns]
+
+        columns = []
+        offset = 0
+        for name, values in arrays:
+            if values.dtype.hasobject:
+                raise TypeError(f"欄位 {name} 不是數值型別")
+            columns.append([name, values.dtype.str, offset])
+            offset = _aligned(offset + values.nbytes)
+
+        header = json.dumps({
+            'version': _normalize_version(version),
+            'length': len(df),
+            'index_name': df.index.name,
+            'columns': columns
+        }).encode('utf-8')
+        data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+        payload = bytearray(data_start + offset)
+        payload[:len(MAGIC)] = MAGIC
+        payload[len(MAGIC):len(MAGIC) + 4] = struct.pack('<I', len(header))
+        payload[len(MAGIC) + 4:len(MAGIC) + 4 + len(header)] = header
+        for (_, values), (_, _, column_offset) in zip(arrays, columns):
+            start = data_start + column_offset
+            payload[start:start + values.nbytes] = values.tobytes()
+        return bytes(payload)
+
+    @staticmethod
+    def _decode(buffer: mmap.mmap) -> Tuple[Any, pd.DataFrame]:
+        """由 mmap 建立 DataFrame（欄位為唯讀零複製視圖），返回 (數據版本, DataFrame)"""
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('共享數據段格式錯誤')
+        header_len = struct.unpack('<I', buffer[len(MAGIC):len(MAGIC) + 4])[0]
+        header = json.loads(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + header_len])
+        data_start = _aligned(len(MAGIC) + 4 + header_len)
+
+        arrays = {}
+        for name, dtype, offset in header['columns']:
+            arrays[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=header['length'],
+                                         offset=data_start + offset)
+
+        index = pd.Index(arrays.pop('__index__'), name=header['index_name'], copy=False)
+        return header['version'], pd.DataFrame(arrays, index=index, copy=False)
+
+    def _write_file(self, filename: str, data: bytes):
+        """寫入暫存檔後 rename（共享記憶體不需 fsync，重開機後重新產生）"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _evict(self, index: Dict, keep: str):
+        """淘汰最早發布的數據段，直到總大小不超過上限"""
+        entries = index['entries']
+        total = sum(entry['nbytes'] for entry in entries.values())
+        for name in sorted(entries, key=lambda n: entries[n]['published_at']):
+            if total <= self.max_bytes:
+                break
+            if name != keep:
+                total -= entries.pop(name)['nbytes']
+
+    def _remove_unreferenced(self, index: Dict):
+        """刪除索引不再引用的數據段與中斷留下的暫存檔（持有寫入鎖時呼叫）"""
+        referenced = {entry['file'] for entry in index['entries'].values()}
+        for filename in os.listdir(self.directory):
+            if filename.endswith((SEGMENT_SUFFIX, '.tmp')) and filename not in referenced:
+                try:
+                    os.unlink(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,167 @@
+"""
+單一請求合併（single-flight）
+同一股票代號同時只允許一個上游更新，其他執行緒等待並共用結果；
+跨 gunicorn worker 進程以檔案鎖協調，多台主機共用快取時改用快取後端提供的鎖
+（見 CacheManagerBase.lock_for）
+"""
+import os
+import threading
+from typing import Any, Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，退化為進程內鎖表
+    fcntl = None
+
+from config import Config
+
+
+class FileLock:
+    """跨進程檔案鎖（fcntl.flock），不支援的平台僅提供進程內互斥"""
+
+    # 進程內鎖表：同一路徑共用一把執行緒鎖，也作為無 fcntl 時的替代
+    _local_locks: Dict[str, threading.Lock] = {}
+    _local_locks_guard = threading.Lock()
+
+    def __init__(self, path: str):
+        """
+        初始化檔案鎖
+
+        Args:
+            path: 鎖檔路徑
+        """
+        self.path = path
+        with FileLock._local_locks_guard:
+            self._local_lock = FileLock._local_locks.setdefault(path, threading.Lock())
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        取得鎖
+
+        Args:
+            blocking: 是否阻塞等待
+
+        Returns:
+            bool: 是否取得鎖
+        """
+        if not self._local_lock.acquire(blocking):
+            return False
+
+        if fcntl is None:
+            return True
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(self._fd, flags)
+            return True
+        except OSError:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._local_lock.release()
+            if blocking:
+                raise
+            return False
+
+    def release(self):
+        """釋放鎖"""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._local_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class _Call:
+    """進行中的呼叫"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """以鍵值合併同時發生的相同工作"""
+
+    def __init__(self, lock_dir: str = None, lock_factory: Callable[[str], Any] = None):
+        """
+        初始化 single-flight
+
+        Args:
+            lock_dir: 鎖檔目錄
+            lock_factory: 依鍵值取得跨進程鎖的函數（可選），指定時取代檔案鎖
+        """
+        self.lock_dir = lock_dir or Config.LOCK_DIR
+        self.lock_factory = lock_factory
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def lock_for(self, key: str):
+        """
+        獲取鍵值對應的跨進程鎖
+
+        Args:
+            key: 鍵值（股票代號）
+
+        Returns:
+            FileLock: 檔案鎖（指定 lock_factory 時為其返回的鎖）
+        """
+        if self.lock_factory is not None:
+            return self.lock_factory(key)
+        return FileLock(os.path.join(self.lock_dir, f"{key}.lock"))
+
+    def is_in_flight(self, key: str) -> bool:
+        """檢查鍵值是否有進行中的工作（僅限本進程）"""
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        執行工作；若同一鍵值已有進行中的工作，則等待並共用其結果
+
+        進程內的等待者直接共用結果；其他進程會在檔案鎖上排隊，
+        fn 應在取得鎖後重新檢查是否仍需更新，以沿用前一個進程寫入的結果
+
+        Args:
+            key: 鍵值（股票代號）
+            fn: 要執行的工作
+
+        Returns:
+            Any: fn 的返回值
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self.lock_for(key):
+                call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
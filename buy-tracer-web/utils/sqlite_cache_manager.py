@@ -0,0 +1,329 @@
+"""
+SQLite 快取管理器（可選的儲存後端，CACHE_BACKEND=sqlite）
+所有股票的日線存於同一個資料庫：
+
+- bars：主鍵 (ticker, date)，date 為 1970-01-01 起的日數（與 .bars 記錄相同），
+  另有 date 索引供「某日所有股票」查詢
+- stocks：每檔股票的名稱、日期範圍、筆數與數據版本，與 bars 在同一個交易內更新
+
+WAL 模式下多個 worker 可同時讀取，寫入由 SQLite 以交易序列化；
+load_frame 以日期範圍與筆數只讀出請求需要的交易日
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from config import Config
+from . import bar_store
+from .cache_manager import CacheManagerBase, FORMAT_VERSION, normalize_frame
+from .frame_cache import FrameCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume INTEGER,
+    capacity INTEGER,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bars_date ON bars (date);
+CREATE TABLE IF NOT EXISTS stocks (
+    ticker TEXT PRIMARY KEY,
+    stock_name TEXT,
+    data_source TEXT,
+    created_at TEXT,
+    last_update TEXT,
+    start_date INTEGER,
+    end_date INTEGER,
+    record_count INTEGER NOT NULL DEFAULT 0,
+    data_version INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+BAR_FIELDS = list(bar_store.BAR_DTYPE.names)
+
+
+class SQLiteCacheManager(CacheManagerBase):
+    """SQLite 快取管理器"""
+
+    def __init__(self, db_path: str = None, frame_cache: FrameCache = None):
+        """
+        初始化快取管理器
+
+        Args:
+            db_path: 資料庫檔路徑
+            frame_cache: 已解碼快取，默認依 FRAME_CACHE_SIZE_MB 建立
+        """
+        self.db_path = db_path or Config.CACHE_SQLITE_PATH
+        self.frame_cache = frame_cache or FrameCache()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每個執行緒一條連線；fork 後的子進程重新連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _get_stock(self, ticker: str) -> Optional[sqlite3.Row]:
+        return self._connect().execute('SELECT * FROM stocks WHERE ticker = ?', (ticker,)).fetchone()
+
+    def exists(self, ticker: str) -> bool:
+        """
+        檢查快取是否存在
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 快取是否存在
+        """
+        return self._get_stock(ticker) is not None
+
+    def load_frame(self, ticker: str, start_date: str = None, end_date: str = None,
+                   limit: int = None) -> Optional[pd.DataFrame]:
+        """
+        載入快取數據為 DataFrame；指定範圍時只查詢範圍內的交易日
+
+        完整載入時以 data_version 驗證進程內快取；
+        返回的 DataFrame 與快取共用數據，呼叫端不可原地修改欄位值
+
+        Args:
+            ticker: 股票代號
+            start_date: 開始日期 (YYYY-MM-DD)，可選
+            end_date: 結束日期 (YYYY-MM-DD)，可選
+            limit: 只取範圍內最後 N 個交易日，可選
+
+        Returns:
+            pd.DataFrame: 含 DATA_COLUMNS 的 DataFrame（date 為 datetime64），不存在時返回 None
+        """
+        stock = self._get_stock(ticker)
+        if stock is None:
+            return None
+
+        full = start_date is None and end_date is None and limit is None
+        if full:
+            df = self.frame_cache.get((ticker, 'frame'), stock['data_version'])
+            if df is not None:
+                return df.copy(deep=False)
+
+        sql = f"SELECT {', '.join(BAR_FIELDS)} FROM bars WHERE ticker = ? AND date BETWEEN ? AND ?"
+        params = [ticker,
+                  bar_store.date_ordinal(start_date) if start_date else stock['start_date'],
+                  bar_store.date_ordinal(end_date) if end_date else stock['end_date']]
+        if limit is not None:
+            # 由最後一天往前取 limit 筆，再還原為日期順序
+            rows = self._connect().execute(sql + ' ORDER BY date DESC LIMIT ?', params + [limit]).fetchall()
+            rows.reverse()
+        else:
+            rows = self._connect().execute(sql + ' ORDER BY date', params).fetchall()
+
+        df = bar_store.to_frame(np.array([tuple(row) for row in rows], dtype=bar_store.BAR_DTYPE))
+        if full:
+            self.frame_cache.put((ticker, 'frame'), stock['data_version'], df,
+                                 int(df.memory_usage(index=True).sum()))
+            return df.copy(deep=False)
+        return df
+
+    def load_date(self, date_str: str) -> pd.DataFrame:
+        """
+        載入所有股票在某一交易日的數據（使用 date 索引）
+
+        Args:
+            date_str: 日期 (YYYY-MM-DD)
+
+        Returns:
+            pd.DataFrame: 含 ticker 與 DATA_COLUMNS 的 DataFrame（依股票代號排序）
+        """
+        rows = self._connect().execute(
+            f"SELECT ticker, {', '.join(BAR_FIELDS)} FROM bars WHERE date = ? ORDER BY ticker",
+            (bar_store.date_ordinal(date_str),)
+        ).fetchall()
+        records = np.array([tuple(row)[1:] for row in rows], dtype=bar_store.BAR_DTYPE)
+        return bar_store.to_frame(records).assign(ticker=[row[0] for row in rows])
+
+    def load_meta(self, ticker: str) -> Optional[Dict]:
+        """
+        只載入 metadata 與 date_range（查詢 stocks 表）
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: {'metadata', 'date_range'}，不存在時返回 None
+        """
+        stock = self._get_stock(ticker)
+        if stock is None:
+            return None
+        return {
+            'metadata': {
+                'ticker': ticker,
+                'stock_name': stock['stock_name'],
+                'data_source': stock['data_source'],
+                'created_at': stock['created_at'],
+                'last_update': stock['last_update'],
+                'version': FORMAT_VERSION,
+                'data_version': stock['data_version']
+            },
+            'date_range': {
+                'start_date': bar_store.date_string(stock['start_date']) if stock['record_count'] else None,
+                'end_date': bar_store.date_string(stock['end_date']) if stock['record_count'] else None,
+                'total_trading_days': stock['record_count']
+            }
+        }
+
+    def _to_cache_info(self, stock: sqlite3.Row) -> Dict:
+        """stocks 列轉為快取資訊（大小以定長記錄估算）"""
+        meta = self.load_meta(stock['ticker'])
+        size_bytes = stock['record_count'] * bar_store.RECORD_SIZE
+        return {
+            'ticker': stock['ticker'],
+            'stock_name': stock['stock_name'],
+            'exists': True,
+            'file_path': self.db_path,
+            'file_size_kb': round(size_bytes / 1024, 2),
+            'size_bytes': size_bytes,
+            'date_range': meta['date_range'],
+            'last_update': stock['last_update'],
+            'record_count': stock['record_count'],
+            'data_version': stock['data_version']
+        }
+
+    def get_cache_info(self, ticker: str) -> Optional[Dict]:
+        """
+        獲取快取資訊
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            Dict: 快取資訊
+        """
+        stock = self._get_stock(ticker)
+        return self._to_cache_info(stock) if stock else None
+
+    def get_all_cache_info(self) -> List[Dict]:
+        """
+        獲取所有已快取股票的資訊
+
+        Returns:
+            List[Dict]: 快取資訊列表
+        """
+        stocks = self._connect().execute('SELECT * FROM stocks ORDER BY ticker').fetchall()
+        return [self._to_cache_info(stock) for stock in stocks]
+
+    def get_all_cached_stocks(self) -> List[str]:
+        """
+        獲取所有已快取的股票代號
+
+        Returns:
+            List[str]: 股票代號列表
+        """
+        return [row[0] for row in self._connect().execute('SELECT ticker FROM stocks ORDER BY ticker')]
+
+    def merge_data(self, ticker: str, new_df: pd.DataFrame) -> bool:
+        """
+        合併新數據到現有快取（同一交易內寫入日線並更新 stocks，已有的日期保留既有數據）
+
+        Args:
+            ticker: 股票代號
+            new_df: 新的 DataFrame
+
+        Returns:
+            bool: 是否合併成功
+        """
+        new_df = normalize_frame(new_df).drop_duplicates(subset=['date']).sort_values('date')
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('SELECT 1 FROM stocks WHERE ticker = ?', (ticker,)).fetchone() is None:
+                conn.execute('ROLLBACK')
+                return False
+            if not new_df.empty:
+                self._insert_bars(conn, ticker, new_df, 'INSERT OR IGNORE')
+                self._update_stock(conn, ticker)
+            conn.execute('COMMIT')
+            return True
+        except sqlite3.Error as e:
+            conn.execute('ROLLBACK')
+            print(f"快取合併失敗: {ticker} - {e}")
+            return False
+
+    def _create_cache(self, ticker: str, metadata: Dict, df: pd.DataFrame) -> bool:
+        """在一個交易內取代股票的所有日線"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM bars WHERE ticker = ?', (ticker,))
+            self._insert_bars(conn, ticker, df, 'INSERT')
+            conn.execute(
+                'INSERT INTO stocks (ticker, stock_name, data_source, created_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(ticker) DO UPDATE SET stock_name = excluded.stock_name',
+                (ticker, metadata.get('stock_name', ticker), metadata.get('data_source', 'twstock'),
+                 metadata.get('created_at', datetime.now().isoformat()))
+            )
+            self._update_stock(conn, ticker)
+            conn.execute('COMMIT')
+            return True
+        except sqlite3.Error as e:
+            conn.execute('ROLLBACK')
+            print(f"快取保存失敗: {ticker} - {e}")
+            return False
+
+    @staticmethod
+    def _insert_bars(conn: sqlite3.Connection, ticker: str, df: pd.DataFrame, verb: str):
+        records = bar_store.to_records(df)
+        conn.executemany(
+            f"{verb} INTO bars (ticker, {', '.join(BAR_FIELDS)}) VALUES (?, {', '.join('?' for _ in BAR_FIELDS)})",
+            ((ticker, *record) for record in records.tolist())
+        )
+
+    @staticmethod
+    def _update_stock(conn: sqlite3.Connection, ticker: str):
+        """由 bars 主鍵重新計算日期範圍與筆數，數據版本加一"""
+        conn.execute(
+            'UPDATE stocks SET (start_date, end_date, record_count) = '
+            '(SELECT MIN(date), MAX(date), COUNT(*) FROM bars WHERE ticker = ?), '
+            'last_update = ?, data_version = data_version + 1 WHERE ticker = ?',
+            (ticker, datetime.now().isoformat(), ticker)
+        )
+
+    def delete(self, ticker: str) -> bool:
+        """
+        刪除快取
+
+        Args:
+            ticker: 股票代號
+
+        Returns:
+            bool: 是否刪除成功
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM bars WHERE ticker = ?', (ticker,))
+            deleted = conn.execute('DELETE FROM stocks WHERE ticker = ?', (ticker,)).rowcount > 0
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            conn.execute('ROLLBACK')
+            print(f"快取刪除失敗: {ticker} - {e}")
+            return False
+        self.frame_cache.invalidate((ticker, 'frame'))
+        return deleted
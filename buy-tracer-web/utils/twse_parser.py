@@ -0,0 +1,270 @@
+"""
+證交所 / 櫃買中心回應解析器
+將整個月份的原始 JSON 回應一次轉換為 NumPy 欄位，取代 twstock 逐列 _make_datatuple 的解析
+
+欄位順序與 twstock DATATUPLE 相同：
+['日期', '成交股數', '成交金額', '開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '成交筆數']
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# twstock DATATUPLE 欄位名稱
+FIELDS = ['date', 'capacity', 'turnover', 'open', 'high', 'low', 'close', 'change', 'transaction']
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+# 快取使用的欄位（volume 為成交股數，capacity 為成交金額）
+FRAME_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'capacity']
+
+# 10 的次方表（int64 最多 18 位數）
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+def empty_columns() -> Dict[str, np.ndarray]:
+    """
+    建立空的欄位字典
+
+    Returns:
+        Dict[str, np.ndarray]: 各欄位長度為 0 的陣列
+    """
+    columns = {'date': np.array([], dtype='datetime64[D]')}
+    for name in ['capacity', 'turnover', 'transaction']:
+        columns[name] = np.array([], dtype=np.int64)
+    for name in PRICE_FIELDS + ['change']:
+        columns[name] = np.array([], dtype=np.float64)
+    return columns
+
+
+def _code_matrix(values: np.ndarray) -> np.ndarray:
+    """
+    將字串欄位轉換為 Unicode 碼位矩陣 (n, 寬度)，之後的解析皆為整數運算
+
+    Args:
+        values: 字串或物件陣列
+
+    Returns:
+        np.ndarray: uint32 碼位矩陣，短字串以 0 補齊
+    """
+    values = np.ascontiguousarray(values, dtype=str)
+    return values.view(np.uint32).reshape(len(values), values.dtype.itemsize // 4)
+
+
+def _parse_digits(values: np.ndarray):
+    """
+    一次解析整欄數字字串，忽略逗號、'+'、'X'、'＊' 等非數字字元
+
+    Args:
+        values: 字串陣列
+
+    Returns:
+        tuple: (所有數字組成的整數, 小數位數, 是否為負數, 是否含有數字)
+    """
+    codes = _code_matrix(values)
+    is_digit = (codes >= 48) & (codes <= 57)
+    digits = np.where(is_digit, codes - 48, 0).astype(np.int64)
+
+    # 每個數字的權重為 10 ** (其右方的數字個數)
+    right = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - is_digit
+    mantissa = (digits * _POW10[np.minimum(right, 18)]).sum(axis=1)
+
+    after_dot = np.cumsum(codes == ord('.'), axis=1) > 0
+    scale = (is_digit & after_dot).sum(axis=1)
+    negative = (codes == ord('-')).any(axis=1)
+    has_digits = is_digit.any(axis=1)
+    return mantissa, scale, negative, has_digits
+
+
+def _to_float(values: np.ndarray) -> np.ndarray:
+    """轉換為浮點數，'--' 等不含數字的值視為缺值 (NaN)"""
+    mantissa, scale, negative, has_digits = _parse_digits(values)
+    result = mantissa / _POW10[scale].astype(np.float64)
+    result = np.where(negative, -result, result)
+    return np.where(has_digits, result, np.nan)
+
+
+def _to_int(values: np.ndarray) -> np.ndarray:
+    """轉換為整數，不含數字的值視為 0"""
+    mantissa, _, _, has_digits = _parse_digits(values)
+    return np.where(has_digits, mantissa, 0)
+
+
+def _parse_roc_dates(values: np.ndarray) -> np.ndarray:
+    """
+    將民國日期 ('113/01/02'、'99/01/04'、'113/01/03＊') 轉換為 datetime64[D]
+
+    日期中的數字依序組成 年*10000 + 月*100 + 日，不需逐筆字串切割
+
+    Args:
+        values: 民國日期字串陣列
+
+    Returns:
+        np.ndarray: datetime64[D] 陣列
+    """
+    number, _, _, _ = _parse_digits(values)
+
+    years = number // 10000 + 1911
+    months = number // 100 % 100
+    days = number % 100
+
+    month_index = (years - 1970) * 12 + (months - 1)
+    return (month_index.astype('datetime64[M]').astype('datetime64[D]')
+            + (days - 1).astype('timedelta64[D]'))
+
+
+def _to_matrix(rows: List[list]) -> np.ndarray:
+    """將原始資料列轉換為 (n, 9) 物件矩陣（忽略第 10 個以後的欄位）"""
+    matrix = np.array(rows, dtype=object)
+    if matrix.ndim != 2:
+        # 欄位數不一致（9 欄與 10 欄混合）
+        matrix = np.array([row[:9] for row in rows], dtype=object)
+    return matrix[:, :9]
+
+
+def _parse_matrix(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """解析字串矩陣的各欄位"""
+    columns = {'date': _parse_roc_dates(matrix[:, 0])}
+    columns['capacity'] = _to_int(matrix[:, 1])
+    columns['turnover'] = _to_int(matrix[:, 2])
+    for i, name in enumerate(PRICE_FIELDS, start=3):
+        columns[name] = _to_float(matrix[:, i])
+    # +/-/X 表示漲/跌/不比價，X 只是標記，解析時自然略過
+    columns['change'] = _to_float(matrix[:, 7])
+    columns['transaction'] = _to_int(matrix[:, 8])
+    return columns
+
+
+def parse_twse_rows(rows: List[list]) -> Dict[str, np.ndarray]:
+    """
+    解析證交所 STOCK_DAY 資料列
+
+    Args:
+        rows: 原始回應的 data 欄位
+
+    Returns:
+        Dict[str, np.ndarray]: 依 FIELDS 命名的欄位陣列
+    """
+    if not rows:
+        return empty_columns()
+
+    return _parse_matrix(_to_matrix(rows))
+
+
+def parse_tpex_rows(rows: List[list]) -> Dict[str, np.ndarray]:
+    """
+    解析櫃買中心資料列（成交股數與成交金額單位為千）
+
+    Args:
+        rows: 原始回應的 aaData 欄位
+
+    Returns:
+        Dict[str, np.ndarray]: 依 FIELDS 命名的欄位陣列
+    """
+    if not rows:
+        return empty_columns()
+
+    columns = _parse_matrix(_to_matrix(rows))
+    columns['capacity'] = columns['capacity'] * 1000
+    columns['turnover'] = columns['turnover'] * 1000
+    return columns
+
+
+def parse_payload(market: str, payload: Dict) -> Dict[str, np.ndarray]:
+    """
+    解析單月原始回應
+
+    Args:
+        market: 'TWSE' 或 'TPEX'
+        payload: 上游原始 JSON 回應
+
+    Returns:
+        Dict[str, np.ndarray]: 欄位陣列，無資料時各欄位為空陣列
+    """
+    if market == 'TPEX':
+        return parse_tpex_rows(payload.get('aaData') or [])
+
+    if payload.get('stat') != 'OK':
+        return empty_columns()
+    return parse_twse_rows(payload.get('data') or [])
+
+
+def concat_columns(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    依序合併多個月份的欄位
+
+    Args:
+        parts: 欄位字典列表
+
+    Returns:
+        Dict[str, np.ndarray]: 合併後的欄位
+    """
+    parts = [part for part in parts if len(part['date'])]
+    if not parts:
+        return empty_columns()
+    return {name: np.concatenate([part[name] for part in parts]) for name in FIELDS}
+
+
+def columns_to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    將欄位轉換為快取格式的 DataFrame
+
+    價格缺值（'--'）的交易日會被略過，日期輸出為 'YYYY-MM-DD' 字串
+
+    Args:
+        columns: 欄位字典
+
+    Returns:
+        pd.DataFrame: 包含 FRAME_COLUMNS 的 DataFrame
+    """
+    valid = np.ones(len(columns['date']), dtype=bool)
+    for name in PRICE_FIELDS:
+        valid &= ~np.isnan(columns[name])
+
+    return pd.DataFrame({
+        'date': np.datetime_as_string(columns['date'][valid], unit='D'),
+        'open': columns['open'][valid],
+        'high': columns['high'][valid],
+        'low': columns['low'][valid],
+        'close': columns['close'][valid],
+        'volume': columns['capacity'][valid],  # capacity 是成交股數
+        'capacity': columns['turnover'][valid]  # turnover 是成交金額
+    }, columns=FRAME_COLUMNS)
+
+
+def parse_daily_all(payload: Dict) -> pd.DataFrame:
+    """
+    解析證交所 STOCK_DAY_ALL（全部證券當日收盤行情）回應
+
+    欄位順序：['證券代號', '證券名稱', '成交股數', '成交金額', '開盤價', '最高價', '最低價',
+              '收盤價', '漲跌價差', '成交筆數']
+
+    Args:
+        payload: 上游原始 JSON 回應（含 'date': 'YYYYMMDD'）
+
+    Returns:
+        pd.DataFrame: 包含 'ticker' 與 FRAME_COLUMNS 的 DataFrame，無成交價的證券會被略過
+    """
+    rows = payload.get('data') or []
+    if payload.get('stat') != 'OK' or not rows:
+        return pd.DataFrame(columns=['ticker'] + FRAME_COLUMNS)
+
+    matrix = np.array([row[:10] for row in rows], dtype=object).reshape(-1, 10)
+    date_str = str(payload.get('date', ''))
+    trade_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
+
+    columns = {
+        'date': np.full(len(matrix), np.datetime64(trade_date, 'D')),
+        'capacity': _to_int(matrix[:, 2]),
+        'turnover': _to_int(matrix[:, 3]),
+    }
+    for i, name in enumerate(PRICE_FIELDS, start=4):
+        columns[name] = _to_float(matrix[:, i])
+
+    valid = np.ones(len(matrix), dtype=bool)
+    for name in PRICE_FIELDS:
+        valid &= ~np.isnan(columns[name])
+
+    df = columns_to_frame(columns)
+    df.insert(0, 'ticker', np.char.strip(matrix[valid, 0].astype(str)))
+    return df
@@ -25,6 +25,9 @@ twstock 套件修補程式
 - 只取 API 回傳資料的前 9 個欄位：data[:9]
 - 忽略最後的空字串
 - 在應用啟動時（app.py:create_app()）自動套用
+- 另新增 fetch_raw 方法，只抓取不解析，讓月份原始快取（utils/month_store.py）
+  可保存未經處理的回應；解析改由 utils/twse_parser.py 以向量化方式一次完成
+- 設定 EXCHANGE_BASE_URL 時將上游網址指向離線替身伺服器（utils/exchange_standin.py）
 
 兼容性
 ------
@@ -38,7 +41,27 @@ twstock 套件修補程式
 - twstock GitHub: https://github.com/mlouielu/twstock
 """
 import datetime
+import urllib.parse
+from json import JSONDecodeError
+from typing import Optional
+
+import requests
 import twstock.stock
+from twstock.proxy import get_proxies
+from config import Config
+
+# 上游請求逾時秒數（twstock 原始實作未設定逾時）
+REQUEST_TIMEOUT = 30
+
+_patched = False
+
+# twstock 原始上游網址（切換到替身伺服器後可還原）
+_ORIGINAL_URLS = {
+    'TWSE_BASE_URL': twstock.stock.TWSE_BASE_URL,
+    'TPEX_BASE_URL': twstock.stock.TPEX_BASE_URL,
+    'TWSE_REPORT_URL': twstock.stock.TWSEFetcher.REPORT_URL,
+    'TPEX_REPORT_URL': twstock.stock.TPEXFetcher.REPORT_URL,
+}
 
 
 def patched_make_datatuple_twse(self, data):
@@ -76,11 +99,92 @@ def patched_make_datatuple_tpex(self, data):
     return twstock.stock.DATATUPLE(*data[:9])
 
 
+def request_json(url: str, params: dict, retry: int) -> Optional[dict]:
+    """發送請求並解析 JSON，所有重試皆失敗時返回 None"""
+    for _ in range(retry):
+        r = requests.get(url, params=params, proxies=get_proxies(), timeout=REQUEST_TIMEOUT)
+        try:
+            return r.json()
+        except JSONDecodeError:
+            continue
+    return None
+
+
+def fetch_raw_twse(self, year: int, month: int, sid: str, retry: int = 5) -> Optional[dict]:
+    """
+    抓取證交所單月原始回應（不經 purify，可供原始快取保存）
+
+    Returns:
+        dict: 原始 JSON 回應，所有重試失敗時返回 None
+    """
+    params = {"date": "%d%02d01" % (year, month), "stockNo": sid}
+    payload = request_json(self.REPORT_URL, params, retry)
+    if payload is None or "stat" not in payload:
+        return None
+    return payload
+
+
+def fetch_raw_tpex(self, year: int, month: int, sid: str, retry: int = 5) -> Optional[dict]:
+    """
+    抓取櫃買中心單月原始回應（不經 purify，可供原始快取保存）
+
+    Returns:
+        dict: 原始 JSON 回應，所有重試失敗時返回 None
+    """
+    params = {"d": "%d/%d" % (year - 1911, month), "stkno": sid}
+    payload = request_json(self.REPORT_URL, params, retry)
+    if payload is None or "aaData" not in payload:
+        return None
+    return payload
+
+
+def set_exchange_base_url(base_url: Optional[str]):
+    """
+    將 twstock 的上游網址指向替身伺服器（utils/exchange_standin.py）
+
+    證交所路徑掛在 {base_url}twse/，櫃買中心路徑掛在 {base_url}tpex/；
+    base_url 為空時還原為真實上游
+
+    Args:
+        base_url: 替身伺服器根網址，例如 http://127.0.0.1:8765/
+    """
+    if base_url:
+        base_url = base_url.rstrip('/') + '/'
+        twse_base = urllib.parse.urljoin(base_url, 'twse/')
+        tpex_base = urllib.parse.urljoin(base_url, 'tpex/')
+        twse_report = urllib.parse.urljoin(twse_base, 'exchangeReport/STOCK_DAY')
+        tpex_report = urllib.parse.urljoin(
+            tpex_base, 'web/stock/aftertrading/daily_trading_info/st43_result.php'
+        )
+    else:
+        twse_base = _ORIGINAL_URLS['TWSE_BASE_URL']
+        tpex_base = _ORIGINAL_URLS['TPEX_BASE_URL']
+        twse_report = _ORIGINAL_URLS['TWSE_REPORT_URL']
+        tpex_report = _ORIGINAL_URLS['TPEX_REPORT_URL']
+
+    twstock.stock.TWSE_BASE_URL = twse_base
+    twstock.stock.TPEX_BASE_URL = tpex_base
+    twstock.stock.TWSEFetcher.REPORT_URL = twse_report
+    twstock.stock.TPEXFetcher.REPORT_URL = tpex_report
+
+
 def apply_twstock_patch():
     """
     應用 twstock 修補程式
-    必須在使用 twstock 之前呼叫此函數
+    必須在使用 twstock 之前呼叫此函數（重複呼叫不會重複套用）
     """
+    global _patched
+    if _patched:
+        return
+
     twstock.stock.TWSEFetcher._make_datatuple = patched_make_datatuple_twse
     twstock.stock.TPEXFetcher._make_datatuple = patched_make_datatuple_tpex
+    # 新增原始回應抓取（供月份原始快取使用）
+    twstock.stock.TWSEFetcher.fetch_raw = fetch_raw_twse
+    twstock.stock.TPEXFetcher.fetch_raw = fetch_raw_tpex
+    _patched = True
     print("[OK] twstock 修補程式已套用（修復證交所 API 格式變更）")
+
+    if Config.EXCHANGE_BASE_URL:
+        set_exchange_base_url(Config.EXCHANGE_BASE_URL)
+        print(f"[OK] 上游已切換到替身伺服器: {Config.EXCHANGE_BASE_URL}")